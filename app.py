@@ -1,19 +1,431 @@
+import io
 import os
+import json
+import time
+import uuid
 import logging
-from flask import Flask, render_template, request, jsonify
+import tempfile
+from contextlib import contextmanager, ExitStack
+from flask import Flask, g, render_template, request, jsonify, send_file, stream_with_context, url_for
+from werkzeug.wsgi import get_input_stream
 from obfuscator import LuaObfuscator
 from lua_parser import LuaParser
+from models import db, ObfuscationJob
+from cache import ObfuscationCache, SQLCacheTier, make_cache_key
+from batch import BatchProcessor, BatchError, read_archive, write_zip
+from streaming import (
+    NDJSON_MIMETYPE, UploadTooLarge, iter_file, ndjson_lines, read_mapped, spool_upload, split_output, wants_stream
+)
+from jobs import JobWorkerPool, create_job, job_status
+from metrics import MetricsRegistry, PassTimings
+from lua_lexer import LuaSyntaxError
+from compression import ENCODINGS, MIN_COMPRESS_SIZE, DecodingError, compress, compress_stream, decode_body, is_compressible
+from logs import TraceSampler, configure_logging
+from pipeline import LEVEL_PASSES, PASSES, SOURCE_COST, Pipeline, PipelineError
+import budget
+from budget import Budget, BudgetExceeded
+from scheduler import Scheduler, Overloaded, INTERACTIVE, BULK, LANES
+from incremental import IncrementalObfuscator
+from live_validation import LiveValidator, EditError, StaleSession
+from symbol_index import SymbolIndex, PROJECT_METATABLES_ERROR
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Levels, format and trace sampling come from the environment (see logs.py)
+configure_logging()
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger('trace')
+trace_sampler = TraceSampler.from_environ()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
-# Initialize obfuscator and parser
+# Configure the database (used by the shared result cache)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///obfuscator.db")
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_recycle": 300,
+    "pool_pre_ping": True,
+}
+db.init_app(app)
+
+with app.app_context():
+    db.create_all()
+
+# Initialize obfuscator and parser (both are safe to share between threads)
 obfuscator = LuaObfuscator()
 lua_parser = LuaParser()
 
+# Incremental sessions (per process): the chunks of each session's last
+# submission, so that an edited resubmission only re-obfuscates what changed
+incremental_obfuscator = IncrementalObfuscator(
+    obfuscator, max_sessions=int(os.environ.get("INCREMENTAL_SESSIONS", 64)))
+
+# Live validation sessions (per process): each editor's text and the results
+# of its chunks, so that a keystroke only re-checks the chunk it touched
+live_validator = LiveValidator(
+    lua_parser,
+    max_sessions=int(os.environ.get("LIVE_SESSIONS", 256)),
+    max_size=int(os.environ.get("LIVE_MAX_CHARS", 4 * 1024 * 1024)),
+)
+
+# Result cache: per-process LRU plus an optional tier shared through the database
+shared_cache = None
+if os.environ.get("OBFUSCATION_SHARED_CACHE", "").lower() in ("1", "true", "yes"):
+    shared_cache = SQLCacheTier(int(os.environ.get("OBFUSCATION_CACHE_TTL", 7 * 24 * 3600)))
+result_cache = ObfuscationCache(
+    max_bytes=int(os.environ.get("OBFUSCATION_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    shared=shared_cache,
+)
+
+# Prometheus metrics for this server process, served at /metrics
+metrics_registry = MetricsRegistry()
+request_latency = metrics_registry.histogram(
+    'obfuscator_request_duration_seconds', 'Time spent handling /api/obfuscate requests', ('level', 'cache'))
+pass_seconds = metrics_registry.counter(
+    'obfuscator_pass_seconds_total', 'Wall time spent in each obfuscation pass', ('pass',))
+pass_runs = metrics_registry.counter(
+    'obfuscator_pass_runs_total', 'Number of times each obfuscation pass ran', ('pass',))
+pass_input_bytes = metrics_registry.counter(
+    'obfuscator_pass_input_bytes_total', 'Bytes fed into each pipeline pass', ('pass',))
+pass_output_bytes = metrics_registry.counter(
+    'obfuscator_pass_output_bytes_total', 'Bytes produced by each pipeline pass', ('pass',))
+validation_failures = metrics_registry.counter(
+    'obfuscator_validation_failures_total', 'Inputs rejected by the Lua syntax validator', ('endpoint',))
+budget_rejections = metrics_registry.counter(
+    'obfuscator_budget_rejections_total', 'Requests refused up front or aborted for their cost',
+    ('endpoint', 'reason'))
+scheduler_rejections = metrics_registry.counter(
+    'obfuscator_scheduler_rejections_total', 'Requests refused because their lane was full or too slow',
+    ('endpoint', 'lane'))
+for stat, help_text in (
+    ('hits', 'Results served from the in-process cache'),
+    ('shared_hits', 'Results served from the shared database cache'),
+    ('misses', 'Results computed because no cache tier had them'),
+    ('coalesced', 'Requests that waited for an identical request in flight'),
+):
+    metrics_registry.gauge(f'obfuscator_cache_{stat}_total', help_text,
+                           lambda stat=stat: result_cache.stats[stat], kind='counter')
+metrics_registry.gauge('obfuscator_cache_bytes', 'Bytes held by the in-process result cache',
+                       lambda: result_cache.memory.current_bytes)
+metrics_registry.gauge('obfuscator_cache_entries', 'Entries in the in-process result cache',
+                       lambda: len(result_cache.memory))
+metrics_registry.gauge('obfuscator_live_sessions', 'Open live validation sessions', lambda: len(live_validator))
+for stat, help_text in (
+    ('result_hits', 'Live validations answered from the whole-text cache'),
+    ('checked_chunks', 'Chunks lexed and checked by live validation'),
+    ('reused_chunks', 'Chunks whose live validation result was reused'),
+):
+    metrics_registry.gauge(f'obfuscator_live_{stat}_total', help_text,
+                           lambda stat=stat: live_validator.stats[stat], kind='counter')
+
+def record_pass_metrics(timings):
+    for entry in timings.passes:
+        pass_seconds.inc(entry['seconds'], **{'pass': entry['pass']})
+        pass_runs.inc(**{'pass': entry['pass']})
+        if entry['input_bytes'] is not None:
+            pass_input_bytes.inc(entry['input_bytes'], **{'pass': entry['pass']})
+            pass_output_bytes.inc(entry['output_bytes'], **{'pass': entry['pass']})
+
+# Lower CPU priority of the batch and job worker processes, which are bulk work
+BULK_NICE = int(os.environ.get("BULK_NICE", 10))
+
+# Process pool for batch requests, started on first use
+batch_processor = BatchProcessor(int(os.environ.get("BATCH_WORKERS", 0)) or None, nice=BULK_NICE)
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 5000))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 64 * 1024 * 1024))
+
+# Largest raw body accepted by /api/obfuscate/upload
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 64 * 1024 * 1024))
+
+# Largest size a compressed request body may decode to
+DECODED_MAX_BYTES = int(os.environ.get("DECODED_MAX_BYTES", 64 * 1024 * 1024))
+
+# Per-request budgets of the synchronous endpoints, in seconds and in cost
+# units (bytes read by each pass times its cost, see pipeline.py); one unit
+# is about 1.5 microseconds. 0 switches a limit off. Requests whose estimate
+# is over MAX_REQUEST_COST are refused before any work; the time budget
+# should stay below GUNICORN_TIMEOUT so the worker is freed first. Budgets
+# apply while a request holds a scheduler slot, not while it queues
+REQUEST_TIME_BUDGET = float(os.environ.get("REQUEST_TIME_BUDGET", 60)) or None
+MAX_REQUEST_COST = float(os.environ.get("MAX_REQUEST_COST", 32 * 1024 * 1024)) or None
+REQUEST_WORK_BUDGET = float(os.environ.get("REQUEST_WORK_BUDGET", 2 * (MAX_REQUEST_COST or 0))) or None
+
+# Computations that run at once in this process, and how many of those only
+# the interactive lane may use (see scheduler.py). The bulk queue should stay
+# well below GUNICORN_THREADS, so waiting bulk requests leave threads free
+scheduler = Scheduler(
+    slots=int(os.environ.get("SCHEDULER_SLOTS", 2)),
+    reserved=int(os.environ.get("SCHEDULER_RESERVED", 1)),
+    max_queue={
+        INTERACTIVE: int(os.environ.get("SCHEDULER_INTERACTIVE_QUEUE", 16)),
+        BULK: int(os.environ.get("SCHEDULER_BULK_QUEUE", 4)),
+    },
+    client_queue=int(os.environ.get("SCHEDULER_CLIENT_QUEUE", 2)),
+    max_wait=float(os.environ.get("SCHEDULER_MAX_WAIT", 30)),
+)
+# Larger inputs marked interactive are scheduled as bulk
+INTERACTIVE_MAX_BYTES = int(os.environ.get("INTERACTIVE_MAX_BYTES", 256 * 1024))
+for lane in LANES:
+    metrics_registry.gauge(f'obfuscator_scheduler_{lane}_waiting', f'Requests waiting in the {lane} lane',
+                           lambda lane=lane: scheduler.depth(lane))
+    metrics_registry.gauge(f'obfuscator_scheduler_{lane}_running', f'Computations running in the {lane} lane',
+                           lambda lane=lane: scheduler.running[lane])
+for stat, help_text in (
+    ('admitted', 'Computations given a scheduler slot'),
+    ('queued', 'Requests that had to wait for a slot'),
+    ('timed_out', 'Requests that gave up waiting for a slot'),
+):
+    metrics_registry.gauge(f'obfuscator_scheduler_{stat}_total', help_text,
+                           lambda stat=stat: scheduler.stats[stat], kind='counter')
+
+# Request bodies taken as the Lua source itself, with parameters in the query string
+RAW_MIMETYPES = ('text/plain', 'application/octet-stream')
+
+# Background workers for /api/jobs, started by the server entry point
+# (main.py, gunicorn.conf.py) rather than on import, so that pool child
+# processes importing this module do not start workers of their own
+job_pool = JobWorkerPool(
+    app.config["SQLALCHEMY_DATABASE_URI"],
+    workers=int(os.environ.get("JOB_WORKERS", 1)),
+    poll_interval=float(os.environ.get("JOB_POLL_INTERVAL", 1.0)),
+    retention_seconds=int(os.environ.get("JOB_RETENTION", 7 * 24 * 3600)),
+    nice=BULK_NICE,
+)
+
+def start_job_workers():
+    """Start the job workers; JOB_WORKERS=0 leaves them to `python jobs.py`"""
+    if job_pool.workers > 0:
+        job_pool.start()
+
+def request_seed(value):
+    """Seed from a query parameter; integer strings become int, as in JSON payloads"""
+    if value is not None and value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+def request_payload():
+    """
+    The JSON object of an API request; for a raw text/plain or
+    application/octet-stream body the same fields are built from the body
+    (the code) and the query parameters level, seed, options (JSON),
+    pipeline (comma-separated), session, stream, timings, skip_validation
+    and incremental
+    """
+    if request.mimetype not in RAW_MIMETYPES:
+        return request.get_json()
+    args = request.args
+    data = {'code': request.get_data(as_text=True)}
+    if 'level' in args:
+        data['level'] = args['level']
+    if 'seed' in args:
+        data['seed'] = request_seed(args['seed'])
+    if 'options' in args:
+        data['options'] = json.loads(args['options'])
+    if 'pipeline' in args:
+        data['pipeline'] = args['pipeline'].split(',')
+    if 'session' in args:
+        data['session'] = args['session']
+    for flag in ('stream', 'timings', 'skip_validation', 'incremental'):
+        if flag in args:
+            data[flag] = args[flag].lower() in ('1', 'true', 'yes')
+    return data
+
+def wants_text(request):
+    """True when the client asked for the obfuscated code itself rather than JSON"""
+    return request.accept_mimetypes.best == 'text/plain'
+
+def tag_response(response, cache_key, session_id):
+    """ETag for cacheable results; incremental results name their session instead"""
+    if session_id is not None:
+        response.headers['X-Session-ID'] = session_id
+    else:
+        response.set_etag(cache_key)
+    return response
+
+@app.before_request
+def start_trace():
+    """Assign the request id and decide whether this request logs a trace record"""
+    g.request_id = request.headers.get('X-Request-ID', '')[:128] or uuid.uuid4().hex
+    g.trace = None
+    if trace_sampler.sample():
+        g.trace = {}
+        g.trace_started = time.perf_counter()
+
+def annotate_trace(**fields):
+    """Add fields to this request's trace record, if it is sampled"""
+    trace = g.get('trace')
+    if trace is not None:
+        trace.update(fields)
+
+@app.after_request
+def finish_trace(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    trace = g.get('trace')
+    if trace is not None:
+        duration = time.perf_counter() - g.trace_started
+        trace_logger.info('%s %s %s %s %.1f ms', g.request_id, request.method, request.path,
+                          response.status_code, duration * 1000, extra={'trace': {
+                              'request_id': g.request_id,
+                              'method': request.method,
+                              'path': request.path,
+                              'status': response.status_code,
+                              'seconds': duration,
+                              'request_bytes': request.content_length,
+                              **trace,
+                          }})
+    return response
+
+@app.before_request
+def decode_request_body():
+    """Decompress request bodies sent with Content-Encoding gzip, deflate or zstd"""
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if encoding in ('', 'identity'):
+        return None
+    if encoding not in ENCODINGS:
+        return jsonify({
+            'error': f'Unsupported Content-Encoding: {encoding} (use: {", ".join(ENCODINGS)})',
+            'success': False
+        }), 415
+    try:
+        # Read straight from the environ: request.stream would be cached
+        # before the decoded body replaces it
+        body, size = decode_body(get_input_stream(request.environ), encoding, DECODED_MAX_BYTES)
+    except UploadTooLarge as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 413
+    except DecodingError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 400
+    request.environ['wsgi.input'] = body
+    request.environ['CONTENT_LENGTH'] = str(size)
+    request.environ.pop('HTTP_CONTENT_ENCODING', None)
+    request.environ.pop('wsgi.input_terminated', None)
+    return None
+
+@contextmanager
+def request_budget():
+    """Run the block under the time and work budget of a request"""
+    token = budget.start(Budget(REQUEST_TIME_BUDGET, REQUEST_WORK_BUDGET))
+    try:
+        yield
+    finally:
+        budget.stop(token)
+
+def job_limits():
+    """The (seconds, work) budget of one request, for files computed in the batch pool"""
+    return REQUEST_TIME_BUDGET, REQUEST_WORK_BUDGET
+
+@contextmanager
+def scheduler_slot(code_size, lane=None):
+    """
+    Hold a scheduler slot for the block, in `lane` if given
+    Otherwise the web UI's requests, marked 'X-Priority: interactive', of up
+    to INTERACTIVE_MAX_BYTES go to the interactive lane and the rest to bulk.
+    Clients are told apart by X-Client-ID, or else by address
+    """
+    if lane is None:
+        interactive = request.headers.get('X-Priority', '').lower() == INTERACTIVE
+        lane = INTERACTIVE if interactive and code_size <= INTERACTIVE_MAX_BYTES else BULK
+    client = request.headers.get('X-Client-ID') or request.remote_addr
+    g.queue_lane = lane
+    with scheduler.slot(lane, client) as waited:
+        g.queue_wait = waited
+        yield
+
+@contextmanager
+def compute_slot(code_size, lane=None):
+    """Wait for a scheduler slot (see scheduler_slot), then run the block under the request budget"""
+    with scheduler_slot(code_size, lane):
+        with request_budget():
+            yield
+
+@app.after_request
+def add_queue_headers(response):
+    """Tell scheduled requests their lane, its current depth and their wait"""
+    lane = g.get('queue_lane')
+    if lane is not None:
+        response.headers['X-Queue-Lane'] = lane
+        response.headers['X-Queue-Depth'] = str(scheduler.depth(lane))
+        if 'queue_wait' in g:
+            response.headers['X-Queue-Wait-Ms'] = str(round(g.queue_wait * 1000))
+    return response
+
+def overloaded(e, endpoint):
+    """503 with a retry delay for a request the scheduler could not admit"""
+    scheduler_rejections.inc(endpoint=endpoint, lane=e.lane)
+    response = jsonify({
+        'error': f'Server busy: {e}',
+        'queue_depth': e.depth,
+        'retry_after': e.retry_after,
+        'success': False
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def over_cost(estimated_cost, endpoint):
+    """The 413 response for a request whose estimated cost is over MAX_REQUEST_COST, or None"""
+    if MAX_REQUEST_COST is None or estimated_cost <= MAX_REQUEST_COST:
+        return None
+    budget_rejections.inc(endpoint=endpoint, reason='estimate')
+    return jsonify({
+        'error': f'Request too large: estimated cost {estimated_cost:.0f} exceeds the limit of '
+                 f'{MAX_REQUEST_COST:.0f}; submit it as a background job (/api/jobs)',
+        'estimated_cost': round(estimated_cost),
+        'max_cost': round(MAX_REQUEST_COST),
+        'success': False
+    }), 413
+
+def budget_exceeded(e, endpoint):
+    """413 for a request over its work budget, 503 for one that ran out of time"""
+    budget_rejections.inc(endpoint=endpoint, reason=e.kind)
+    return jsonify({
+        'error': f'Request aborted: {e}',
+        'success': False
+    }), 413 if e.kind == 'work' else 503
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses for clients that accept zstd, gzip or deflate"""
+    if not is_compressible(response.mimetype) or response.direct_passthrough \
+            or response.status_code < 200 or response.status_code in (204, 206, 304) \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ, but the resource is the same
+    tag, weak = response.get_etag()
+    if tag is not None and not weak:
+        response.set_etag(tag, weak=True)
+    return response
+
+def invalid_options(options):
+    """Why client options cannot be used, or None"""
+    if not isinstance(options, dict):
+        return 'Options must be an object'
+    # Shared names are issued by project mode, never taken from clients
+    if 'global_names' in options:
+        return 'Option global_names is set by project mode and cannot be given'
+    return None
+
+def is_valid_seed(seed):
+    """Seeds may be omitted, or be an integer or a string"""
+    return seed is None or (isinstance(seed, (int, str)) and not isinstance(seed, bool))
+
 @app.route('/')
 def index():
     """Main page with obfuscation interface"""
@@ -29,10 +441,20 @@ def obfuscate_code():
     """
     Obfuscate Lua code via API
     
-    Expected JSON payload:
+    Expected JSON payload (or the code as a raw text/plain body, with the
+    other fields as query parameters):
     {
         "code": "lua code string",
-        "level": "basic|medium|advanced",
+        "level": "basic|medium|advanced|extreme",
+        "seed": 1234 (optional, makes the output reproducible),
+        "stream": false (optional, NDJSON response with the code in chunks),
+        "timings": false (optional, include per-pass time and sizes),
+        "skip_validation": false (optional, for callers that validated already),
+        "pipeline": ["remove_comments", "minify", ...] (optional, runs these
+                    passes in order instead of a level),
+        "incremental": false (optional, starts an incremental session),
+        "session": "id" (optional, resubmits to an incremental session and
+                   re-obfuscates only the functions that changed),
         "options": {
             "rename_variables": true,
             "encode_strings": true,
@@ -44,7 +466,8 @@ def obfuscate_code():
     }
     """
     try:
-        data = request.get_json()
+        started = time.perf_counter()
+        data = request_payload()
         
         if not data:
             return jsonify({
@@ -59,60 +482,643 @@ def obfuscate_code():
                 'success': False
             }), 400
         
-        # Validate Lua syntax
-        is_valid, error_msg = lua_parser.validate_syntax(lua_code)
-        if not is_valid:
-            return jsonify({
-                'error': f'Invalid Lua syntax: {error_msg}',
-                'success': False
-            }), 400
-        
         # Get obfuscation options
         level = data.get('level', 'basic')
         options = data.get('options', {})
+        seed = data.get('seed')
         
-        # Apply obfuscation based on level
-        if level == 'basic':
-            obfuscated_code = obfuscator.basic_obfuscation(lua_code, options)
-        elif level == 'medium':
-            obfuscated_code = obfuscator.medium_obfuscation(lua_code, options)
-        elif level == 'advanced':
-            obfuscated_code = obfuscator.advanced_obfuscation(lua_code, options)
-        elif level == 'extreme':
-            obfuscated_code = obfuscator.extreme_obfuscation(lua_code, options)
-        else:
+        options_error = invalid_options(options)
+        if options_error:
+            return jsonify({
+                'error': options_error,
+                'success': False
+            }), 400
+        if not is_valid_seed(seed):
+            return jsonify({
+                'error': 'Seed must be an integer or a string',
+                'success': False
+            }), 400
+        
+        pipeline = None
+        if data.get('pipeline') is not None:
+            names = data['pipeline']
+            if not isinstance(names, list) or not names or not all(isinstance(name, str) for name in names):
+                return jsonify({
+                    'error': 'Pipeline must be a non-empty list of pass names',
+                    'success': False
+                }), 400
+            pipeline = Pipeline(names)
+            level = 'custom'
+        elif level not in obfuscator.LEVELS:
             return jsonify({
                 'error': 'Invalid obfuscation level. Use: basic, medium, advanced, or extreme',
                 'success': False
             }), 400
         
-        return jsonify({
+        session_id = data.get('session')
+        if session_id is None and data.get('incremental'):
+            session_id = uuid.uuid4().hex
+        if session_id is not None and (not isinstance(session_id, str) or not 0 < len(session_id) <= 128):
+            return jsonify({
+                'error': 'Session must be a string of 1 to 128 characters',
+                'success': False
+            }), 400
+        
+        rejection = over_cost((pipeline or Pipeline.for_level(level, options)).cost(len(lua_code)), 'obfuscate')
+        if rejection is not None:
+            return rejection
+        annotate_trace(level=level, input_size=len(lua_code))
+        
+        timings = PassTimings()
+        cache_key = None
+        incremental_stats = None
+        if session_id is not None:
+            # Not cached: the output depends on what the session saw before.
+            # Each changed chunk is parsed on its own, which validates it
+            try:
+                with compute_slot(len(lua_code)):
+                    obfuscated_code, incremental_stats = incremental_obfuscator.obfuscate(
+                        session_id, lua_code, pipeline or Pipeline.for_level(level, options),
+                        options, seed, timings=timings)
+            except LuaSyntaxError as e:
+                validation_failures.inc(endpoint='obfuscate')
+                request_latency.observe(time.perf_counter() - started, level=level, cache='invalid')
+                return jsonify({
+                    'error': f'Invalid Lua syntax: {e}',
+                    'success': False
+                }), 400
+            cached = False
+            record_pass_metrics(timings)
+            annotate_trace(session=session_id, **incremental_stats)
+        else:
+            # Identical requests share one cache entry and one ETag
+            cache_key = make_cache_key(lua_code, list(pipeline.passes) if pipeline else level,
+                                       options, seed, obfuscator.VERSION)
+            if request.if_none_match.contains_weak(cache_key):
+                request_latency.observe(time.perf_counter() - started, level=level, cache='not_modified')
+                response = app.response_class(status=304)
+                response.set_etag(cache_key)
+                return response
+            
+            obfuscated_code = result_cache.get(cache_key)
+            cached = obfuscated_code is not None
+            if not cached:
+                # Validation and obfuscation take turns through the scheduler
+                with compute_slot(len(lua_code)):
+                    # Validate Lua syntax (cached results were validated when computed);
+                    # the tokens and AST built by validation are reused by the passes
+                    source = lua_code
+                    if not data.get('skip_validation'):
+                        with timings.measure('validate'):
+                            source, error_msg = lua_parser.parse_source(lua_code)
+                        if source is None:
+                            validation_failures.inc(endpoint='obfuscate')
+                            request_latency.observe(time.perf_counter() - started, level=level, cache='invalid')
+                            return jsonify({
+                                'error': f'Invalid Lua syntax: {error_msg}',
+                                'success': False
+                            }), 400
+                    
+                    if pipeline is not None:
+                        compute = lambda: obfuscator.run_pipeline(source, pipeline, options, seed, timings=timings)
+                    else:
+                        compute = lambda: obfuscator.obfuscate(source, level, options, seed, timings=timings)
+                    if data.get('skip_validation'):
+                        # The cache only holds results of code that passed validation
+                        obfuscated_code, cached = compute(), False
+                    else:
+                        obfuscated_code, cached = result_cache.get_or_compute(cache_key, compute)
+                record_pass_metrics(timings)
+        
+        request_latency.observe(time.perf_counter() - started, level=level, cache='hit' if cached else 'miss')
+        annotate_trace(cached=cached, output_size=len(obfuscated_code), passes=timings.passes)
+        timings_report = timings.as_dict() if data.get('timings') else None
+        
+        if wants_text(request):
+            response = app.response_class(obfuscated_code, mimetype='text/plain')
+            response.headers['X-Original-Size'] = str(len(lua_code))
+            response.headers['X-Obfuscated-Size'] = str(len(obfuscated_code))
+            response.headers['X-Cache'] = 'hit' if cached else 'miss'
+            return tag_response(response, cache_key, session_id)
+        
+        if wants_stream(request, data):
+            response = app.response_class(
+                stream_with_context(ndjson_lines(
+                    stream_result(obfuscated_code, len(lua_code), level, cached, timings_report)
+                )),
+                mimetype=NDJSON_MIMETYPE
+            )
+            return tag_response(response, cache_key, session_id)
+        
+        result = {
             'obfuscated_code': obfuscated_code,
             'original_size': len(lua_code),
             'obfuscated_size': len(obfuscated_code),
             'level': level,
+            'cached': cached,
+            'success': True
+        }
+        if pipeline is not None:
+            result['pipeline'] = pipeline.describe()
+        if session_id is not None:
+            result['session'] = session_id
+            result.update(incremental_stats)
+        if timings_report is not None:
+            result['timings'] = timings_report
+        return tag_response(jsonify(result), cache_key, session_id)
+        
+    except json.JSONDecodeError as e:
+        return jsonify({
+            'error': f'Options are not valid JSON: {e}',
+            'success': False
+        }), 400
+    except PipelineError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 400
+    except BudgetExceeded as e:
+        return budget_exceeded(e, 'obfuscate')
+    except Overloaded as e:
+        return overloaded(e, 'obfuscate')
+    except Exception as e:
+        logger.exception('Obfuscation error: %s', e)
+        return jsonify({
+            'error': f'Internal server error: {str(e)}',
+            'success': False
+        }), 500
+
+def stream_result(obfuscated_code, original_size, level, cached, timings=None):
+    """NDJSON records for one result: a header, the code in chunks, a summary"""
+    yield {'level': level, 'original_size': original_size, 'cached': cached}
+    for piece in split_output(obfuscated_code):
+        yield {'chunk': piece}
+    summary = {'done': True, 'obfuscated_size': len(obfuscated_code), 'success': True}
+    if timings is not None:
+        summary['timings'] = timings
+    yield summary
+
+@app.route('/api/obfuscate/upload', methods=['POST'])
+def obfuscate_upload():
+    """
+    Obfuscate one large Lua file sent as the raw request body
+    
+    The body is spooled to a temporary file and read through mmap, the
+    large-input pipeline writes the result to another temporary file, and
+    that file is streamed back as text/plain. Peak memory stays a small
+    multiple of the input instead of the JSON endpoint's copies of it.
+    
+    Query parameters: level, seed, options (a JSON object)
+    """
+    try:
+        level = request.args.get('level', 'basic')
+        options = json.loads(request.args.get('options') or '{}')
+        seed = request_seed(request.args.get('seed'))
+        
+        if level not in obfuscator.LEVELS:
+            return jsonify({
+                'error': 'Invalid obfuscation level. Use: basic, medium, advanced, or extreme',
+                'success': False
+            }), 400
+        options_error = invalid_options(options)
+        if options_error:
+            return jsonify({
+                'error': options_error,
+                'success': False
+            }), 400
+        if request.content_length is not None and request.content_length > UPLOAD_MAX_BYTES:
+            raise UploadTooLarge(f'Upload is larger than {UPLOAD_MAX_BYTES} bytes')
+        
+        with spool_upload(request.stream, UPLOAD_MAX_BYTES) as spool:
+            lua_code = read_mapped(spool)
+        if not lua_code.strip():
+            return jsonify({
+                'error': 'No Lua code provided',
+                'success': False
+            }), 400
+        rejection = over_cost(Pipeline.for_level(level, options).cost(len(lua_code)), 'upload')
+        if rejection is not None:
+            return rejection
+        
+        timings = PassTimings()
+        output = tempfile.TemporaryFile('w+', encoding='utf-8')
+        try:
+            with compute_slot(len(lua_code), BULK):
+                obfuscated_size = obfuscator.obfuscate_large(lua_code, output, level, options, seed, timings)
+        except LuaSyntaxError as e:
+            output.close()
+            validation_failures.inc(endpoint='upload')
+            return jsonify({
+                'error': f'Invalid Lua syntax: {e}',
+                'success': False
+            }), 400
+        except Exception:
+            output.close()
+            raise
+        record_pass_metrics(timings)
+        annotate_trace(level=level, input_size=len(lua_code), output_size=obfuscated_size, passes=timings.passes)
+        
+        response = app.response_class(iter_file(output), mimetype='text/plain')
+        response.headers['Content-Disposition'] = 'attachment; filename=obfuscated.lua'
+        response.headers['X-Original-Size'] = str(len(lua_code))
+        response.headers['X-Obfuscated-Size'] = str(obfuscated_size)
+        return response
+        
+    except UploadTooLarge as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 413
+    except UnicodeDecodeError as e:
+        return jsonify({
+            'error': f'Upload is not valid UTF-8: {e}',
+            'success': False
+        }), 400
+    except json.JSONDecodeError as e:
+        return jsonify({
+            'error': f'Options are not valid JSON: {e}',
+            'success': False
+        }), 400
+    except BudgetExceeded as e:
+        return budget_exceeded(e, 'upload')
+    except Overloaded as e:
+        return overloaded(e, 'upload')
+    except Exception as e:
+        logger.exception('Upload obfuscation error: %s', e)
+        return jsonify({
+            'error': f'Internal server error: {str(e)}',
+            'success': False
+        }), 500
+
+@app.route('/api/obfuscate/batch', methods=['POST'])
+def obfuscate_batch():
+    """
+    Obfuscate many Lua files in one request
+    
+    Expected JSON payload (a bare array of files is also accepted):
+    {
+        "files": [{"name": "main.lua", "code": "lua code string"}, ...],
+        "level": "basic|medium|advanced|extreme",
+        "seed": 1234 (optional),
+        "options": {...},
+        "format": "json|zip|ndjson",
+        "skip_validation": false,
+        "project": false,
+        "keep": ["onLoad", ...] (optional)
+    }
+    
+    With "format": "ndjson" one line is streamed per file as soon as it
+    finishes, followed by a summary line.
+    
+    With "project": true the files are treated as one project: globals that
+    one file defines and others use get the same new name in every file,
+    except the ones listed in "keep" (see symbol_index.py). At advanced and
+    extreme it needs "obfuscate_metatables": false in options.
+    
+    Alternatively upload a zip or tar file as multipart field "archive",
+    with level, seed, format, project, keep (comma-separated) and options
+    (a JSON string) as form fields.
+    """
+    try:
+        upload = request.files.get('archive')
+        if upload is not None:
+            params = request.form
+            files, failures = read_archive(upload.stream, upload.filename, BATCH_MAX_FILES, BATCH_MAX_BYTES)
+            options = json.loads(params.get('options') or '{}')
+        else:
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({
+                    'error': 'No JSON data or archive provided',
+                    'success': False
+                }), 400
+            if isinstance(data, list):
+                data = {'files': data}
+            params = data
+            entries = data.get('files') or []
+            if not isinstance(entries, list) or not all(
+                isinstance(entry, dict) and isinstance(entry.get('name'), str)
+                and isinstance(entry.get('code'), str) for entry in entries
+            ):
+                return jsonify({
+                    'error': 'Files must be a list of {"name": ..., "code": ...} objects',
+                    'success': False
+                }), 400
+            files = [(entry['name'], entry['code']) for entry in entries]
+            failures = []
+            options = data.get('options', {})
+        
+        level = params.get('level', 'basic')
+        seed = params.get('seed')
+        validate = str(params.get('skip_validation', '')).lower() not in ('1', 'true', 'yes')
+        project = str(params.get('project', '')).lower() in ('1', 'true', 'yes')
+        keep = params.get('keep') or []
+        if isinstance(keep, str):
+            keep = [name.strip() for name in keep.split(',') if name.strip()]
+        output_format = params.get('format', 'json')
+        if output_format == 'json' and request.accept_mimetypes.best == NDJSON_MIMETYPE:
+            output_format = 'ndjson'
+        
+        if not files and not failures:
+            return jsonify({
+                'error': 'No files provided',
+                'success': False
+            }), 400
+        if len(files) > BATCH_MAX_FILES:
+            return jsonify({
+                'error': f'Too many files: {len(files)} (limit {BATCH_MAX_FILES})',
+                'success': False
+            }), 400
+        names = [name for name, _ in files]
+        if len({*names, *(failure['name'] for failure in failures)}) != len(names) + len(failures):
+            return jsonify({
+                'error': 'File names must be unique',
+                'success': False
+            }), 400
+        if level not in obfuscator.LEVELS:
+            return jsonify({
+                'error': 'Invalid obfuscation level. Use: basic, medium, advanced, or extreme',
+                'success': False
+            }), 400
+        options_error = invalid_options(options)
+        if options_error:
+            return jsonify({
+                'error': options_error,
+                'success': False
+            }), 400
+        if not is_valid_seed(seed):
+            return jsonify({
+                'error': 'Seed must be an integer or a string',
+                'success': False
+            }), 400
+        if output_format not in ('json', 'zip', 'ndjson'):
+            return jsonify({
+                'error': 'Invalid format. Use: json, zip or ndjson',
+                'success': False
+            }), 400
+        if not isinstance(keep, list) or not all(isinstance(name, str) for name in keep):
+            return jsonify({
+                'error': 'Keep must be a list of global names',
+                'success': False
+            }), 400
+        pipeline = Pipeline.for_level(level, options)
+        if project and 'obfuscate_metatables' in pipeline.passes:
+            return jsonify({
+                'error': PROJECT_METATABLES_ERROR,
+                'success': False
+            }), 400
+        # Every file is a job of its own, held to the limit of one request
+        rejection = over_cost(max((pipeline.cost(len(code)) for _, code in files), default=0), 'batch')
+        if rejection is not None:
+            return rejection
+        
+        annotate_trace(level=level, file_count=len(files), input_size=sum(len(code) for _, code in files))
+        
+        # Each file only carries the shared names it uses, so its cache key
+        # survives changes to globals elsewhere in the project
+        project_summary = None
+        file_options = {name: options for name in names}
+        if project:
+            index = SymbolIndex(seed=seed, keep=keep)
+            index.update(dict(files), batch_processor)
+            global_names = index.global_names()
+            project_summary = index.describe(global_names)
+            for name in names:
+                shared = index.file_names(name, global_names)
+                if shared:
+                    file_options[name] = {**options, 'global_names': shared}
+        
+        # Serve what the cache already has and send only the misses to the pool
+        # Members that could not be decoded are reported as failed files
+        results = {failure['name']: failure for failure in failures}
+        keys = {}
+        jobs = []
+        for name, code in files:
+            keys[name] = make_cache_key(code, level, file_options[name], seed, obfuscator.VERSION)
+            cached_code = result_cache.get(keys[name])
+            if cached_code is not None:
+                results[name] = {'name': name, 'success': True, 'obfuscated_code': cached_code, 'cached': True}
+            else:
+                jobs.append((name, code, level, file_options[name], seed, validate))
+        
+        sources = dict(files)
+        
+        # Batches are bulk work: they wait for a bulk slot like any other
+        computed = None
+        held = ExitStack()
+        size = sum(len(sources[job[0]]) for job in jobs)
+        if not jobs:
+            computed = []
+        elif batch_processor.inline(jobs):
+            # Not handed to the pool, so computed here under the request budget
+            with compute_slot(size, BULK):
+                computed = batch_processor.run(jobs)
+        elif output_format == 'ndjson':
+            # Held while the pool streams results, until the response is closed
+            held.enter_context(scheduler_slot(size, BULK))
+        else:
+            with scheduler_slot(size, BULK):
+                computed = batch_processor.run(jobs, job_limits())
+        
+        def finish(result):
+            result['cached'] = False
+            # Only results of validated code are cached
+            if result['success'] and validate:
+                result_cache.put(keys[result['name']], result['obfuscated_code'])
+            return result
+        
+        def describe(result):
+            if result['success']:
+                result['original_size'] = len(sources[result['name']])
+                result['obfuscated_size'] = len(result['obfuscated_code'])
+            return result
+        
+        if output_format == 'ndjson':
+            # Cache hits go out first, then each file as its worker finishes
+            def records():
+                failed = 0
+                for result in results.values():
+                    failed += not result['success']
+                    yield describe(result)
+                for result in computed if computed is not None else batch_processor.iter_run(jobs, job_limits()):
+                    failed += not result['success']
+                    yield describe(finish(result))
+                summary = {'done': True, 'file_count': len(files) + len(failures), 'failed': failed,
+                           'level': level, 'success': True}
+                if project_summary is not None:
+                    summary['project'] = project_summary
+                yield summary
+            
+            response = app.response_class(stream_with_context(ndjson_lines(records())), mimetype=NDJSON_MIMETYPE)
+            response.call_on_close(held.close)
+            return response
+        
+        for result in computed:
+            results[result['name']] = finish(result)
+        
+        ordered = [results[name] for name in names] + failures
+        failed = sum(1 for result in ordered if not result['success'])
+        
+        if output_format == 'zip':
+            response = send_file(
+                io.BytesIO(write_zip(ordered)),
+                mimetype='application/zip',
+                as_attachment=True,
+                download_name='obfuscated.zip'
+            )
+            response.headers['X-Batch-Files'] = str(len(ordered))
+            response.headers['X-Batch-Failed'] = str(failed)
+            return response
+        
+        file_results = {}
+        for result in ordered:
+            describe(result)
+            file_results[result.pop('name')] = result
+        
+        payload = {
+            'results': file_results,
+            'file_count': len(ordered),
+            'failed': failed,
+            'level': level,
+            'success': True
+        }
+        if project_summary is not None:
+            payload['project'] = project_summary
+        return jsonify(payload)
+        
+    except (BatchError, json.JSONDecodeError) as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 400
+    except BudgetExceeded as e:
+        return budget_exceeded(e, 'batch')
+    except Overloaded as e:
+        return overloaded(e, 'batch')
+    except Exception as e:
+        logger.exception('Batch obfuscation error: %s', e)
+        return jsonify({
+            'error': f'Internal server error: {str(e)}',
+            'success': False
+        }), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue an obfuscation job to run in the background
+    
+    Takes the same JSON payload as /api/obfuscate and returns 202 with the
+    job id; poll GET /api/jobs/<id> and download GET /api/jobs/<id>/result
+    """
+    try:
+        data = request_payload()
+        
+        if not data:
+            return jsonify({
+                'error': 'No JSON data provided',
+                'success': False
+            }), 400
+        
+        lua_code = data.get('code', '')
+        if not lua_code.strip():
+            return jsonify({
+                'error': 'No Lua code provided',
+                'success': False
+            }), 400
+        
+        level = data.get('level', 'basic')
+        options = data.get('options', {})
+        seed = data.get('seed')
+        
+        if level not in obfuscator.LEVELS:
+            return jsonify({
+                'error': 'Invalid obfuscation level. Use: basic, medium, advanced, or extreme',
+                'success': False
+            }), 400
+        options_error = invalid_options(options)
+        if options_error:
+            return jsonify({
+                'error': options_error,
+                'success': False
+            }), 400
+        if not is_valid_seed(seed):
+            return jsonify({
+                'error': 'Seed must be an integer or a string',
+                'success': False
+            }), 400
+        
+        job = create_job(lua_code, level, options, seed)
+        annotate_trace(level=level, input_size=len(lua_code), job_id=job.id)
+        response = jsonify({
+            **job_status(job),
+            'status_url': url_for('get_job', job_id=job.id),
+            'result_url': url_for('get_job_result', job_id=job.id),
             'success': True
         })
+        response.status_code = 202
+        response.headers['Location'] = url_for('get_job', job_id=job.id)
+        return response
         
+    except json.JSONDecodeError as e:
+        return jsonify({
+            'error': f'Options are not valid JSON: {e}',
+            'success': False
+        }), 400
     except Exception as e:
-        logging.error(f"Obfuscation error: {str(e)}")
+        db.session.rollback()
+        logger.exception('Job submission error: %s', e)
         return jsonify({
             'error': f'Internal server error: {str(e)}',
             'success': False
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and per-pass progress of a background job"""
+    job = db.session.get(ObfuscationJob, job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job not found',
+            'success': False
+        }), 404
+    
+    status = job_status(job)
+    if job.status == 'done':
+        status['result_url'] = url_for('get_job_result', job_id=job.id)
+    return jsonify({**status, 'success': True})
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download the obfuscated code of a finished job"""
+    job = db.session.get(ObfuscationJob, job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job not found',
+            'success': False
+        }), 404
+    if job.status != 'done':
+        return jsonify({
+            'error': f'Job is {job.status}, no result available',
+            'status': job.status,
+            'success': False
+        }), 409
+    
+    response = app.response_class(job.result, mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename=obfuscated_{job.id}.lua'
+    return response
+
 @app.route('/api/validate', methods=['POST'])
 def validate_lua():
     """
     Validate Lua code syntax
     
-    Expected JSON payload:
+    Expected JSON payload (or the code as a raw text/plain body):
     {
         "code": "lua code string"
     }
     """
     try:
-        data = request.get_json()
+        data = request_payload()
         
         if not data:
             return jsonify({
@@ -127,7 +1133,15 @@ def validate_lua():
                 'success': False
             }), 400
         
-        is_valid, error_msg = lua_parser.validate_syntax(lua_code)
+        rejection = over_cost(len(lua_code) * SOURCE_COST, 'validate')
+        if rejection is not None:
+            return rejection
+        
+        with compute_slot(len(lua_code)):
+            is_valid, error_msg = lua_parser.validate_syntax(lua_code)
+        annotate_trace(input_size=len(lua_code), valid=is_valid)
+        if not is_valid:
+            validation_failures.inc(endpoint='validate')
         
         return jsonify({
             'valid': is_valid,
@@ -135,8 +1149,107 @@ def validate_lua():
             'success': True
         })
         
+    except BudgetExceeded as e:
+        return budget_exceeded(e, 'validate')
+    except Overloaded as e:
+        return overloaded(e, 'validate')
     except Exception as e:
-        logging.error(f"Validation error: {str(e)}")
+        logger.exception('Validation error: %s', e)
+        return jsonify({
+            'error': f'Internal server error: {str(e)}',
+            'success': False
+        }), 500
+
+@app.route('/api/validate/live', methods=['POST'])
+def validate_live():
+    """
+    Validate Lua code as it is edited, re-checking only what an edit touched
+    
+    Expected JSON payload, either the whole text (to start or resynchronize
+    a session):
+    {
+        "code": "lua code string",
+        "session": "id" (optional, a new session is started without it)
+    }
+    or the edits made since the version the server last returned:
+    {
+        "session": "id",
+        "version": 3,
+        "edits": [{"start": 10, "end": 12, "text": "replacement"}, ...]
+    }
+    Offsets count characters. A 409 with "resync": true asks for the whole text.
+    """
+    try:
+        data = request_payload()
+        
+        if not data:
+            return jsonify({
+                'error': 'No JSON data provided',
+                'success': False
+            }), 400
+        
+        session_id = data.get('session')
+        if session_id is None and 'code' in data:
+            session_id = uuid.uuid4().hex
+        if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+            return jsonify({
+                'error': 'Session must be a string of 1 to 128 characters',
+                'success': False
+            }), 400
+        
+        if 'code' in data:
+            lua_code = data['code']
+            if not isinstance(lua_code, str):
+                return jsonify({
+                    'error': 'Code must be a string',
+                    'success': False
+                }), 400
+            rejection = over_cost(len(lua_code) * SOURCE_COST, 'validate_live')
+            if rejection is not None:
+                return rejection
+            with compute_slot(len(lua_code)):
+                result = live_validator.open(session_id, lua_code)
+        else:
+            edits = data.get('edits')
+            version = data.get('version')
+            if not isinstance(edits, list) or not isinstance(version, int):
+                return jsonify({
+                    'error': 'Send either code, or version and a list of edits',
+                    'success': False
+                }), 400
+            # What an edit costs depends on the chunks it touches; the budget bounds it
+            size = sum(len(edit['text']) for edit in edits
+                       if isinstance(edit, dict) and isinstance(edit.get('text'), str))
+            with compute_slot(size):
+                result = live_validator.edit(session_id, version, edits)
+        
+        annotate_trace(session=session_id, valid=result['valid'], **result['stats'])
+        if not result['valid']:
+            validation_failures.inc(endpoint='validate_live')
+        
+        return jsonify({
+            'session': session_id,
+            **result,
+            'success': True
+        })
+        
+    except StaleSession as e:
+        return jsonify({
+            'error': str(e),
+            'resync': True,
+            'success': False
+        }), 409
+    except EditError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 400
+    except BudgetExceeded as e:
+        return budget_exceeded(e, 'validate_live')
+    except Overloaded as e:
+        return overloaded(e, 'validate_live')
+    except Exception as e:
+        logger.exception('Live validation error: %s', e)
         return jsonify({
             'error': f'Internal server error: {str(e)}',
             'success': False
@@ -150,6 +1263,7 @@ def get_techniques():
         'techniques': {
             'rename_variables': 'Rename variables to random strings',
             'encode_strings': 'Encode string literals',
+            'string_pool': 'Store encoded strings in one constant table with a shared, memoized decoder',
             'remove_comments': 'Remove all comments',
             'minify': 'Remove unnecessary whitespace',
             'obfuscate_control_flow': 'Add dummy control flow statements',
@@ -164,9 +1278,17 @@ def get_techniques():
             'advanced': 'Medium + control flow and metatable obfuscation',
             'extreme': 'Advanced + function call obfuscation, fake functions, and number obfuscation'
         },
+        'passes': {name: spec.describe() for name, spec in PASSES.items()},
+        'level_pipelines': {level: Pipeline(names).describe() for level, names in LEVEL_PASSES.items()},
         'version': obfuscator.VERSION,
         'success': True
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for this server process"""
+    return app.response_class(metrics_registry.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
 if __name__ == '__main__':
+    start_job_workers()
     app.run(host='0.0.0.0', port=5000, debug=True)
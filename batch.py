@@ -0,0 +1,192 @@
+import io
+import os
+import atexit
+import logging
+import tarfile
+import zipfile
+import threading
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from obfuscator import LuaObfuscator
+from lua_parser import LuaParser
+import budget
+from budget import Budget, BudgetExceeded
+
+logger = logging.getLogger(__name__)
+
+LUA_EXTENSIONS = ('.lua',)
+
+# Per-process instances used inside the pool workers
+_obfuscator = LuaObfuscator()
+_parser = LuaParser()
+
+
+class BatchError(ValueError):
+    """Raised when a batch request or archive cannot be accepted"""
+
+
+def obfuscate_file(job, limits=None):
+    """
+    Validate and obfuscate one (name, code, level, options, seed, validate) job
+    Runs inside a pool worker, so it must stay a picklable top-level function.
+    With `limits`, a (seconds, work) pair, the job runs under a Budget of its
+    own and running past it fails just this file
+    """
+    name, code, level, options, seed, validate = job
+    token = budget.start(Budget(*limits)) if limits is not None else None
+    try:
+        source = code
+        if validate:
+            source, error_msg = _parser.parse_source(code)
+            if source is None:
+                return {'name': name, 'success': False, 'error': f'Invalid Lua syntax: {error_msg}'}
+        result = _obfuscator.obfuscate(source, level, options, seed)
+        return {'name': name, 'success': True, 'obfuscated_code': result}
+    except BudgetExceeded as e:
+        if limits is None:
+            # The budget of the caller's thread; it ends the whole request
+            raise
+        return {'name': name, 'success': False, 'error': f'Request aborted: {e}'}
+    except Exception as e:
+        return {'name': name, 'success': False, 'error': f'Obfuscation failed: {e}'}
+    finally:
+        if token is not None:
+            budget.stop(token)
+
+
+def read_archive(stream, filename, max_files, max_bytes):
+    """
+    Return ([(name, code)], failures) for the Lua files in a zip or tar
+    upload; `failures` holds a failed result for each member that is not
+    UTF-8. Directories and non-Lua members are skipped; the uncompressed
+    total is capped by `max_bytes` so a small archive cannot expand without bound
+    """
+    data = stream.read()
+    members = []
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(LUA_EXTENSIONS):
+                    members.append((info.filename, info.file_size, lambda info=info: archive.read(info)))
+            return _decode_members(members, max_files, max_bytes)
+    try:
+        archive = tarfile.open(fileobj=io.BytesIO(data), mode='r:*')
+    except tarfile.TarError:
+        raise BatchError(f"Unsupported archive '{filename}': expected a zip or tar file")
+    with archive:
+        for info in archive.getmembers():
+            if info.isfile() and info.name.lower().endswith(LUA_EXTENSIONS):
+                members.append((info.name, info.size, lambda info=info: archive.extractfile(info).read()))
+        return _decode_members(members, max_files, max_bytes)
+
+
+def _decode_members(members, max_files, max_bytes):
+    if not members:
+        raise BatchError('Archive contains no .lua files')
+    if len(members) > max_files:
+        raise BatchError(f'Too many files: {len(members)} (limit {max_files})')
+    total = sum(size for _, size, _ in members)
+    if total > max_bytes:
+        raise BatchError(f'Archive expands to {total} bytes (limit {max_bytes})')
+    files = []
+    failures = []
+    for name, _, read in members:
+        try:
+            files.append((name, read().decode('utf-8')))
+        except UnicodeDecodeError as e:
+            # Obfuscating a replaced copy would change its string literals
+            failures.append({'name': name, 'success': False, 'error': f'Not valid UTF-8: {e}'})
+    return files, failures
+
+
+def write_zip(results):
+    """Pack successful results into a zip, with failures listed in errors.txt"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        errors = []
+        for result in results:
+            if result['success']:
+                archive.writestr(result['name'], result['obfuscated_code'])
+            else:
+                errors.append(f"{result['name']}: {result['error']}")
+        if errors:
+            archive.writestr('errors.txt', '\n'.join(errors) + '\n')
+    return buffer.getvalue()
+
+
+class BatchProcessor:
+    """
+    Fans obfuscation jobs out over a process pool
+
+    Obfuscation is CPU-bound Python, so threads serialize on the GIL; a
+    process pool lets a batch use every core. The pool is created on first
+    use and started with 'forkserver' where available, because forking a
+    threaded server process can copy held locks into the children. With
+    `nice`, the workers run at that lower CPU priority, so a large batch
+    leaves the cores to request handling first.
+    """
+
+    def __init__(self, max_workers=None, nice=0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.nice = nice
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                initializer = os.nice if self.nice and hasattr(os, 'nice') else None
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                     initializer=initializer, initargs=(self.nice,) if initializer else ())
+                atexit.register(self.shutdown)
+                logger.info('Started batch pool with %s workers', self.max_workers)
+            return self._executor
+
+    def inline(self, jobs):
+        """Whether run() and iter_run() compute `jobs` in the calling thread instead of the pool"""
+        return len(jobs) < 2 or self.max_workers == 1
+
+    def run(self, jobs, limits=None):
+        """
+        Return one result dict per job, in job order
+        Jobs sent to the pool each get a Budget of `limits`, a (seconds, work)
+        pair; jobs computed inline run under the calling thread's budget
+        """
+        if self.inline(jobs):
+            return [obfuscate_file(job) for job in jobs]
+        return self.map(functools.partial(obfuscate_file, limits=limits), jobs)
+
+    def map(self, function, items):
+        """Return [function(item) for item in items], computed in the pool"""
+        items = list(items)
+        if len(items) < 2 or self.max_workers == 1:
+            return [function(item) for item in items]
+        # Larger chunks amortize pickling for big batches of small files
+        chunksize = max(1, len(items) // (self.max_workers * 4))
+        return list(self._get_executor().map(function, items, chunksize=chunksize))
+
+    def iter_run(self, jobs, limits=None):
+        """Yield one result dict per job as soon as it finishes, in completion order; see run() for `limits`"""
+        if self.inline(jobs):
+            for job in jobs:
+                yield obfuscate_file(job)
+            return
+        executor = self._get_executor()
+        futures = [executor.submit(obfuscate_file, job, limits) for job in jobs]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # A client that disconnects mid-stream should not keep the pool busy
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1 @@
+"""Performance benchmarks for the Lua obfuscator (run with python -m benchmarks.<name>)"""
@@ -0,0 +1,60 @@
+"""
+Concurrent obfuscation throughput benchmark
+
+Runs the same batch of seeded obfuscation jobs through one shared
+LuaObfuscator with an increasing number of worker threads (or processes)
+and reports jobs per second. Every result is compared with a sequential
+run using the same seed, so any shared-state bug shows up as a mismatch.
+
+    python -m benchmarks.bench_concurrency --workers 1 2 4 8
+    python -m benchmarks.bench_concurrency --executor process
+
+Obfuscation is CPU-bound Python, so thread scaling is limited by the GIL;
+process workers (gunicorn workers, the batch endpoint) scale with cores.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from obfuscator import LuaObfuscator
+from benchmarks.bench_rename import generate_source
+
+obfuscator = LuaObfuscator()
+
+
+def run_job(args):
+    code, level, seed = args
+    return obfuscator.obfuscate(code, level, {}, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--jobs', type=int, default=64, help='jobs per measurement')
+    parser.add_argument('--identifiers', type=int, default=400, help='size of each job')
+    parser.add_argument('--level', default='medium', choices=LuaObfuscator.LEVELS)
+    parser.add_argument('--executor', default='thread', choices=['thread', 'process'])
+    args = parser.parse_args()
+
+    code = generate_source(args.identifiers)
+    jobs = [(code, args.level, seed) for seed in range(args.jobs)]
+    expected = [run_job(job) for job in jobs]
+    executor_class = ThreadPoolExecutor if args.executor == 'thread' else ProcessPoolExecutor
+
+    print(f"{args.jobs} {args.level} jobs of {len(code)} bytes, {args.executor} executor")
+    print(f"{'workers':>8} {'seconds':>10} {'jobs/s':>10} {'speedup':>8} {'identical':>10}")
+    baseline = None
+    for workers in args.workers:
+        with executor_class(max_workers=workers) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(run_job, jobs))
+            elapsed = time.perf_counter() - start
+        throughput = args.jobs / elapsed
+        if baseline is None:
+            baseline = throughput
+        identical = results == expected
+        print(f"{workers:>8} {elapsed:>10.3f} {throughput:>10.1f} {throughput / baseline:>8.2f} {str(identical):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Runtime overhead of the metatable layer
+
+Runs Lua workloads before and after obfuscate_with_metatables in an
+embedded Lua 5.1 interpreter and reports the slowdown of the main loop and
+the cost of the layer's setup. The layer's stated target is below 5% on
+global-heavy loops; the run exits with status 1 when a workload misses it.
+
+    python -m benchmarks.bench_env
+    python -m benchmarks.bench_env --iterations 5000000 --target 0.05
+
+Needs the optional `lupa` package (pip install lupa); it is not a
+dependency of the service.
+"""
+import sys
+import time
+import argparse
+
+from obfuscator import LuaObfuscator
+
+SEED = 1234
+
+WORKLOADS = {
+    # Library and global reads on every iteration
+    'globals': '''
+local total = 0
+for i = 1, ITERATIONS do
+    total = total + math.floor(i / 3) + (type(i) == "number" and 1 or 0)
+    counter = (counter or 0) + 1
+end
+return total
+''',
+    # Calls to top-level functions from a loop, which must stay unproxied
+    'calls': '''
+local function step(value)
+    return value % 7
+end
+function accumulate(total, value)
+    return total + step(value)
+end
+local total = 0
+for i = 1, ITERATIONS do
+    total = accumulate(total, i)
+end
+return total
+''',
+    # Table fields, including a table the layer may tag with a metatable
+    'tables': '''
+local state = {x = 0, y = 0}
+local config = {speed = 3}
+for i = 1, ITERATIONS do
+    state.x = state.x + config.speed
+    state.y = state.x % 11
+end
+return state.y
+''',
+}
+
+
+def load_lua():
+    try:
+        from lupa import lua51
+    except ImportError:
+        return None
+    return lua51
+
+
+def best_times(functions, repeat):
+    """Best time of each function, interleaving their runs so drift hits all alike"""
+    best = [None] * len(functions)
+    for _ in range(repeat):
+        for i, function in enumerate(functions):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def compile_chunk(lua, code):
+    # A fresh runtime per chunk, so globals written by one run never leak into another
+    runtime = lua.LuaRuntime()
+    return runtime.eval('function(code) return assert(loadstring(code)) end')(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000000, help='loop iterations per workload')
+    parser.add_argument('--repeat', type=int, default=9, help='timed runs per case (best is reported)')
+    parser.add_argument('--target', type=float, default=0.05, help='allowed relative slowdown')
+    args = parser.parse_args()
+
+    lua = load_lua()
+    if lua is None:
+        print('lupa is not installed; pip install lupa to run this benchmark', file=sys.stderr)
+        return 2
+
+    obfuscator = LuaObfuscator()
+    print(f"{'workload':<10} {'original s':>11} {'layered s':>10} {'overhead':>9}")
+    missed = 0
+    for name, template in WORKLOADS.items():
+        code = template.replace('ITERATIONS', str(args.iterations))
+        layered = obfuscator.obfuscate_with_metatables(code, SEED)
+        original_chunk = compile_chunk(lua, code)
+        layered_chunk = compile_chunk(lua, layered)
+        if original_chunk() != layered_chunk():
+            raise SystemExit(f'{name}: the layered code returned a different result')
+        original, with_layer = best_times([original_chunk, layered_chunk], args.repeat)
+        overhead = with_layer / original - 1
+        missed += overhead > args.target
+        flag = '  over target' if overhead > args.target else ''
+        print(f"{name:<10} {original:>11.4f} {with_layer:>10.4f} {overhead:>+9.1%}{flag}")
+
+    # Setup alone: the layer in front of an empty chunk
+    empty = compile_chunk(lua, 'return 1')
+    setup = compile_chunk(lua, obfuscator.obfuscate_with_metatables('return 1', SEED))
+    runs = 2000
+    with_setup, without = best_times([lambda: [setup() for _ in range(runs)],
+                                      lambda: [empty() for _ in range(runs)]], args.repeat)
+    setup_cost = (with_setup - without) / runs
+    print(f"setup cost {setup_cost * 1e6:.1f} us per run")
+    print(f"{missed} workload(s) over the {args.target:.0%} target")
+    return 1 if missed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Resubmission latency of incremental mode against a full obfuscation
+
+For each size, a script of top-level functions is obfuscated in full, then
+submitted to an incremental session, then resubmitted after a one-line
+edit to one function. The edit should cost about the same at every size.
+
+    python -m benchmarks.bench_incremental
+    python -m benchmarks.bench_incremental --sizes 1MB 10MB --levels medium
+"""
+import time
+import random
+import argparse
+
+from obfuscator import LuaObfuscator
+from incremental import IncrementalObfuscator
+from pipeline import Pipeline
+from benchmarks.corpus import SIZES, _function_block
+
+SEED = 1234
+
+
+def generate_script(size, seed=0):
+    """Synthetic source of about `size` bytes made of global top-level functions"""
+    rng = random.Random(seed)
+    blocks = ['local helpers = {}\n']
+    length = 0
+    n = 0
+    while length < size:
+        # Global functions, so the script stays within Lua's 200 locals
+        block = _function_block(n, rng).replace('local function ', 'function ', 1)
+        blocks.append(block)
+        length += len(block) + 1
+        n += 1
+    blocks.append('print(#helpers)\n')
+    return '\n'.join(blocks)
+
+
+def edit(code, n):
+    """Insert a statement into the function that starts after the middle of the script"""
+    start = code.index('\nfunction ', len(code) // 2)
+    line_end = code.index('\n', start + 1)
+    return f'{code[:line_end]}\n    local edit_{n} = {n}{code[line_end:]}'
+
+
+def best_time(run, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['100KB', '1MB'],
+                        choices=list(SIZES), help='script sizes')
+    parser.add_argument('--levels', nargs='+', default=['basic', 'medium'],
+                        choices=LuaObfuscator.LEVELS, help='obfuscation levels')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, best one reported')
+    args = parser.parse_args()
+
+    obfuscator = LuaObfuscator()
+    incremental = IncrementalObfuscator(obfuscator)
+    print(f"{'input':<10} {'level':<8} {'chunks':>7} {'full ms':>9} {'first ms':>9} {'edit ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        code = generate_script(SIZES[size])
+        for level in args.levels:
+            pipeline = Pipeline.for_level(level)
+            full = best_time(lambda: obfuscator.obfuscate(code, level, None, SEED), args.repeat)
+
+            session = f'{size}-{level}'
+            start = time.perf_counter()
+            _, stats = incremental.obfuscate(session, code, pipeline, None, SEED)
+            first = time.perf_counter() - start
+
+            # Alternate between two edits so every run changes one chunk
+            edits = [edit(code, 1), edit(code, 2)]
+            runs = iter(range(args.repeat))
+            resubmit = best_time(
+                lambda: incremental.obfuscate(session, edits[next(runs) % 2], pipeline, None, SEED), args.repeat)
+            print(f"{size:<10} {level:<8} {stats['chunks']:>7} {full * 1000:>9.1f} {first * 1000:>9.1f} "
+                  f"{resubmit * 1000:>9.1f} {full / resubmit:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Keystroke latency of live validation against a full validation
+
+For each size, a script of top-level functions is validated in full with
+LuaParser.validate_syntax, then opened in a live validation session, and a
+line is typed into the function after the middle of the script one
+character at a time, each sent as an edit. A keystroke should cost about
+the same at every size.
+
+    python -m benchmarks.bench_live
+    python -m benchmarks.bench_live --sizes 1MB 10MB
+"""
+import time
+import argparse
+
+from lua_parser import LuaParser
+from live_validation import LiveValidator
+from benchmarks.corpus import SIZES
+from benchmarks.bench_incremental import generate_script
+
+TYPED = '    local typed = helpers[1]\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['100KB', '1MB'],
+                        choices=list(SIZES), help='script sizes')
+    args = parser.parse_args()
+
+    lua_parser = LuaParser()
+    print(f"{'size':>8} {'full ms':>9} {'open ms':>9} {'key p50 ms':>11} {'key max ms':>11} {'chunks':>7}")
+    for size in args.sizes:
+        code = generate_script(SIZES[size])
+        start = time.perf_counter()
+        lua_parser.validate_syntax(code)
+        full = time.perf_counter() - start
+
+        validator = LiveValidator(lua_parser)
+        start = time.perf_counter()
+        result = validator.open('bench', code)
+        opened = time.perf_counter() - start
+
+        function = code.index('\nfunction ', len(code) // 2)
+        pos = code.index('\n', function + 1) + 1
+        keystrokes = []
+        for i, char in enumerate(TYPED):
+            start = time.perf_counter()
+            result = validator.edit('bench', result['version'], [{'start': pos + i, 'end': pos + i, 'text': char}])
+            keystrokes.append(time.perf_counter() - start)
+        keystrokes.sort()
+        print(f"{size:>8} {full * 1000:>9.1f} {opened * 1000:>9.1f} {keystrokes[len(keystrokes) // 2] * 1000:>11.2f} "
+              f"{keystrokes[-1] * 1000:>11.2f} {result['stats']['chunks']:>7}")
+
+
+if __name__ == '__main__':
+    main()
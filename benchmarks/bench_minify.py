@@ -0,0 +1,62 @@
+"""
+Output size of the minifier and of frequency-ranked short identifiers
+
+For the synthetic corpus and the samples, reports the bytes (raw and
+gzipped, as sent over the wire) of the whitespace-only minifier, of the
+minifier with short_names, and of the medium level with and without
+short_names. Every output is checked to parse.
+
+    python -m benchmarks.bench_minify
+    python -m benchmarks.bench_minify --sizes 10KB 1MB
+"""
+import gzip
+import argparse
+
+from obfuscator import LuaObfuscator
+from lua_parser import LuaParser
+from benchmarks.corpus import SIZES
+from benchmarks.bench_suite import build_inputs
+
+SEED = 1234
+
+
+def build_variants(obfuscator):
+    """Return [(name, callable(code) -> output)]; the first is the reference"""
+    medium = {'rename_variables': True, 'remove_comments': True, 'encode_strings': False, 'minify': True}
+    return [
+        ('minify', obfuscator.minify_code),
+        ('minify+short_names', lambda code: obfuscator.minify_code(code, short_names=True, rng=SEED)),
+        ('medium', lambda code: obfuscator.obfuscate(code, 'medium', medium, SEED)),
+        ('medium+short_names', lambda code: obfuscator.obfuscate(
+            code, 'medium', dict(medium, short_names=True), SEED)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['10KB', '100KB', '1MB'],
+                        choices=list(SIZES), help='synthetic corpus sizes')
+    parser.add_argument('--no-samples', action='store_true', help='skip the real-world-shaped samples')
+    args = parser.parse_args()
+
+    lua_parser = LuaParser()
+    variants = build_variants(LuaObfuscator())
+    print(f"{'input':<24} {'variant':<20} {'bytes':>10} {'gzip':>9} {'vs minify':>10} {'gzip vs':>8}")
+    for input_name, code in build_inputs(args.sizes, samples=not args.no_samples):
+        reference = None
+        print(f"{input_name:<24} {'(source)':<20} {len(code):>10} {len(gzip.compress(code.encode())):>9}")
+        for name, variant in variants:
+            output = variant(code)
+            valid, error = lua_parser.validate_syntax(output)
+            if not valid:
+                raise SystemExit(f'{input_name}/{name} produced invalid Lua: {error}')
+            size = len(output.encode())
+            zipped = len(gzip.compress(output.encode()))
+            if reference is None:
+                reference = (size, zipped)
+            print(f"{'':<24} {name:<20} {size:>10} {zipped:>9} "
+                  f"{size / reference[0] - 1:>+10.1%} {zipped / reference[1] - 1:>+8.1%}")
+
+
+if __name__ == '__main__':
+    main()
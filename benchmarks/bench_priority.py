@@ -0,0 +1,94 @@
+"""
+Interactive latency under bulk load benchmark
+
+Keeps a number of bulk clients busy submitting large obfuscation jobs from
+their own threads, as gunicorn request threads would, while one interactive
+client submits small jobs one after another. The run is repeated with every
+job admitted at once (no scheduler) and through scheduler.Scheduler, and the
+interactive latency percentiles and bulk throughput are reported for each.
+
+    python -m benchmarks.bench_priority --bulk-clients 4 --seconds 10
+
+With every job admitted, the interactive job shares the interpreter lock with
+all bulk jobs; with the scheduler it shares it with at most `slots - 1`.
+"""
+import argparse
+import time
+import threading
+from contextlib import nullcontext
+
+from obfuscator import LuaObfuscator
+from scheduler import Scheduler, Overloaded, INTERACTIVE, BULK
+from benchmarks.bench_rename import generate_source
+
+obfuscator = LuaObfuscator()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(scheduler, bulk_code, interactive_code, bulk_clients, seconds, level):
+    stop = threading.Event()
+    bulk_done = []
+    latencies = []
+
+    def slot(lane, client):
+        return scheduler.slot(lane, client) if scheduler is not None else nullcontext(0.0)
+
+    def bulk_client(client):
+        seed = 0
+        while not stop.is_set():
+            try:
+                with slot(BULK, client):
+                    obfuscator.obfuscate(bulk_code, level, {}, seed)
+                bulk_done.append(client)
+            except Overloaded as e:
+                # A real client honours Retry-After; sleep briefly instead
+                time.sleep(min(e.retry_after, 0.05))
+            seed += 1
+
+    threads = [threading.Thread(target=bulk_client, args=(f'bulk-{n}',)) for n in range(bulk_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    deadline = time.perf_counter() + seconds
+    seed = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with slot(INTERACTIVE, 'ui'):
+            obfuscator.obfuscate(interactive_code, level, {}, seed)
+        latencies.append(time.perf_counter() - start)
+        seed += 1
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, len(bulk_done) / (seconds + 0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bulk-clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0, help='duration of each measurement')
+    parser.add_argument('--bulk-identifiers', type=int, default=2000, help='size of each bulk job')
+    parser.add_argument('--interactive-identifiers', type=int, default=50, help='size of each interactive job')
+    parser.add_argument('--slots', type=int, default=2)
+    parser.add_argument('--level', default='medium', choices=LuaObfuscator.LEVELS)
+    args = parser.parse_args()
+
+    bulk_code = generate_source(args.bulk_identifiers)
+    interactive_code = generate_source(args.interactive_identifiers)
+    print(f"{args.bulk_clients} bulk clients ({len(bulk_code)} bytes), "
+          f"interactive jobs of {len(interactive_code)} bytes, {args.level}")
+    print(f"{'mode':>10} {'jobs':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'bulk/s':>8}")
+    modes = [('unlimited', None), ('scheduled', Scheduler(slots=args.slots, reserved=1, max_wait=args.seconds))]
+    for mode, scheduler in modes:
+        latencies, bulk_rate = measure(scheduler, bulk_code, interactive_code, args.bulk_clients,
+                                       args.seconds, args.level)
+        print(f"{mode:>10} {len(latencies):>6} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} {bulk_rate:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Identifier renaming scaling benchmark
+
+Generates Lua sources with a growing number of locals and times
+LuaObfuscator.rename_variables on each. With the single-pass renaming
+engine the time per identifier should stay flat as the file grows.
+
+    python -m benchmarks.bench_rename --sizes 1000 2000 5000 10000
+"""
+import argparse
+import time
+
+from obfuscator import LuaObfuscator
+
+
+def generate_source(identifiers):
+    """Build a chunk declaring roughly `identifiers` distinct locals"""
+    lines = []
+    for i in range(0, identifiers, 4):
+        lines.append(f"local function fn_{i}(arg_{i}, opt_{i})")
+        lines.append(f"    local value_{i} = arg_{i} + (opt_{i} or {i})")
+        lines.append(f"    local label_{i} = 'item' .. value_{i}")
+        lines.append(f"    return value_{i}, label_{i}")
+        lines.append("end")
+    lines.append("print(fn_0(1))")
+    return '\n'.join(lines) + '\n'
+
+
+def time_rename(obfuscator, code, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        obfuscator.rename_variables(code)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000, 5000, 10000],
+                        help='number of identifiers per generated file')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size (best is reported)')
+    args = parser.parse_args()
+
+    obfuscator = LuaObfuscator()
+    baseline = None
+
+    print(f"{'identifiers':>12} {'bytes':>10} {'seconds':>10} {'us/ident':>10} {'scaling':>8}")
+    for size in args.sizes:
+        code = generate_source(size)
+        elapsed = time_rename(obfuscator, code, args.repeat)
+        per_ident = elapsed / size * 1e6
+        if baseline is None:
+            baseline = per_ident
+        # 1.00 means perfectly linear relative to the smallest size
+        print(f"{size:>12} {len(code):>10} {elapsed:>10.4f} {per_ident:>10.2f} {per_ident / baseline:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
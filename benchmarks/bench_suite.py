@@ -0,0 +1,181 @@
+"""
+Benchmark suite for every obfuscation pass, level and the syntax validator
+
+Each target runs on the synthetic corpus at several sizes and on the
+real-world-shaped samples. For every case the suite reports throughput
+(MB/s of input, best of --repeat runs), peak traced memory and the output
+expansion ratio. With --save the results become the stored baseline; later
+runs compare against it and flag any case that is slower or uses more
+memory by more than --threshold, exiting with status 1.
+
+    python -m benchmarks.bench_suite --save
+    python -m benchmarks.bench_suite --sizes 1KB 100KB 1MB --filter _obfuscation
+    python -m benchmarks.bench_suite --sizes 10MB --targets extreme_obfuscation
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+from obfuscator import LuaObfuscator
+from lua_parser import LuaParser
+from benchmarks.corpus import SIZES, generate_corpus, load_samples
+
+SEED = 1234
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'baseline.json')
+
+
+def build_targets(obfuscator, parser):
+    """Return [(name, callable(code) -> output or None)] in report order"""
+    return [
+        ('validate_syntax', lambda code: parser.validate_syntax(code) and None),
+        ('rename_variables', lambda code: obfuscator.rename_variables(code, SEED)),
+        ('encode_strings', lambda code: obfuscator.encode_strings(code, rng=SEED)),
+        ('encode_strings_pooled', lambda code: obfuscator.encode_strings(code, pooled=True, rng=SEED)),
+        ('remove_comments', obfuscator.remove_comments),
+        ('minify_code', obfuscator.minify_code),
+        ('obfuscate_numbers', lambda code: obfuscator.obfuscate_numbers(code, SEED)),
+        ('obfuscate_control_flow', lambda code: obfuscator.obfuscate_control_flow(code, SEED)),
+        ('obfuscate_with_metatables', lambda code: obfuscator.obfuscate_with_metatables(code, SEED)),
+        ('obfuscate_function_calls', lambda code: obfuscator.obfuscate_function_calls(code, SEED)),
+        ('add_fake_functions', lambda code: obfuscator.add_fake_functions(code, SEED)),
+    ] + [
+        (f'{level}_obfuscation', lambda code, level=level: obfuscator.obfuscate(code, level, None, SEED))
+        for level in LuaObfuscator.LEVELS
+    ] + [
+        # Output goes to /dev/null, so peak memory is the pipeline's own
+        (f'{level}_large', lambda code, level=level: discard_large(obfuscator, code, level))
+        for level in LuaObfuscator.LEVELS
+    ]
+
+
+def discard_large(obfuscator, code, level):
+    with open(os.devnull, 'w', encoding='utf-8') as out:
+        obfuscator.obfuscate_large(code, out, level, None, SEED)
+
+
+def build_inputs(sizes, samples=True):
+    inputs = [(f'synthetic-{size}', generate_corpus(SIZES[size])) for size in sizes]
+    if samples:
+        inputs += [(f'sample-{name}', code) for name, code in load_samples().items()]
+    return inputs
+
+
+def measure(target, code, repeat, memory=True):
+    """Return (best seconds, peak traced bytes or None, output length or None)"""
+    output = target(code)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        target(code)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        # Traced separately: tracemalloc slows allocation-heavy code down
+        tracemalloc.start()
+        try:
+            target(code)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak, len(output) if output is not None else None
+
+
+def compare(result, baseline, threshold):
+    """Return the list of regressions of `result` against its baseline entry"""
+    flags = []
+    if baseline is None:
+        return flags
+    if result['seconds'] > baseline['seconds'] * (1 + threshold):
+        flags.append(f"time x{result['seconds'] / baseline['seconds']:.2f}")
+    if result['peak_bytes'] and baseline.get('peak_bytes') \
+            and result['peak_bytes'] > baseline['peak_bytes'] * (1 + threshold):
+        flags.append(f"memory x{result['peak_bytes'] / baseline['peak_bytes']:.2f}")
+    return flags
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'engine_version': LuaObfuscator.VERSION,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['1KB', '10KB', '100KB', '1MB'],
+                        choices=list(SIZES), help='synthetic corpus sizes')
+    parser.add_argument('--no-samples', action='store_true', help='skip the real-world-shaped samples')
+    parser.add_argument('--targets', nargs='+', help='only run these targets')
+    parser.add_argument('--filter', help='only run cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (best is reported)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--save', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative slowdown or memory growth flagged as a regression')
+    args = parser.parse_args()
+
+    targets = build_targets(LuaObfuscator(), LuaParser())
+    if args.targets:
+        targets = [(name, target) for name, target in targets if name in args.targets]
+    inputs = build_inputs(args.sizes, samples=not args.no_samples)
+
+    baseline = {}
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        if stored.get('environment') != environment():
+            print(f"note: baseline was recorded on {stored.get('environment')}", file=sys.stderr)
+
+    print(f"{'case':<52} {'bytes':>10} {'seconds':>9} {'MB/s':>8} {'peak MB':>9} {'ratio':>6}  regression")
+    results = {}
+    regressions = 0
+    for target_name, target in targets:
+        for input_name, code in inputs:
+            case = f'{target_name}/{input_name}'
+            if args.filter and args.filter not in case:
+                continue
+            seconds, peak, output_size = measure(target, code, args.repeat, memory=not args.no_memory)
+            result = {
+                'input_bytes': len(code),
+                'seconds': seconds,
+                'mb_per_s': len(code) / seconds / 1e6 if seconds else None,
+                'peak_bytes': peak,
+                'expansion': output_size / len(code) if output_size is not None else None,
+            }
+            results[case] = result
+            flags = compare(result, baseline.get(case), args.threshold)
+            regressions += bool(flags)
+            peak_text = f"{peak / 1e6:>9.2f}" if peak is not None else f"{'-':>9}"
+            ratio_text = f"{result['expansion']:>6.2f}" if result['expansion'] is not None else f"{'-':>6}"
+            print(f"{case:<52} {len(code):>10} {seconds:>9.4f} {result['mb_per_s']:>8.2f} "
+                  f"{peak_text} {ratio_text}  {', '.join(flags)}")
+
+    if args.save:
+        # Merge, so a filtered run only replaces the cases it measured
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                stored = json.load(f)['results']
+        stored.update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': stored}, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif baseline:
+        print(f"{regressions} regression(s) beyond {args.threshold:.0%} against {args.baseline}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
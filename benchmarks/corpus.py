@@ -0,0 +1,86 @@
+"""
+Benchmark inputs: a synthetic Lua corpus generator and real-world-shaped samples
+
+The synthetic corpus is built from function templates full of locals,
+string literals (with escapes and long brackets), numbers in every
+notation, nested closures, tables and control flow. Output depends only on
+the target size and seed, so runs on different machines time the same code.
+"""
+import os
+import random
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'samples')
+
+SIZES = {
+    '1KB': 1024,
+    '10KB': 10 * 1024,
+    '100KB': 100 * 1024,
+    '1MB': 1024 * 1024,
+    '10MB': 10 * 1024 * 1024,
+}
+
+
+def _function_block(n, rng):
+    """One top-level function exercising every kind of token the passes touch"""
+    op = rng.choice(['+', '-', '*', '%'])
+    number = rng.choice([str(rng.randint(0, 9999)), f'0x{rng.randint(0, 0xFFFF):X}',
+                         f'{rng.random() * 100:.3f}', f'{rng.randint(1, 9)}e{rng.randint(1, 5)}'])
+    text = rng.choice([
+        f'"item_{n}\\t\\"quoted\\"\\n"',
+        f"'single {n} \\\\ backslash'",
+        f'[[long bracket {n}\nspanning lines]]',
+        f'"unicode \\226\\152\\133 {n}"',
+    ])
+    return f'''-- helper {n}: {rng.choice(['accumulates values', 'builds a record', 'walks a list'])}
+local function helper_{n}(value_{n}, scale_{n}, ...)
+    local total_{n} = value_{n} {op} {number} + (scale_{n} or {rng.randint(1, 100)})
+    local label_{n} = {text} .. tostring(total_{n})
+    local record_{n} = {{ key = label_{n}, [{n}] = total_{n}, "entry", nested = {{ {rng.randint(1, 9)}, 2.5, -{rng.randint(1, 9)} }} }}
+    for index_{n} = 1, {rng.randint(2, 12)} do
+        local step_{n} = function(x_{n}) return x_{n} * index_{n} + {rng.randint(1, 1000)} end
+        total_{n} = total_{n} + step_{n}(index_{n}) % {rng.randint(2, 97)}
+    end
+    if total_{n} > {rng.randint(10, 500)} and label_{n} ~= "" then
+        record_{n}.key = string.format("%d:%s", {n}, label_{n})
+    elseif total_{n} < 0 then
+        return nil
+    end
+    local count_{n} = select("#", ...)
+    return record_{n}, count_{n}
+end
+helpers[{n}] = helper_{n}
+'''
+
+
+def generate_corpus(size, seed=0, group=50):
+    """Return synthetic Lua source of about `size` bytes"""
+    rng = random.Random(seed)
+    blocks = ['local helpers = {}\n']
+    length = 0
+    n = 0
+    while length < size:
+        # Lua allows 200 locals per function, so helpers are declared in do-blocks
+        if n % group == 0:
+            blocks.append('do\n')
+        block = _function_block(n, rng)
+        blocks.append(block)
+        length += len(block) + 1
+        n += 1
+        if n % group == 0:
+            blocks.append('end\n')
+    if n % group:
+        blocks.append('end\n')
+    blocks.append('local results = {}\n')
+    blocks.append(f'for i = 0, {min(n, 50) - 1} do results[#results + 1] = helpers[i](i, i % 7) end\n')
+    blocks.append('print(#results)\n')
+    return '\n'.join(blocks)
+
+
+def load_samples():
+    """Return {name: source} for the real-world-shaped samples"""
+    samples = {}
+    for filename in sorted(os.listdir(SAMPLES_DIR)):
+        if filename.endswith('.lua'):
+            with open(os.path.join(SAMPLES_DIR, filename), encoding='utf-8') as f:
+                samples[filename[:-4]] = f.read()
+    return samples
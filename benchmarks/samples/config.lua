@@ -0,0 +1,57 @@
+-- Data-heavy configuration table
+local config = {
+    version = "1.4.2",
+    debug = false,
+    window = { width = 1280, height = 720, fullscreen = false, vsync = true, scale = 1.5 },
+    audio = { master = 0.8, music = 0.6, effects = 1.0, voice = 0.9 },
+    keys = {
+        up = "w", down = "s", left = "a", right = "d",
+        jump = "space", attack = "mouse1", block = "mouse2", interact = "e",
+    },
+    levels = {
+        { name = "Harbor", music = "harbor.ogg", spawn = { x = 120, y = 640 }, enemies = 12, time = 300 },
+        { name = "Catacombs", music = "crypt.ogg", spawn = { x = 40, y = 80 }, enemies = 24, time = 420 },
+        { name = "Sky Keep", music = "keep.ogg", spawn = { x = 960, y = 32 }, enemies = 31, time = 600 },
+        { name = "Foundry", music = "foundry.ogg", spawn = { x = 512, y = 512 }, enemies = 18, time = 360 },
+    },
+    enemies = {
+        slime = { health = 20, damage = 2, speed = 0.75, drops = { "gel", "coin" }, chance = 0.35 },
+        skeleton = { health = 45, damage = 6, speed = 1.1, drops = { "bone", "coin", "rusty_sword" }, chance = 0.2 },
+        wraith = { health = 80, damage = 11, speed = 1.6, drops = { "ectoplasm" }, chance = 0.12 },
+        golem = { health = 300, damage = 25, speed = 0.4, drops = { "core", "ore", "ore" }, chance = 0.9 },
+    },
+    messages = {
+        welcome = "Welcome back, %s!\nYou have %d unread messages.",
+        death = "You died. Press [R] to respawn.",
+        save = 'Game saved at "%s"',
+        multiline = [[
+Line one of a long bracket string
+Line two with "quotes" and 'apostrophes'
+]],
+    },
+    xp_curve = { 0, 100, 250, 475, 800, 1250, 1850, 2625, 3600, 4800, 6250, 7975, 10000 },
+    colors = { 0xFF0000, 0x00FF00, 0x0000FF, 0xFFFF00, 0x00FFFF, 0xFF00FF },
+}
+
+local function level_for(xp)
+    local level = 1
+    for index, threshold in ipairs(config.xp_curve) do
+        if xp >= threshold then
+            level = index
+        end
+    end
+    return level
+end
+
+local function total_enemies()
+    local total = 0
+    for _, level in ipairs(config.levels) do
+        total = total + level.enemies
+    end
+    return total
+end
+
+print(string.format(config.messages.welcome, "Ada", 3))
+print(level_for(2000), total_enemies(), #config.levels)
+
+return config
@@ -0,0 +1,118 @@
+-- Inventory system in the style of a game client module
+local Inventory = {}
+Inventory.__index = Inventory
+
+local MAX_STACK = 64
+local RARITY_COLORS = {
+    common = "#ffffff",
+    uncommon = "#1eff00",
+    rare = "#0070dd",
+    epic = "#a335ee",
+    legendary = "#ff8000",
+}
+
+function Inventory.new(owner, capacity)
+    local self = setmetatable({}, Inventory)
+    self.owner = owner
+    self.capacity = capacity or 32
+    self.slots = {}
+    self.listeners = {}
+    return self
+end
+
+function Inventory:on(event, callback)
+    local list = self.listeners[event]
+    if not list then
+        list = {}
+        self.listeners[event] = list
+    end
+    list[#list + 1] = callback
+end
+
+function Inventory:emit(event, ...)
+    local list = self.listeners[event]
+    if list then
+        for _, callback in ipairs(list) do
+            callback(self, ...)
+        end
+    end
+end
+
+function Inventory:find(itemId)
+    for index = 1, self.capacity do
+        local slot = self.slots[index]
+        if slot and slot.id == itemId and slot.count < MAX_STACK then
+            return index, slot
+        end
+    end
+    return nil
+end
+
+function Inventory:add(item, count)
+    count = count or 1
+    while count > 0 do
+        local index, slot = self:find(item.id)
+        if not index then
+            for i = 1, self.capacity do
+                if self.slots[i] == nil then
+                    index = i
+                    slot = { id = item.id, name = item.name, rarity = item.rarity, count = 0 }
+                    self.slots[i] = slot
+                    break
+                end
+            end
+        end
+        if not index then
+            self:emit("full", item, count)
+            return false, "inventory full"
+        end
+        local moved = math.min(count, MAX_STACK - slot.count)
+        slot.count = slot.count + moved
+        count = count - moved
+        self:emit("changed", index, slot)
+    end
+    return true
+end
+
+function Inventory:remove(index, count)
+    local slot = self.slots[index]
+    if not slot then
+        return 0
+    end
+    local removed = math.min(count or slot.count, slot.count)
+    slot.count = slot.count - removed
+    if slot.count == 0 then
+        self.slots[index] = nil
+    end
+    self:emit("changed", index, self.slots[index])
+    return removed
+end
+
+function Inventory:describe(index)
+    local slot = self.slots[index]
+    if not slot then
+        return "[empty]"
+    end
+    local color = RARITY_COLORS[slot.rarity] or RARITY_COLORS.common
+    return string.format("<font color=\"%s\">%s</font> x%d", color, slot.name, slot.count)
+end
+
+function Inventory:serialize()
+    local parts = {}
+    for index = 1, self.capacity do
+        local slot = self.slots[index]
+        if slot then
+            parts[#parts + 1] = string.format("%d=%s:%d", index, slot.id, slot.count)
+        end
+    end
+    return table.concat(parts, ";")
+end
+
+local bag = Inventory.new("player", 8)
+bag:on("full", function(_, item) print("no room for " .. item.name) end)
+bag:add({ id = "potion", name = "Healing Potion", rarity = "common" }, 100)
+bag:add({ id = "sword", name = "Blade of Dawn", rarity = "legendary" })
+print(bag:describe(1), bag:describe(3))
+print(bag:serialize())
+
+return Inventory
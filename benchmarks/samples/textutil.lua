@@ -0,0 +1,72 @@
+-- String processing utilities
+local textutil = {}
+
+local escapes = { ["&"] = "&amp;", ["<"] = "&lt;", [">"] = "&gt;", ['"'] = "&quot;", ["'"] = "&#39;" }
+
+function textutil.escape_html(s)
+    return (string.gsub(s, "[&<>\"']", escapes))
+end
+
+function textutil.split(s, sep)
+    local parts, start = {}, 1
+    sep = sep or ","
+    while true do
+        local i, j = string.find(s, sep, start, true)
+        if not i then
+            parts[#parts + 1] = string.sub(s, start)
+            break
+        end
+        parts[#parts + 1] = string.sub(s, start, i - 1)
+        start = j + 1
+    end
+    return parts
+end
+
+function textutil.trim(s)
+    return (string.gsub(s, "^%s*(.-)%s*$", "%1"))
+end
+
+function textutil.wrap(s, width)
+    local lines, line = {}, ""
+    for word in string.gmatch(s, "%S+") do
+        if #line + #word + 1 > width and #line > 0 then
+            lines[#lines + 1] = line
+            line = word
+        elseif #line > 0 then
+            line = line .. " " .. word
+        else
+            line = word
+        end
+    end
+    if #line > 0 then
+        lines[#lines + 1] = line
+    end
+    return table.concat(lines, "\n")
+end
+
+function textutil.checksum(s)
+    local a, b = 1, 0
+    for i = 1, #s do
+        a = (a + string.byte(s, i)) % 65521
+        b = (b + a) % 65521
+    end
+    return b * 65536 + a
+end
+
+function textutil.template(s, vars)
+    return (string.gsub(s, "%${(%w+)}", function(key)
+        local value = vars[key]
+        if value == nil then
+            return "${" .. key .. "}"
+        end
+        return tostring(value)
+    end))
+end
+
+local sample = "  The quick brown fox <jumps> over the \"lazy\" dog & friends  "
+print(textutil.escape_html(textutil.trim(sample)))
+print(#textutil.split("a,b,,c"), textutil.checksum(sample))
+print(textutil.wrap(string.rep("lorem ipsum dolor ", 6), 24))
+print(textutil.template("Hello ${name}, you are ${age} (${missing})", { name = "Lua", age = 30 }))
+
+return textutil
@@ -0,0 +1,62 @@
+"""
+Time and work budgets for a single request
+
+A Budget is made current with start() and dropped with stop(). The pipeline
+calls checkpoint() before each pass, charging the bytes the pass reads
+weighted by its cost (see pipeline.Pipeline.cost), and the lexer, parser,
+code generator and line-based passes call it inside their long loops. A
+request that runs past its time or work limit is therefore abandoned at the
+next checkpoint with BudgetExceeded, instead of holding its worker until it
+finishes. The current budget lives in a context variable rather than being
+passed down, so those loops can check it without every signature carrying it.
+"""
+import time
+from contextvars import ContextVar
+
+_current = ContextVar('budget', default=None)
+
+
+class BudgetExceeded(Exception):
+    """Raised at a checkpoint once the current budget is used up; `kind` is 'time' or 'work'"""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+
+
+class Budget:
+    """
+    Limits for one request: `seconds` of wall time and `work` cost units
+    Either may be None for no limit
+    """
+
+    def __init__(self, seconds=None, work=None):
+        self.seconds = seconds
+        self.work = work
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.spent = 0
+
+    def charge(self, units=0, where=None):
+        """Add `units` of work and raise BudgetExceeded if either limit is passed"""
+        self.spent += units
+        suffix = f' in {where}' if where else ''
+        if self.work is not None and self.spent > self.work:
+            raise BudgetExceeded('work', f'Work budget of {self.work:.0f} units exceeded{suffix}')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded('time', f'Time budget of {self.seconds:g}s exceeded{suffix}')
+
+
+def start(budget):
+    """Make `budget` current and return the token to pass to stop()"""
+    return _current.set(budget)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def checkpoint(units=0, where=None):
+    """Charge the current budget, if there is one"""
+    budget = _current.get()
+    if budget is not None:
+        budget.charge(units, where)
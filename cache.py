@@ -0,0 +1,162 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, CachedResult
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(code, level, options, seed, version):
+    """Content hash identifying one obfuscation request"""
+    payload = json.dumps(
+        [level, options or {}, seed, version],
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    digest = hashlib.sha256()
+    digest.update(payload.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(code.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by the total size of its values"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLCacheTier:
+    """Cache tier stored in the application database, shared by all workers"""
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_age_seconds):
+        self.max_age = timedelta(seconds=max_age_seconds)
+        self._writes = 0
+
+    def get(self, key):
+        try:
+            row = db.session.get(CachedResult, key)
+            return row.result if row is not None else None
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning('Shared cache read failed: %s', e)
+            return None
+
+    def set(self, key, value):
+        try:
+            db.session.merge(CachedResult(key=key, result=value, size=len(value)))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                cutoff = datetime.utcnow() - self.max_age
+                CachedResult.query.filter(CachedResult.created_at < cutoff).delete()
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning('Shared cache write failed: %s', e)
+
+
+class ObfuscationCache:
+    """
+    Two-tier obfuscation result cache
+
+    Lookups go to the in-process LRU first and then to the optional shared
+    tier. Concurrent misses for the same key are coalesced so the result is
+    computed once and handed to every waiting request.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, shared=None):
+        self.memory = LRUCache(max_bytes)
+        self.shared = shared
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a cached result or None"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats['hits'] += 1
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.stats['shared_hits'] += 1
+                self.memory.set(key, value)
+                return value
+        return None
+
+    def put(self, key, value):
+        """Store a result computed outside get_or_compute()"""
+        self.memory.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return (result, cached) for `key`, calling compute() on a miss
+        Only one caller computes a given key at a time; the others wait for it
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, True
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            self.stats['coalesced'] += 1
+            return future.result(), True
+
+        self.stats['misses'] += 1
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            self.put(key, value)
+            return value, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -0,0 +1,214 @@
+"""
+Command-line bulk obfuscator
+
+Obfuscates every .lua file under SOURCE into the same layout under DEST,
+spreading the work over a process pool. A manifest records the input hash
+of each file together with the level, options, seed and engine version, so
+later runs only reprocess files that changed.
+
+    python cli.py src/ build/ --level extreme --seed 42 --jobs 8
+
+With --project, a symbol index of the whole tree (kept next to the manifest
+and updated the same way) gives the globals that files share one new name
+across every file; see symbol_index.py. At advanced and extreme it needs
+--options '{"obfuscate_metatables": false}', since the metatable layer
+gives every file an environment of its own for its globals.
+
+    python cli.py src/ build/ --level medium --seed 42 --project --keep onLoad onTick
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import itertools
+
+from obfuscator import LuaObfuscator
+from batch import BatchProcessor, LUA_EXTENSIONS
+from pipeline import Pipeline
+from symbol_index import SymbolIndex, PROJECT_METATABLES_ERROR
+
+MANIFEST_NAME = '.obfuscation-manifest.json'
+INDEX_NAME = '.symbol-index.json'
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_sources(root):
+    """Return sorted relative paths (with '/' separators) of Lua files under root"""
+    paths = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in filenames:
+            if filename.lower().endswith(LUA_EXTENSIONS):
+                path = os.path.relpath(os.path.join(directory, filename), root)
+                paths.append(path.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(path, manifest):
+    # Write then rename, so an interrupted run never leaves half a manifest
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_current(entry, input_hash, output_path, globals_hash=None):
+    """True when the previous output for this file can be kept"""
+    if entry is None or entry.get('input') != input_hash or entry.get('globals') != globals_hash:
+        return False
+    try:
+        with open(output_path, 'rb') as f:
+            return sha256(f.read()) == entry.get('output')
+    except OSError:
+        return False
+
+
+def run(source, dest, level, options, seed, workers, manifest_path, force=False, validate=True,
+        index_path=None, keep=()):
+    """
+    Obfuscate `source` into `dest` and return the number of failed files
+    With `index_path`, globals are renamed project-wide through the symbol
+    index saved there, except those listed in `keep`
+    """
+    settings = {'level': level, 'options': options, 'seed': seed, 'version': LuaObfuscator.VERSION}
+    previous = load_manifest(manifest_path) or {}
+    previous_files = previous.get('files', {})
+    reusable = {} if force or previous.get('settings') != settings else previous_files
+    processor = BatchProcessor(workers)
+
+    sources = {}
+    hashes = {}
+    errors = {}
+    for name in find_sources(source):
+        with open(os.path.join(source, name), 'rb') as f:
+            data = f.read()
+        hashes[name] = sha256(data)
+        try:
+            sources[name] = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A replaced copy would change the bytes of its string literals
+            errors[name] = f'not valid UTF-8: {e}'
+
+    global_names = {}
+    index = None
+    if index_path is not None:
+        index = SymbolIndex.load(index_path, seed, keep)
+        scanned = index.update(sources, processor)
+        global_names = index.global_names()
+        print(f"symbol index: {len(scanned)} files scanned, {len(global_names)} globals renamed project-wide")
+        for name, reason in index.blockers().items():
+            print(f"globals kept: {name} {reason}", file=sys.stderr)
+
+    files = {}
+    jobs = []
+    globals_hashes = {}
+    for name, code in sources.items():
+        # A file is redone when the new names of the globals it uses change
+        file_names = index.file_names(name, global_names) if index is not None else {}
+        globals_hashes[name] = sha256(json.dumps(file_names, sort_keys=True).encode()) if file_names else None
+        entry = reusable.get(name)
+        if is_current(entry, hashes[name], os.path.join(dest, name), globals_hashes[name]):
+            files[name] = entry
+        else:
+            file_options = {**options, 'global_names': file_names} if file_names else options
+            jobs.append((name, code, level, file_options, seed, validate))
+
+    print(f"{len(hashes)} files, {len(files)} unchanged, {len(jobs)} to obfuscate")
+
+    results = [{'name': name, 'success': False, 'error': error} for name, error in errors.items()]
+    failed = 0
+    for result in itertools.chain(results, processor.iter_run(jobs)):
+        name = result['name']
+        if not result['success']:
+            failed += 1
+            print(f"FAILED {name}: {result['error']}", file=sys.stderr)
+            # Kept without an output, so the file is retried next run and its
+            # output is removed once its source is
+            files[name] = {'input': hashes[name]}
+            continue
+        output = result['obfuscated_code'].encode('utf-8')
+        output_path = os.path.join(dest, name)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as f:
+            f.write(output)
+        files[name] = {'input': hashes[name], 'output': sha256(output)}
+        if globals_hashes[name] is not None:
+            files[name]['globals'] = globals_hashes[name]
+        print(f"obfuscated {name}")
+
+    # Outputs whose source was deleted since the last run
+    for name in previous_files.keys() - hashes.keys():
+        try:
+            os.remove(os.path.join(dest, name))
+            print(f"removed {name}")
+        except OSError:
+            pass
+
+    save_manifest(manifest_path, {'settings': settings, 'files': files})
+    if index is not None:
+        index.save()
+    print(f"done: {len(jobs) + len(errors) - failed} obfuscated, {failed} failed")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', help='directory containing .lua files')
+    parser.add_argument('dest', help='output directory')
+    parser.add_argument('--level', default='basic', choices=LuaObfuscator.LEVELS)
+    parser.add_argument('--options', default='{}', help='JSON object of technique options')
+    parser.add_argument('--seed', help='seed for reproducible output')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--manifest', help=f'manifest path (default: DEST/{MANIFEST_NAME})')
+    parser.add_argument('--force', action='store_true', help='ignore the manifest and reprocess everything')
+    parser.add_argument('--skip-validation', action='store_true',
+                        help='do not syntax-check inputs (for sources validated earlier in the build)')
+    parser.add_argument('--project', action='store_true',
+                        help='rename globals shared between files consistently across the project')
+    parser.add_argument('--index', help=f'symbol index path for --project (default: DEST/{INDEX_NAME})')
+    parser.add_argument('--keep', nargs='+', default=[], metavar='NAME',
+                        help='globals used from outside the project, never renamed by --project')
+    args = parser.parse_args(argv)
+
+    try:
+        options = json.loads(args.options)
+    except ValueError as e:
+        parser.error(f'--options is not valid JSON: {e}')
+    if not isinstance(options, dict):
+        parser.error('--options must be a JSON object')
+    if 'global_names' in options:
+        parser.error('--options cannot set global_names; use --project')
+    if args.project and 'obfuscate_metatables' in Pipeline.for_level(args.level, options).passes:
+        parser.error(PROJECT_METATABLES_ERROR)
+    if not os.path.isdir(args.source):
+        parser.error(f'{args.source} is not a directory')
+
+    os.makedirs(args.dest, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.dest, MANIFEST_NAME)
+    # Integer seeds match the API, where JSON numbers arrive as int
+    seed = args.seed
+    if seed is not None and seed.lstrip('-').isdigit():
+        seed = int(seed)
+
+    index_path = (args.index or os.path.join(args.dest, INDEX_NAME)) if args.project else None
+
+    failed = run(args.source, args.dest, args.level, options, seed,
+                 args.jobs, manifest_path, args.force, not args.skip_validation,
+                 index_path, args.keep)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Content-Encoding support for request and response bodies
+
+gzip and deflate come from zlib; zstd is offered when the optional
+`zstandard` package is installed (pip install zstandard).
+"""
+import zlib
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from streaming import STREAM_CHUNK_SIZE, UploadTooLarge
+
+# Response encodings in order of preference when the client accepts several
+ENCODINGS = (('zstd',) if zstandard is not None else ()) + ('gzip', 'deflate')
+
+# Smaller responses are sent as they are: the headers would eat the saving
+MIN_COMPRESS_SIZE = 1024
+
+# Compressible text: JSON, NDJSON, Lua source, metrics, pages
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Request bodies are decoded into memory up to this size, then into a temp file
+SPOOL_MEMORY_BYTES = 1024 * 1024
+
+
+class DecodingError(ValueError):
+    """Raised when a compressed request body cannot be decoded"""
+
+
+def _zlib_decoder(encoding, head):
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # 'deflate' is zlib-wrapped per the RFC, but some clients send raw deflate
+    wrapped = len(head) >= 2 and head[0] & 0x0F == 8 and ((head[0] << 8) | head[1]) % 31 == 0
+    return zlib.decompressobj(zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS)
+
+
+def _decoded_chunks(stream, encoding, chunk_size):
+    """
+    Yield the decoded body in pieces of at most `chunk_size` bytes
+    Output is bounded per step, so a small compressed body cannot expand
+    into memory all at once
+    """
+    if encoding == 'zstd':
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(stream, closefd=False) as reader:
+                while True:
+                    piece = reader.read(chunk_size)
+                    if not piece:
+                        return
+                    yield piece
+        except zstandard.ZstdError as e:
+            raise DecodingError(f'Invalid zstd body: {e}')
+
+    decoder = None
+    while decoder is None or not decoder.eof:
+        data = decoder.unconsumed_tail if decoder is not None else b''
+        if not data:
+            data = stream.read(chunk_size)
+            if not data:
+                if decoder is None:
+                    return
+                raise DecodingError(f'Truncated {encoding} body')
+        if decoder is None:
+            decoder = _zlib_decoder(encoding, data)
+        try:
+            piece = decoder.decompress(data, chunk_size)
+        except zlib.error as e:
+            raise DecodingError(f'Invalid {encoding} body: {e}')
+        if piece:
+            yield piece
+
+
+def decode_body(stream, encoding, max_bytes, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Decode a compressed request body into a rewound temporary file and
+    return (file, decoded size); raises UploadTooLarge once more than
+    `max_bytes` decode, and DecodingError on corrupt input
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    size = 0
+    try:
+        for piece in _decoded_chunks(stream, encoding, chunk_size):
+            size += len(piece)
+            if size > max_bytes:
+                raise UploadTooLarge(f'Request body decodes to more than {max_bytes} bytes')
+            body.write(piece)
+    except Exception:
+        body.close()
+        raise
+    body.seek(0)
+    return body, size
+
+
+def is_compressible(mimetype):
+    return mimetype is not None and mimetype.startswith(COMPRESSIBLE_MIMETYPES)
+
+
+def _compressor(encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, wbits)
+
+
+def compress(data, encoding):
+    """Compress a whole response body"""
+    compressor = _compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compress a streamed response body (a generator)
+    Every chunk is flushed, so each NDJSON record reaches the client as
+    soon as it is produced rather than when the compressor's window fills
+    """
+    compressor = _compressor(encoding)
+    flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK if encoding == 'zstd' else zlib.Z_SYNC_FLUSH
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(flush_mode)
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
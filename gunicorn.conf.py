@@ -0,0 +1,18 @@
+import os
+import multiprocessing
+
+# Threaded workers: LuaObfuscator and LuaParser keep no shared mutable state,
+# so one instance per process serves all request threads.
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+keepalive = 5
+reuse_port = True
+
+
+def post_worker_init(worker):
+    # Each server process runs its own background job workers (see jobs.py)
+    from app import start_job_workers
+    start_job_workers()
@@ -0,0 +1,399 @@
+"""
+Incremental re-obfuscation of a script that is submitted again after edits
+
+The source is split at its top-level function statements into chunks. Each
+chunk's obfuscated text is kept, keyed by a hash of the chunk, together with
+the stable names given to the script's file-level locals, so a resubmission
+only re-runs the source passes over the chunks that changed. Text passes
+(control flow, metatables, fake functions, call dispatch) still run over the
+assembled result.
+
+Output is equivalent to, but not byte-identical with, a full obfuscation of
+the same script: names and string pool indexes depend on the order in which
+chunks were first seen.
+"""
+import json
+import random
+import hashlib
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from lua_lexer import iter_tokens, needs_separator, Token, NAME, KEYWORD, OP, TRIVIA, LuaSyntaxError
+from lua_ast import LuaAstParser, Local, LocalFunction, Return
+from name_generator import NameGenerator
+from obfuscator import make_rng
+from pipeline import Pipeline
+from string_pool import StringPool
+from budget import checkpoint
+
+logger = logging.getLogger(__name__)
+
+
+def iter_boundaries(code, pos=0, line=1):
+    """
+    Yield the offsets at which the top-level chunks of code[pos:] after the
+    first one begin: a chunk begins at every 'function name' or 'local
+    function' statement outside any block, and takes the trivia before it
+    along. `pos` must be the start of a chunk, on line `line`
+    """
+    depth = 0
+    # 'for' and 'while' headers own the 'do' that follows them
+    pending_do = 0
+    previous = None  # the last significant token
+    candidate = None  # (keyword, offset) of a statement that may open a chunk
+
+    for token in iter_tokens(code, pos, None, line):
+        if token.kind in TRIVIA:
+            continue
+        if candidate is not None:
+            keyword, offset = candidate
+            if (token.kind == NAME) if keyword == 'function' else (token.kind == KEYWORD and token.value == 'function'):
+                yield offset
+            candidate = None
+
+        if token.kind == KEYWORD:
+            keyword = token.value
+            if depth == 0 and not pending_do and previous is not None and (
+                    keyword == 'local' or (keyword == 'function'
+                                           and not (previous.kind == KEYWORD and previous.value == 'local'))):
+                candidate = (keyword, previous.pos + len(previous.value))
+
+            if keyword in ('for', 'while'):
+                depth += 1
+                pending_do += 1
+            elif keyword == 'do' and pending_do:
+                pending_do -= 1
+            elif keyword in ('function', 'if', 'do', 'repeat'):
+                depth += 1
+            elif keyword in ('end', 'until'):
+                depth -= 1
+        previous = token
+
+
+def split_chunks(code):
+    """Return the (start, end) offsets of the top-level chunks of a script"""
+    starts = [0, *iter_boundaries(code)]
+    return list(zip(starts, starts[1:] + [len(code)]))
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _common_suffix(a, b, block=4096):
+    """Length of the longest common suffix of two strings"""
+    limit = min(len(a), len(b))
+    length = 0
+    # Whole blocks first, then character by character in the one that differs
+    while length < limit:
+        size = min(block, limit - length)
+        if a[len(a) - length - size:len(a) - length] != b[len(b) - length - size:len(b) - length]:
+            break
+        length += size
+    while length < limit and a[len(a) - length - 1] == b[len(b) - length - 1]:
+        length += 1
+    return length
+
+
+def update_spans(code, old=None, old_spans=(), changed=None):
+    """
+    The (start, end, digest) of every chunk of `code`, given the text and the
+    spans of its previous version; only the part that changed is lexed again
+    `changed` is the (start, end) range of `old` that an edit replaced, when
+    the caller knows it, which spares comparing the two texts
+    """
+    if code == old:
+        return old_spans
+
+    # Chunks unchanged at the front are kept, except the last of them: the
+    # edit may have turned the statement after it into a continuation
+    kept = 0
+    if old is not None:
+        if changed is not None:
+            # Two characters past the end decide where its last token ends
+            kept = bisect_right(old_spans, changed[0] - 2, key=lambda span: span[1])
+        else:
+            while kept < len(old_spans):
+                start, end, _ = old_spans[kept]
+                if old[start:end + 2] != code[start:end + 2]:
+                    break
+                kept += 1
+        kept = max(kept - 1, 0)
+    head = old_spans[:kept]
+    start = head[-1][1] if head else 0
+
+    # Once a chunk boundary lands on an unchanged chunk in the common
+    # suffix, the rest of the script splits as it did before
+    first = len(old_spans)
+    delta = 0
+    if old is not None:
+        delta = len(code) - len(old)
+        unchanged_from = changed[1] if changed is not None else len(old) - _common_suffix(old, code)
+        first = bisect_left(old_spans, unchanged_from, key=lambda span: span[0])
+
+    starts = [start]
+    tail = []
+    for boundary in iter_boundaries(code, start, code.count('\n', 0, start) + 1):
+        checkpoint()
+        index = bisect_left(old_spans, boundary - delta, lo=first, key=lambda span: span[0])
+        if index < len(old_spans) and old_spans[index][0] == boundary - delta:
+            tail = [(s + delta, e + delta, digest) for s, e, digest in old_spans[index:]]
+            break
+        starts.append(boundary)
+    ends = starts[1:] + [tail[0][0] if tail else len(code)]
+    return head + [(s, e, _digest(code[s:e])) for s, e in zip(starts, ends)] + tail
+
+
+def _declared(body):
+    """The file-level locals declared by a chunk's top-level statements"""
+    for stat in body:
+        if isinstance(stat, Local):
+            yield from stat.targets
+        elif isinstance(stat, LocalFunction):
+            yield stat.target
+
+
+class ChunkResult:
+    """The obfuscated text of one chunk and the context it was made for"""
+
+    __slots__ = ('output', 'free', 'bound', 'declared', 'returns')
+
+    def __init__(self, output, free, bound, declared, returns):
+        self.output = output
+        # Names the chunk uses without declaring them first, and the subset
+        # of those that were file-level locals of earlier chunks
+        self.free = free
+        self.bound = bound
+        self.declared = declared
+        self.returns = returns
+
+
+class _Rebuild(Exception):
+    """A new global collides with a name already issued; start over"""
+
+
+class IncrementalSession:
+    """
+    Chunk results and naming state for one script and one configuration
+    Not thread-safe on its own; IncrementalObfuscator holds `lock` around use
+    """
+
+    def __init__(self, obfuscator, pipeline, options, seed):
+        self.obfuscator = obfuscator
+        self.options = options
+        self.settings = self.settings_key(pipeline, options, seed)
+        # Without a seed the session picks one, so its chunks stay consistent
+        self.base_seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        self.lock = threading.Lock()
+
+        stage, names = pipeline.stages[0] if pipeline.stages else (None, [])
+        self.source_passes = names if stage == 'source' else []
+        self.rest = Pipeline(name for _, names in pipeline.stages[1 if self.source_passes else 0:]
+                             for name in names)
+        # Globals seen so far; new names are never drawn from these
+        self.reserved = set(obfuscator.lua_keywords) | {'self'} | set(options.get('global_names', {}).values())
+        # The last text submitted and its chunks as (start, end, digest)
+        self.text = None
+        self.spans = []
+        self._reset()
+
+    @staticmethod
+    def settings_key(pipeline, options, seed):
+        return pipeline.passes, json.dumps(options, sort_keys=True, default=str), seed
+
+    def _reset(self):
+        self.names = NameGenerator(
+            length=1 if self.options.get('short_names', False) else 8,
+            seed=make_rng(f'{self.base_seed}:names').getrandbits(64),
+            reserved=self.reserved,
+            grow=self.options.get('short_names', False),
+        )
+        self.issued = set()
+        # Original name -> new name of every file-level local
+        self.toplevel = {}
+        # Shared by all chunks and only ever appended to, so that the indexes
+        # in kept chunks stay valid; literals of deleted code stay until a reset
+        self.pool = None
+        if 'encode_strings' in self.source_passes and self.options.get('string_pool', True):
+            self.pool = StringPool.from_names(self.names)
+            self.issued.add(self.pool.accessor)
+        self.chunks = {}
+
+    def _draw(self):
+        name = self.names.next_name()
+        self.issued.add(name)
+        return name
+
+    def obfuscate(self, code, timings=None):
+        """Obfuscate the current text of the script; returns (code, stats)"""
+        if not self.source_passes:
+            output = self.obfuscator.run_pipeline(code, self.rest, self.options, self.base_seed,
+                                                  timings=timings)
+            return output, {'chunks': 0, 'reused_chunks': 0}
+
+        measure = timings.measure if timings is not None else (lambda phase: nullcontext())
+        with measure('source.split'):
+            self.spans = update_spans(code, self.text, self.spans)
+            self.text = code
+
+        start = time.perf_counter()
+        while True:
+            try:
+                body, reused = self._assemble(code, self.spans)
+                break
+            except _Rebuild:
+                logger.debug('Rebuilding incremental session after a name collision')
+                self._reset()
+        if timings is not None:
+            timings.record('source', time.perf_counter() - start, len(code), len(body))
+
+        output = self.obfuscator.run_pipeline(body, self.rest, self.options, self.base_seed,
+                                              timings=timings)
+        return output, {'chunks': len(self.spans), 'reused_chunks': reused}
+
+    def _assemble(self, code, spans):
+        visible = set()
+        parts = []
+        used = {}
+        reused = 0
+        previous = None
+        # Line numbers are counted only as far as a chunk has to be lexed
+        line_pos, line = 0, 1
+
+        for start, end, digest in spans:
+            checkpoint()
+            result = self.chunks.get(digest)
+            tokens = None
+            if result is None or result.bound != result.free & visible or (previous is not None and previous.returns):
+                line += code.count('\n', line_pos, start)
+                line_pos = start
+                tokens = list(iter_tokens(code, start, end, line))
+
+            if previous is not None and previous.returns:
+                # 'return' has to be the last statement of the script
+                token = next(token for token in tokens if token.kind not in TRIVIA)
+                raise LuaSyntaxError(f"'<eof>' expected near '{token.value}'", token.pos, token.line)
+
+            if tokens is None:
+                reused += 1
+            else:
+                result = self._obfuscate_chunk(tokens, visible, digest)
+
+            if parts and needs_separator(parts[-1], result.output):
+                parts.append(' ')
+            parts.append(result.output)
+            visible.update(result.declared)
+            used[digest] = result
+            previous = result
+
+        # Results of chunks no longer in the script are dropped
+        self.chunks = used
+        body = ''.join(parts)
+        if self.pool is not None:
+            body = self.pool.prelude() + body
+        return body, reused
+
+    def _obfuscate_chunk(self, tokens, visible, digest):
+        """Run the source passes over one chunk"""
+        obfuscator = self.obfuscator
+        names = self.source_passes
+        line = tokens[0].line if tokens else 1
+        # File-level locals of earlier chunks are declared by a header that
+        # is parsed along with the chunk but not part of its output
+        header = []
+        for i, name in enumerate(sorted(visible)):
+            header.append(Token(OP, ',', -2 * i - 1, line) if i else Token(KEYWORD, 'local', -1, line))
+            header.append(Token(NAME, name, -2 * i - 2, line))
+        chunk = LuaAstParser(header + tokens).parse()
+        header_bindings = []
+        if header:
+            header_bindings = chunk.body[0].targets
+            chunk.body = chunk.body[1:]
+
+        new_globals = chunk.globals - self.reserved
+        # Reserved before rebuilding, so that the rebuild cannot issue them
+        self.reserved.update(new_globals)
+        if new_globals & self.issued:
+            raise _Rebuild()
+
+        bound = frozenset(binding.name for binding in header_bindings if len(binding.positions) > 1)
+        declared = list(_declared(chunk.body))
+        rename_map = None
+        if 'rename_variables' in names:
+            rename_map = {}
+            for binding in header_bindings + declared:
+                if binding.name not in self.toplevel:
+                    self.toplevel[binding.name] = self._draw()
+                rename_map[binding] = self.toplevel[binding.name]
+            inner = [binding for binding in chunk.bindings
+                     if binding.renamable and binding not in rename_map]
+            if self.names.grow:
+                spans = [(binding, len(binding.positions), min(binding.positions), max(binding.positions))
+                         for binding in inner]
+                inner_names = obfuscator._shortest_names(spans, self.names)
+                self.issued.update(inner_names.values())
+                rename_map.update(inner_names)
+            else:
+                rename_map.update((binding, self._draw()) for binding in inner)
+
+        options = {
+            **self.options,
+            'remove_comments': 'remove_comments' in names,
+            'rename_variables': 'rename_variables' in names,
+        }
+        output = obfuscator._rewrite_source(
+            tokens, chunk, options, make_rng(f'{self.base_seed}:{digest}'), self.names, rename_map, self.pool,
+            strings='encode_strings' in names,
+            numbers='obfuscate_numbers' in names,
+            minify='minify' in names,
+            measure=lambda phase: nullcontext(),
+        )
+        return ChunkResult(
+            output,
+            free=frozenset(chunk.globals) | bound,
+            bound=bound,
+            declared=frozenset(binding.name for binding in declared),
+            returns=bool(chunk.body) and isinstance(chunk.body[-1], Return),
+        )
+
+
+class IncrementalObfuscator:
+    """
+    Incremental sessions by id, least recently used dropped first
+    A session is started afresh when its pipeline, options or seed change
+    """
+
+    def __init__(self, obfuscator, max_sessions=64):
+        self.obfuscator = obfuscator
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, session_id, pipeline, options, seed):
+        settings = IncrementalSession.settings_key(pipeline, options, seed)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.settings != settings:
+                session = IncrementalSession(self.obfuscator, pipeline, options, seed)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def obfuscate(self, session_id, code, pipeline, options=None, seed=None, timings=None):
+        """
+        Obfuscate `code` in the session `session_id`, re-running the source
+        passes only over the chunks changed since its last submission
+        Returns (code, stats); raises LuaSyntaxError for invalid code
+        """
+        session = self._session(session_id, pipeline, options or {}, seed)
+        with session.lock:
+            return session.obfuscate(code, timings)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import socket
+import atexit
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, ObfuscationJob
+from obfuscator import LuaObfuscator
+from lua_parser import LuaParser
+from logs import configure_logging
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = timedelta(seconds=60)
+MAX_ATTEMPTS = 3
+
+
+def create_job(code, level, options, seed):
+    """Queue an obfuscation job and return it (call inside an app context)"""
+    job = ObfuscationJob(
+        id=uuid.uuid4().hex,
+        level=level,
+        options=json.dumps(options),
+        seed=json.dumps(seed),
+        code=code,
+        original_size=len(code),
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def job_status(job):
+    """JSON-ready description of a job, without its code or result"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'level': job.level,
+        'progress': {
+            'current_pass': job.current_pass,
+            'passes_done': job.passes_done,
+            'passes_total': job.passes_total,
+        },
+        'original_size': job.original_size,
+        'obfuscated_size': job.obfuscated_size,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_at': _isoformat(job.created_at),
+        'started_at': _isoformat(job.started_at),
+        'finished_at': _isoformat(job.finished_at),
+    }
+
+
+def _isoformat(value):
+    return value.isoformat() + 'Z' if value is not None else None
+
+
+class JobWorker:
+    """
+    Background worker that drains the job table
+
+    Runs in its own process with its own database connection, so bulk jobs
+    never compete with request threads for the GIL. Jobs are claimed with a
+    conditional UPDATE, so any number of workers (in any number of server
+    processes) can share one table. A running job's heartbeat is refreshed
+    from a side thread; jobs whose worker died are re-queued once their
+    heartbeat goes stale, up to MAX_ATTEMPTS times.
+    """
+
+    RECOVER_EVERY = 30
+
+    def __init__(self, database_uri, poll_interval=1.0, retention_seconds=7 * 24 * 3600):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.retention = timedelta(seconds=retention_seconds)
+        self.obfuscator = LuaObfuscator()
+        self.parser = LuaParser()
+
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+        self.app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_pre_ping": True}
+        db.init_app(self.app)
+        with self.app.app_context():
+            db.create_all()
+
+    def run(self):
+        logger.info('Job worker %s started', self.name)
+        last_recovery = 0
+        while True:
+            with self.app.app_context():
+                try:
+                    if time.monotonic() - last_recovery > self.RECOVER_EVERY:
+                        self.recover()
+                        last_recovery = time.monotonic()
+                    job = self.claim()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    logger.warning('Job worker %s database error: %s', self.name, e)
+                    job = None
+                if job is not None:
+                    self.process(job)
+                    continue
+            time.sleep(self.poll_interval)
+
+    def claim(self):
+        """Mark the oldest queued job as ours and return it, or None"""
+        row = (db.session.query(ObfuscationJob.id)
+               .filter_by(status='queued')
+               .order_by(ObfuscationJob.created_at)
+               .first())
+        if row is None:
+            return None
+        now = datetime.utcnow()
+        claimed = ObfuscationJob.query.filter_by(id=row.id, status='queued').update({
+            'status': 'running',
+            'worker': self.name,
+            'started_at': now,
+            'heartbeat_at': now,
+            'attempts': ObfuscationJob.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            # Another worker got there first
+            return None
+        return db.session.get(ObfuscationJob, row.id)
+
+    def process(self, job):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            source, error_msg = self.parser.parse_source(job.code)
+            if source is None:
+                raise ValueError(f'Invalid Lua syntax: {error_msg}')
+
+            def progress(name, index, total):
+                job.current_pass = name
+                job.passes_done = index
+                job.passes_total = total
+                db.session.commit()
+
+            result = self.obfuscator.obfuscate(
+                source, job.level, json.loads(job.options), json.loads(job.seed), progress
+            )
+            job.status = 'done'
+            job.result = result
+            job.obfuscated_size = len(result)
+            job.passes_done = job.passes_total
+            job.current_pass = None
+            logger.info('Job %s finished: %d -> %d bytes', job.id, job.original_size, len(result))
+        except Exception as e:
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+            logger.warning('Job %s failed: %s', job.id, e)
+        finally:
+            stop.set()
+            heartbeat.join()
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def _heartbeat(self, job_id, stop):
+        # Separate app context, so a separate session and connection
+        with self.app.app_context():
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                try:
+                    ObfuscationJob.query.filter_by(id=job_id, status='running').update(
+                        {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+                    )
+                    db.session.commit()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    logger.warning('Heartbeat for job %s failed: %s', job_id, e)
+
+    def recover(self):
+        """Re-queue jobs whose worker stopped, and prune old finished jobs"""
+        now = datetime.utcnow()
+        stale = ObfuscationJob.query.filter(
+            ObfuscationJob.status == 'running',
+            ObfuscationJob.heartbeat_at < now - STALE_AFTER,
+        )
+        failed = stale.filter(ObfuscationJob.attempts >= MAX_ATTEMPTS).update({
+            'status': 'failed',
+            'error': f'Worker stopped while processing the job ({MAX_ATTEMPTS} attempts)',
+            'finished_at': now,
+        }, synchronize_session=False)
+        requeued = stale.update({'status': 'queued', 'worker': None}, synchronize_session=False)
+        pruned = ObfuscationJob.query.filter(
+            ObfuscationJob.status.in_(('done', 'failed')),
+            ObfuscationJob.finished_at < now - self.retention,
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if failed or requeued or pruned:
+            logger.info('Job recovery: %d re-queued, %d failed, %d pruned', requeued, failed, pruned)
+
+
+def run_worker(database_uri, poll_interval, retention_seconds, nice=0):
+    """Process entry point for one job worker"""
+    # Spawned processes start with logging unconfigured
+    configure_logging()
+    if nice and hasattr(os, 'nice'):
+        # Jobs are bulk work: leave the cores to request handling first
+        os.nice(nice)
+    JobWorker(database_uri, poll_interval, retention_seconds).run()
+
+
+class JobWorkerPool:
+    """Starts and stops the job worker processes for one server process"""
+
+    def __init__(self, database_uri, workers=1, poll_interval=1.0, retention_seconds=7 * 24 * 3600, nice=0):
+        self.database_uri = database_uri
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.nice = nice
+        self._processes = []
+
+    def start(self):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        for _ in range(self.workers):
+            process = context.Process(
+                target=run_worker,
+                args=(self.database_uri, self.poll_interval, self.retention_seconds, self.nice),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        atexit.register(self.shutdown)
+        logger.info('Started %d job workers', self.workers)
+
+    def shutdown(self):
+        # Interrupted jobs are picked up again once their heartbeat is stale
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(timeout=5)
+        self._processes = []
+
+
+if __name__ == '__main__':
+    # Standalone worker pool: python jobs.py
+    configure_logging()
+    pool = JobWorkerPool(
+        os.environ.get("DATABASE_URL", "sqlite:///obfuscator.db"),
+        workers=int(os.environ.get("JOB_WORKERS", 1)),
+        poll_interval=float(os.environ.get("JOB_POLL_INTERVAL", 1.0)),
+        retention_seconds=int(os.environ.get("JOB_RETENTION", 7 * 24 * 3600)),
+    )
+    pool.start()
+    for process in pool._processes:
+        process.join()
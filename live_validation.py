@@ -0,0 +1,305 @@
+"""
+Validation as you type, for the editor
+
+A LiveValidator keeps a session per open editor with the script's current
+text and its top-level chunks (see incremental.update_spans). The editor
+sends each change as an edit, a range of the text and its replacement; the
+session applies it, and only the chunks the edit touched are lexed and
+checked again. Every chunk is checked on its own by LuaParser.check_tokens,
+so a script reports one diagnostic, with its line and column, for each
+broken chunk instead of only its first error. Chunk results and the
+results of whole texts are cached by content hash and shared by all
+sessions, so undoing an edit or opening a known file costs a lookup.
+
+Applying an edit copies the text and shifts the chunk list past it, which
+are memory operations; the lexing and parsing done for a keystroke depend
+on the size of the chunks it touched. While a block is left open, the
+chunks after it are checked as one until it is closed. Offsets and columns
+count characters; lines and columns start at 1.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from lua_lexer import iter_tokens, significant, LuaSyntaxError, TRIVIA
+from lua_ast import Return
+from incremental import update_spans
+from budget import checkpoint
+
+logger = logging.getLogger(__name__)
+
+
+class EditError(ValueError):
+    """Raised for an edit whose range or text is malformed"""
+
+
+class StaleSession(Exception):
+    """Raised for edits to a session that is unknown or at another version; send the full text again"""
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ChunkCheck:
+    """The result of checking one chunk, relative to the chunk's start"""
+
+    __slots__ = ('newlines', 'returns', 'error')
+
+    def __init__(self, newlines, returns, error):
+        self.newlines = newlines
+        # Whether the chunk ends with 'return', which must be the last statement
+        self.returns = returns
+        # (offset, message, at_eof) of the first problem, or None
+        self.error = error
+
+
+def check_chunk(parser, code, start, end):
+    """Check code[start:end], one top-level chunk of a script"""
+    newlines = code.count('\n', start, end)
+    tokens = []
+    try:
+        # Lines counted from the chunk's first, so the result can be reused anywhere
+        tokens = significant(iter_tokens(code, start, end, 1))
+        chunk = parser.check_tokens(tokens)
+    except LuaSyntaxError as e:
+        at_eof = e.pos is None and e.message.endswith('near <eof>')
+        if e.pos is not None:
+            offset = e.pos
+        elif at_eof and tokens:
+            offset = tokens[-1].pos + len(tokens[-1].value)
+        else:
+            offset = next((token.pos for token in tokens if token.line == e.line), start)
+        return ChunkCheck(newlines, False, (offset - start, e.message, at_eof))
+    return ChunkCheck(newlines, bool(chunk.body) and isinstance(chunk.body[-1], Return), None)
+
+
+def _first_token(code, pos):
+    """The first significant token at or after `pos`"""
+    return next(token for token in iter_tokens(code, pos) if token.kind not in TRIVIA)
+
+
+def _diagnostic(code, offset, line, message):
+    return {
+        'line': line,
+        'column': offset - code.rfind('\n', 0, offset),
+        'offset': offset,
+        'message': message,
+    }
+
+
+class LiveSession:
+    """
+    The text of one editor, and the last version of it that was split
+    into chunks, which the next split starts from
+    Not thread-safe on its own; LiveValidator holds `lock` around use
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.version = 1
+        self.base = None
+        self.spans = []
+        # Digest -> ChunkCheck of the chunks of `base`
+        self.checks = {}
+        # How much of the start and the end of `text` is still that of
+        # `base`; None when not known, and the two are compared instead
+        self.prefix = None
+        self.suffix = None
+        self.lock = threading.Lock()
+
+    def reset(self, text):
+        """Take a whole new text, keeping the chunks of the old one to start from"""
+        self.text = text
+        self.version += 1
+        self.prefix = self.suffix = None
+
+    def apply(self, edits, max_size=None):
+        """
+        Apply edits in order: each replaces text[start:end] with its 'text',
+        given as offsets into the text left by the edits before it
+        Raises EditError, leaving the session unchanged, for a malformed edit
+        """
+        text = self.text
+        prefix, suffix = self.prefix, self.suffix
+        for edit in edits:
+            if not isinstance(edit, dict):
+                raise EditError('Each edit must be an object with start, end and text')
+            start, end, insert = edit.get('start'), edit.get('end'), edit.get('text', '')
+            if not all(isinstance(value, int) and not isinstance(value, bool) for value in (start, end)) \
+                    or not 0 <= start <= end <= len(text):
+                raise EditError(f'Edit range {start}-{end} is outside the text of {len(text)} characters')
+            if not isinstance(insert, str):
+                raise EditError('Edit text must be a string')
+            if prefix is not None:
+                prefix = min(prefix, start)
+                suffix = min(suffix, len(text) - end)
+            text = text[:start] + insert + text[end:]
+            if max_size is not None and len(text) > max_size:
+                raise EditError(f'Text exceeds the limit of {max_size} characters')
+        self.text = text
+        self.prefix, self.suffix = prefix, suffix
+        self.version += 1
+
+    def split(self):
+        """The chunk spans of the current text; raises LuaSyntaxError if it does not lex"""
+        changed = None
+        if self.base is not None and self.prefix is not None:
+            changed = (self.prefix, len(self.base) - self.suffix)
+        spans = update_spans(self.text, self.base, self.spans, changed)
+        # Not reached for a text that does not lex: `base` stays the last one
+        # that did, and the next split starts from it
+        self.base, self.spans = self.text, spans
+        self.prefix = self.suffix = len(self.text)
+        return spans
+
+
+class LiveValidator:
+    """
+    Live validation sessions by id, least recently used dropped first
+    `parser` is a LuaParser; chunk results and whole-text results are kept
+    in LRU caches of `max_chunks` and `max_results` entries
+    """
+
+    def __init__(self, parser, max_sessions=256, max_chunks=65536, max_results=256, max_size=None):
+        self.parser = parser
+        self.max_sessions = max_sessions
+        self.max_chunks = max_chunks
+        self.max_results = max_results
+        self.max_size = max_size
+        self._sessions = OrderedDict()
+        self._chunks = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'result_hits': 0, 'checked_chunks': 0, 'reused_chunks': 0}
+
+    def open(self, session_id, code):
+        """
+        Start session `session_id` with `code`, or resynchronize it
+        Returns a dict with the text's 'version', whether it is 'valid',
+        its 'diagnostics' and 'stats'
+        """
+        if self.max_size is not None and len(code) > self.max_size:
+            raise EditError(f'Text exceeds the limit of {self.max_size} characters')
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = LiveSession(code)
+                self._sessions[session_id] = session
+            self._touch(session_id)
+        with session.lock:
+            if session.text != code:
+                session.reset(code)
+            return self._validate(session)
+
+    def edit(self, session_id, version, edits):
+        """
+        Apply `edits` to session `session_id`, whose text must be at
+        `version`; raises StaleSession otherwise, and EditError for a
+        malformed edit. Returns the same as open()
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._touch(session_id)
+        if session is None:
+            raise StaleSession(f'Unknown session {session_id}')
+        with session.lock:
+            if session.version != version:
+                raise StaleSession(f'Session is at version {session.version}, not {version}')
+            session.apply(edits, self.max_size)
+            return self._validate(session)
+
+    def _touch(self, session_id):
+        # Called with the lock held
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _cache_get(self, cache, key):
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _cache_put(self, cache, key, value, limit):
+        with self._lock:
+            cache[key] = value
+            while len(cache) > limit:
+                cache.popitem(last=False)
+
+    def _validate(self, session):
+        """The diagnostics of the session's current text"""
+        code = session.text
+        digest = _digest(code)
+        result = self._cache_get(self._results, digest)
+        if result is not None:
+            with self._lock:
+                self.stats['result_hits'] += 1
+            return {**result, 'version': session.version, 'stats': {**result['stats'], 'cached': True}}
+
+        try:
+            spans = session.split()
+        except LuaSyntaxError as e:
+            # Nothing after a token that does not lex can be split into chunks
+            line = e.line if e.line is not None else code.count('\n', 0, e.pos) + 1
+            diagnostics = [_diagnostic(code, e.pos, line, e.message)]
+            stats = {'chunks': 0, 'checked_chunks': 0}
+        else:
+            diagnostics, checked = self._check(session, code, spans)
+            stats = {'chunks': len(spans), 'checked_chunks': checked}
+
+        result = {'valid': not diagnostics, 'diagnostics': diagnostics, 'stats': stats}
+        self._cache_put(self._results, digest, result, self.max_results)
+        return {**result, 'version': session.version, 'stats': {**stats, 'cached': False}}
+
+    def _check(self, session, code, spans):
+        """Check every chunk, reusing the results of those seen before"""
+        diagnostics = []
+        checked = 0
+        line = 1
+        previous = None
+        # The session's own chunks are looked up first, without the shared lock
+        checks = session.checks
+        used = {}
+        for index, (start, end, digest) in enumerate(spans):
+            check = checks.get(digest)
+            if check is None:
+                checkpoint()
+                check = self._cache_get(self._chunks, digest)
+                if check is None:
+                    check = check_chunk(self.parser, code, start, end)
+                    self._cache_put(self._chunks, digest, check, self.max_chunks)
+                    checked += 1
+            used[digest] = check
+
+            if previous is not None and previous.returns:
+                # 'return' has to be the last statement of the script
+                token = _first_token(code, start)
+                diagnostics.append(_diagnostic(code, token.pos, line + code.count('\n', start, token.pos),
+                                               f"'<eof>' expected near '{token.value}'"))
+
+            if check.error is not None:
+                offset, message, at_eof = check.error
+                offset += start
+                if at_eof and index + 1 < len(spans):
+                    # The chunk ended early; the script goes on with the next one
+                    token = _first_token(code, spans[index + 1][0])
+                    offset = token.pos
+                    message = f"{message[:-len('<eof>')]}'{token.value}'"
+                diagnostics.append(_diagnostic(code, offset, line + code.count('\n', start, offset), message))
+
+            line += check.newlines
+            previous = check
+
+        session.checks = used
+        with self._lock:
+            self.stats['checked_chunks'] += checked
+            self.stats['reused_chunks'] += len(spans) - checked
+        logger.debug('Live validation: %s chunks, %s checked', len(spans), checked)
+        return diagnostics, checked
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,88 @@
+"""
+Logging setup and sampled request traces
+
+Configured from the environment:
+
+    LOG_LEVEL           root level (default INFO)
+    LOG_LEVELS          per-logger levels, e.g. "obfuscator=DEBUG,jobs=WARNING"
+    LOG_FORMAT          "text" (default) or "json", one object per line
+    TRACE_SAMPLE_RATE   fraction of API requests that log a trace record
+                        (default 0.01; 0 turns traces off)
+
+Modules log through logging.getLogger(__name__) with %-style arguments, so a
+disabled message costs a level check and never formats its arguments.
+"""
+import os
+import sys
+import json
+import random
+import logging
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with `extra` fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(spec):
+    """Return {logger name: level name} from "name=LEVEL,other=LEVEL" """
+    levels = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, level = item.partition('=')
+        if not level.strip():
+            raise ValueError(f"LOG_LEVELS entry '{item.strip()}' is not name=LEVEL")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(environ=os.environ):
+    """Install the root handler and levels described by the environment"""
+    handler = logging.StreamHandler(sys.stderr)
+    if environ.get('LOG_FORMAT', 'text').lower() == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(environ.get('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+
+class TraceSampler:
+    """Decides which requests log a trace record"""
+
+    def __init__(self, rate):
+        self.rate = min(max(rate, 0.0), 1.0)
+        self._rng = random.Random()
+
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        return cls(float(environ.get('TRACE_SAMPLE_RATE', 0.01)))
+
+    def sample(self):
+        # No random draw at all when traces are off
+        return self.rate > 0 and (self.rate >= 1 or self._rng.random() < self.rate)
@@ -0,0 +1,1045 @@
+from bisect import bisect_right
+
+from budget import checkpoint
+
+from lua_lexer import (
+    tokenize, significant, needs_separator, LuaSyntaxError,
+    NAME, KEYWORD, NUMBER, STRING, OP
+)
+
+
+# ---------------------------------------------------------------------------
+# Scopes and bindings
+# ---------------------------------------------------------------------------
+
+class Binding:
+    """A local variable declaration and everything that refers to it"""
+
+    __slots__ = ('name', 'kind', 'line', 'positions', 'renamable')
+
+    def __init__(self, name, kind, line, renamable=True):
+        self.name = name
+        self.kind = kind
+        self.line = line
+        # Source offsets of the declaring token followed by every reference
+        self.positions = []
+        self.renamable = renamable
+
+    def __repr__(self):
+        return f"Binding({self.name!r}, {self.kind!r}, line={self.line})"
+
+
+class Scope:
+    """Lexical scope mapping visible local names to their bindings"""
+
+    __slots__ = ('parent', 'names')
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.names = {}
+
+    def declare(self, binding):
+        self.names[binding.name] = binding
+
+    def lookup(self, name):
+        scope = self
+        while scope is not None:
+            binding = scope.names.get(name)
+            if binding is not None:
+                return binding
+            scope = scope.parent
+        return None
+
+
+# ---------------------------------------------------------------------------
+# AST nodes
+# ---------------------------------------------------------------------------
+
+class Node:
+    __slots__ = ('line',)
+    _fields = ()
+
+    def __repr__(self):
+        args = ', '.join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({args})"
+
+
+def _node(name, fields):
+    """Create a simple AST node class with the given fields"""
+
+    def __init__(self, *args, line=None):
+        for field, value in zip(fields, args):
+            setattr(self, field, value)
+        self.line = line
+
+    return type(name, (Node,), {
+        '__slots__': fields,
+        '_fields': fields,
+        '__init__': __init__,
+    })
+
+
+# Expressions
+Constant = _node('Constant', ('value',))            # nil, true, false, ...
+Number = _node('Number', ('raw',))
+String = _node('String', ('raw',))
+Name = _node('Name', ('name', 'binding'))           # binding is None for globals
+Field = _node('Field', ('obj', 'name'))             # obj.name
+Index = _node('Index', ('obj', 'key'))              # obj[key]
+Call = _node('Call', ('func', 'args'))
+MethodCall = _node('MethodCall', ('obj', 'method', 'args'))
+Function = _node('Function', ('params', 'is_vararg', 'body'))
+BinOp = _node('BinOp', ('op', 'left', 'right'))
+UnOp = _node('UnOp', ('op', 'operand'))
+Paren = _node('Paren', ('expr',))
+Table = _node('Table', ('fields',))
+TableField = _node('TableField', ('key', 'value'))  # key: None, str name or expression node
+
+# Statements
+Chunk = _node('Chunk', ('body', 'bindings', 'globals', 'global_refs'))
+Local = _node('Local', ('targets', 'values'))
+Assign = _node('Assign', ('targets', 'values'))
+CallStat = _node('CallStat', ('call',))
+Do = _node('Do', ('body',))
+While = _node('While', ('cond', 'body'))
+Repeat = _node('Repeat', ('body', 'cond'))
+If = _node('If', ('tests', 'bodies', 'orelse'))
+NumericFor = _node('NumericFor', ('var', 'start', 'stop', 'step', 'body'))
+GenericFor = _node('GenericFor', ('targets', 'exprs', 'body'))
+FunctionStat = _node('FunctionStat', ('target', 'method', 'func'))
+LocalFunction = _node('LocalFunction', ('target', 'func'))
+Return = _node('Return', ('values',))
+Break = _node('Break', ())
+
+
+# Binary operator precedence; '^' and unary operators are handled structurally
+BINARY_PRIORITY = {
+    'or': 1, 'and': 2,
+    '<': 3, '>': 3, '<=': 3, '>=': 3, '~=': 3, '==': 3,
+    '..': 9,
+    '+': 10, '-': 10,
+    '*': 11, '/': 11, '%': 11,
+}
+RIGHT_ASSOCIATIVE = frozenset({'..', '^'})
+UNARY_OPERATORS = frozenset({'not', '-', '#'})
+
+_BLOCK_END = frozenset({'end', 'else', 'elseif', 'until'})
+
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+class LuaAstParser:
+    """
+    Recursive-descent parser producing an AST with resolved local bindings
+    Accepts Lua 5.1 syntax only: no goto or labels, integer division, bitwise
+    operators or local attributes, and 'break', like 'return', ends its block
+    """
+
+    def __init__(self, tokens):
+        self.tokens = significant(tokens)
+        self.pos = 0
+        self.scope = None
+        self.bindings = []
+        self.globals = set()
+        # Source offsets of every reference to a global
+        self.global_refs = []
+        # (statement, index of the token after it) for each top-level statement
+        self.statement_ends = []
+        # Whether '...' may be used here; the main chunk is a vararg function
+        self.vararg = True
+
+    @classmethod
+    def from_source(cls, code):
+        return cls(tokenize(code))
+
+    # -- token helpers ----------------------------------------------------
+
+    def _peek(self, offset=0):
+        index = self.pos + offset
+        if index < len(self.tokens):
+            return self.tokens[index]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            self._error("unexpected end of input")
+        self.pos += 1
+        return token
+
+    def _check(self, value):
+        token = self._peek()
+        return token is not None and token.value == value and token.kind in (OP, KEYWORD)
+
+    def _accept(self, value):
+        if self._check(value):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, value, opener=None):
+        if self._check(value):
+            return self._next()
+        if opener is not None and opener.line != self._line():
+            self._error(f"'{value}' expected (to close '{opener.value}' at line {opener.line})")
+        self._error(f"'{value}' expected")
+
+    def _expect_name(self):
+        token = self._peek()
+        if token is None or token.kind != NAME:
+            self._error("<name> expected")
+        self.pos += 1
+        return token
+
+    def _line(self):
+        token = self._peek()
+        if token is None:
+            return self.tokens[-1].line if self.tokens else 1
+        return token.line
+
+    def _error(self, message):
+        token = self._peek()
+        if token is None:
+            raise LuaSyntaxError(f"{message} near <eof>", None, self._line())
+        raise LuaSyntaxError(f"{message} near '{token.value}'", token.pos, token.line)
+
+    # -- scopes -----------------------------------------------------------
+
+    def _open_scope(self):
+        self.scope = Scope(self.scope)
+
+    def _close_scope(self):
+        self.scope = self.scope.parent
+
+    def _declare(self, token, kind):
+        binding = Binding(token.value, kind, token.line)
+        binding.positions.append(token.pos)
+        self.scope.declare(binding)
+        self.bindings.append(binding)
+        return binding
+
+    def _declare_self(self, line):
+        # Methods bind 'self' implicitly, so it has no token and keeps its name
+        binding = Binding('self', 'param', line, renamable=False)
+        self.scope.declare(binding)
+        self.bindings.append(binding)
+        return binding
+
+    def _reference(self, token):
+        binding = self.scope.lookup(token.value)
+        if binding is None:
+            self.globals.add(token.value)
+            self.global_refs.append(token.pos)
+        else:
+            binding.positions.append(token.pos)
+        return Name(token.value, binding, line=token.line)
+
+    # -- blocks and statements -------------------------------------------
+
+    def parse(self):
+        """Parse the whole token stream into a Chunk"""
+        self._open_scope()
+        try:
+            body = self._block()
+        except RecursionError:
+            raise LuaSyntaxError("Code is nested too deeply to parse", None, self._line())
+        if self._peek() is not None:
+            self._error("'<eof>' expected")
+        self._close_scope()
+        return Chunk(body, self.bindings, self.globals, self.global_refs, line=1)
+
+    def _block(self):
+        body = []
+        while True:
+            token = self._peek()
+            if token is None or (token.kind == KEYWORD and token.value in _BLOCK_END):
+                return body
+            if token.kind == KEYWORD and token.value == 'return':
+                body.append(self._return())
+                return body
+            if token.kind == KEYWORD and token.value == 'break':
+                body.append(self._break())
+                self._accept(';')
+                return body
+            checkpoint()
+            stat = self._statement()
+            body.append(stat)
+            if self.scope.parent is None:
+                self.statement_ends.append((stat, self.pos))
+            # As in Lua 5.1, one ';' may follow a statement, but is not one itself
+            self._accept(';')
+
+    def _scoped_block(self):
+        self._open_scope()
+        body = self._block()
+        self._close_scope()
+        return body
+
+    def _statement(self):
+        token = self._peek()
+        if token.kind == KEYWORD:
+            handler = self._statement_handlers.get(token.value)
+            if handler is not None:
+                return handler(self)
+        return self._expression_statement()
+
+    def _if(self):
+        opener = self._next()
+        tests = []
+        bodies = []
+        orelse = None
+        tests.append(self._expr())
+        self._expect('then')
+        bodies.append(self._scoped_block())
+        while True:
+            if self._accept('elseif'):
+                tests.append(self._expr())
+                self._expect('then')
+                bodies.append(self._scoped_block())
+            elif self._accept('else'):
+                orelse = self._scoped_block()
+                self._expect('end', opener)
+                break
+            else:
+                self._expect('end', opener)
+                break
+        return If(tests, bodies, orelse, line=opener.line)
+
+    def _while(self):
+        opener = self._next()
+        cond = self._expr()
+        self._expect('do')
+        body = self._scoped_block()
+        self._expect('end', opener)
+        return While(cond, body, line=opener.line)
+
+    def _do(self):
+        opener = self._next()
+        body = self._scoped_block()
+        self._expect('end', opener)
+        return Do(body, line=opener.line)
+
+    def _for(self):
+        opener = self._next()
+        first = self._expect_name()
+
+        if self._accept('='):
+            start = self._expr()
+            self._expect(',')
+            stop = self._expr()
+            step = self._expr() if self._accept(',') else None
+            self._expect('do')
+            self._open_scope()
+            var = self._declare(first, 'for')
+            body = self._block()
+            self._close_scope()
+            self._expect('end', opener)
+            return NumericFor(var, start, stop, step, body, line=opener.line)
+
+        names = [first]
+        while self._accept(','):
+            names.append(self._expect_name())
+        self._expect('in')
+        exprs = self._expr_list()
+        self._expect('do')
+        self._open_scope()
+        targets = [self._declare(name, 'for') for name in names]
+        body = self._block()
+        self._close_scope()
+        self._expect('end', opener)
+        return GenericFor(targets, exprs, body, line=opener.line)
+
+    def _repeat(self):
+        opener = self._next()
+        # The 'until' condition can see the body's locals
+        self._open_scope()
+        body = self._block()
+        self._expect('until', opener)
+        cond = self._expr()
+        self._close_scope()
+        return Repeat(body, cond, line=opener.line)
+
+    def _function_statement(self):
+        opener = self._next()
+        first = self._expect_name()
+        target = self._reference(first)
+        method = None
+        while self._check('.'):
+            self.pos += 1
+            target = Field(target, self._expect_name().value, line=opener.line)
+        if self._accept(':'):
+            method = self._expect_name().value
+        func = self._function_body(opener, method is not None)
+        return FunctionStat(target, method, func, line=opener.line)
+
+    def _local(self):
+        opener = self._next()
+        if self._accept('function'):
+            name = self._expect_name()
+            # Declared before the body so the function can recurse
+            target = self._declare(name, 'function')
+            func = self._function_body(opener, False)
+            return LocalFunction(target, func, line=opener.line)
+
+        names = [self._expect_name()]
+        while self._accept(','):
+            names.append(self._expect_name())
+        values = self._expr_list() if self._accept('=') else []
+        # Values are evaluated before the new locals come into scope
+        targets = [self._declare(name, 'local') for name in names]
+        return Local(targets, values, line=opener.line)
+
+    def _return(self):
+        opener = self._next()
+        values = []
+        token = self._peek()
+        if token is not None and not (token.kind == KEYWORD and token.value in _BLOCK_END) \
+                and not (token.kind == OP and token.value == ';'):
+            values = self._expr_list()
+        self._accept(';')
+        return Return(values, line=opener.line)
+
+    def _break(self):
+        token = self._next()
+        return Break(line=token.line)
+
+    def _expression_statement(self):
+        line = self._line()
+        expr = self._suffixed_expr()
+        if self._check('=') or self._check(','):
+            targets = [expr]
+            while self._accept(','):
+                targets.append(self._suffixed_expr())
+            self._expect('=')
+            values = self._expr_list()
+            for target in targets:
+                if not isinstance(target, (Name, Field, Index)):
+                    raise LuaSyntaxError("syntax error: cannot assign to this expression", None, line)
+            return Assign(targets, values, line=line)
+        if not isinstance(expr, (Call, MethodCall)):
+            self._error("syntax error")
+        return CallStat(expr, line=line)
+
+    _statement_handlers = {
+        'if': _if,
+        'while': _while,
+        'do': _do,
+        'for': _for,
+        'repeat': _repeat,
+        'function': _function_statement,
+        'local': _local,
+        'return': _return,
+        'break': _break,
+    }
+
+    # -- functions ------------------------------------------------------
+
+    def _function_body(self, opener, is_method):
+        self._open_scope()
+        params = []
+        is_vararg = False
+        if is_method:
+            params.append(self._declare_self(opener.line))
+        self._expect('(')
+        if not self._check(')'):
+            while True:
+                if self._accept('...'):
+                    is_vararg = True
+                    break
+                params.append(self._declare(self._expect_name(), 'param'))
+                if not self._accept(','):
+                    break
+        self._expect(')')
+        outer, self.vararg = self.vararg, is_vararg
+        body = self._block()
+        self.vararg = outer
+        self._expect('end', opener)
+        self._close_scope()
+        return Function(params, is_vararg, body, line=opener.line)
+
+    # -- expressions ----------------------------------------------------
+
+    def _expr_list(self):
+        exprs = [self._expr()]
+        while self._accept(','):
+            exprs.append(self._expr())
+        return exprs
+
+    def _expr(self):
+        # Iterative precedence climbing keeps long '..' and '+' chains off the stack
+        operands = [self._unary()]
+        operators = []
+        while True:
+            token = self._peek()
+            if token is None or token.kind == NAME or token.kind == NUMBER or token.kind == STRING:
+                break
+            priority = BINARY_PRIORITY.get(token.value)
+            if priority is None:
+                break
+            self.pos += 1
+            while operators:
+                top = BINARY_PRIORITY[operators[-1][0]]
+                if top > priority or (top == priority and token.value not in RIGHT_ASSOCIATIVE):
+                    self._reduce(operands, operators)
+                else:
+                    break
+            operators.append((token.value, token.line))
+            operands.append(self._unary())
+        while operators:
+            self._reduce(operands, operators)
+        return operands[0]
+
+    @staticmethod
+    def _reduce(operands, operators):
+        op, line = operators.pop()
+        right = operands.pop()
+        left = operands.pop()
+        operands.append(BinOp(op, left, right, line=line))
+
+    def _unary(self):
+        token = self._peek()
+        if token is not None and token.value in UNARY_OPERATORS and token.kind in (OP, KEYWORD):
+            self.pos += 1
+            return UnOp(token.value, self._unary(), line=token.line)
+        return self._power()
+
+    def _power(self):
+        base = self._simple_expr()
+        if self._check('^'):
+            line = self._next().line
+            # '^' is right associative and binds tighter than unary operators
+            return BinOp('^', base, self._unary(), line=line)
+        return base
+
+    def _simple_expr(self):
+        token = self._peek()
+        if token is None:
+            self._error("unexpected symbol")
+        kind = token.kind
+        if kind == NUMBER:
+            self.pos += 1
+            return Number(token.value, line=token.line)
+        if kind == STRING:
+            self.pos += 1
+            return String(token.value, line=token.line)
+        if kind == KEYWORD:
+            if token.value in ('nil', 'true', 'false'):
+                self.pos += 1
+                return Constant(token.value, line=token.line)
+            if token.value == 'function':
+                self.pos += 1
+                return self._function_body(token, False)
+        elif kind == OP:
+            if token.value == '...':
+                if not self.vararg:
+                    self._error("cannot use '...' outside a vararg function")
+                self.pos += 1
+                return Constant('...', line=token.line)
+            if token.value == '{':
+                return self._table()
+        return self._suffixed_expr()
+
+    def _primary_expr(self):
+        token = self._peek()
+        if token is not None:
+            if token.kind == NAME:
+                self.pos += 1
+                return self._reference(token)
+            if token.kind == OP and token.value == '(':
+                self.pos += 1
+                expr = self._expr()
+                self._expect(')', token)
+                return Paren(expr, line=token.line)
+        self._error("unexpected symbol")
+
+    def _suffixed_expr(self):
+        expr = self._primary_expr()
+        while True:
+            token = self._peek()
+            if token is None:
+                return expr
+            value = token.value
+            if token.kind == OP:
+                if value == '.':
+                    self.pos += 1
+                    expr = Field(expr, self._expect_name().value, line=token.line)
+                    continue
+                if value == '[':
+                    self.pos += 1
+                    key = self._expr()
+                    self._expect(']')
+                    expr = Index(expr, key, line=token.line)
+                    continue
+                if value == ':':
+                    self.pos += 1
+                    method = self._expect_name().value
+                    expr = MethodCall(expr, method, self._call_args(), line=token.line)
+                    continue
+                if value == '(' or value == '{':
+                    expr = Call(expr, self._call_args(), line=token.line)
+                    continue
+            elif token.kind == STRING:
+                expr = Call(expr, self._call_args(), line=token.line)
+                continue
+            return expr
+
+    def _call_args(self):
+        token = self._peek()
+        if token is None:
+            self._error("function arguments expected")
+        if token.kind == STRING:
+            self.pos += 1
+            return [String(token.value, line=token.line)]
+        if token.kind == OP and token.value == '{':
+            return [self._table()]
+        if token.kind == OP and token.value == '(':
+            self.pos += 1
+            args = [] if self._check(')') else self._expr_list()
+            self._expect(')', token)
+            return args
+        self._error("function arguments expected")
+
+    def _table(self):
+        opener = self._expect('{')
+        fields = []
+        while not self._check('}'):
+            token = self._peek()
+            if token is not None and token.kind == OP and token.value == '[':
+                self.pos += 1
+                key = self._expr()
+                self._expect(']')
+                self._expect('=')
+                fields.append(TableField(key, self._expr(), line=token.line))
+            elif token is not None and token.kind == NAME and self._peek(1) is not None \
+                    and self._peek(1).value == '=' and self._peek(1).kind == OP:
+                self.pos += 2
+                fields.append(TableField(token.value, self._expr(), line=token.line))
+            else:
+                fields.append(TableField(None, self._expr(), line=self._line()))
+            if not (self._accept(',') or self._accept(';')):
+                break
+        self._expect('}', opener)
+        return Table(fields, line=opener.line)
+
+
+def parse_chunk(code_or_tokens):
+    """Parse Lua source text or a token list into a Chunk"""
+    if isinstance(code_or_tokens, str):
+        return LuaAstParser.from_source(code_or_tokens).parse()
+    return LuaAstParser(code_or_tokens).parse()
+
+
+class ParsedSource:
+    """
+    Lua source text together with its full token stream and AST
+
+    Produced once by validation and handed to the obfuscator, which then
+    skips lexing and parsing. len() is the length of the source text.
+    """
+
+    def __init__(self, code, tokens, chunk):
+        self.code = code
+        self.tokens = tokens
+        self.chunk = chunk
+        self._line_starts = None
+
+    @classmethod
+    def from_source(cls, code):
+        tokens = tokenize(code)
+        return cls(code, tokens, parse_chunk(tokens))
+
+    def __len__(self):
+        return len(self.code)
+
+    @property
+    def line_starts(self):
+        """Offset of the first character of every line, built on first use"""
+        if self._line_starts is None:
+            starts = [0]
+            find = self.code.find
+            index = find('\n')
+            while index != -1:
+                starts.append(index + 1)
+                index = find('\n', index + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def position(self, offset):
+        """Return the 1-based (line, column) of a character offset"""
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+
+# ---------------------------------------------------------------------------
+# Code generator
+# ---------------------------------------------------------------------------
+
+class LuaCodeGenerator:
+    """
+    Print an AST back out as Lua source
+
+    Renaming, number rewriting and string encoding are applied while
+    walking the tree:
+      names        - dict mapping Binding -> new identifier
+      globals      - dict mapping global name -> new identifier
+      number_hook  - callable(raw) returning replacement text or None
+      string_hook  - callable(raw) returning replacement text or None
+    """
+
+    def __init__(self, compact=False, names=None, number_hook=None,
+                 string_hook=None, indent='    ', globals=None):
+        self.compact = compact
+        self.names = names or {}
+        self.globals = globals or {}
+        self.number_hook = number_hook
+        self.string_hook = string_hook
+        self.indent_unit = indent
+        self._out = []
+        self._tail = ''
+        self._depth = 0
+
+    def generate(self, chunk):
+        """Return the source text for a Chunk"""
+        self._out = []
+        self._tail = ''
+        self._depth = 0
+        self._block(chunk.body)
+        return ''.join(self._out)
+
+    # -- output helpers --------------------------------------------------
+
+    def _w(self, text):
+        if self._tail and needs_separator(self._tail, text):
+            self._out.append(' ')
+        self._out.append(text)
+        self._tail = text
+
+    def _space(self):
+        # Cosmetic space, only in readable output
+        if not self.compact:
+            self._out.append(' ')
+            self._tail = ' '
+
+    def _newline(self):
+        if self.compact:
+            return
+        if self._out:
+            self._out.append('\n')
+        self._out.append(self.indent_unit * self._depth)
+        self._tail = ' '
+
+    def _name(self, binding):
+        return self.names.get(binding, binding.name)
+
+    # -- statements ----------------------------------------------------
+
+    def _block(self, body):
+        for index, stat in enumerate(body):
+            checkpoint()
+            self._newline()
+            if self.compact and index and self._starts_with_paren(stat):
+                # Avoid 'a = b (f)()' being read as a call of b; Lua 5.1 only
+                # takes ';' after a statement, not at the start of a block
+                self._w(';')
+            self._stat_handlers[type(stat)](self, stat)
+
+    def _body(self, body):
+        self._depth += 1
+        self._block(body)
+        self._depth -= 1
+        self._newline()
+
+    @staticmethod
+    def _starts_with_paren(stat):
+        if isinstance(stat, CallStat):
+            node = stat.call
+        elif isinstance(stat, Assign):
+            node = stat.targets[0]
+        else:
+            return False
+        while True:
+            if isinstance(node, Paren):
+                return True
+            if isinstance(node, (Call,)):
+                node = node.func
+            elif isinstance(node, (MethodCall, Field, Index)):
+                node = node.obj
+            else:
+                return False
+
+    def _local(self, stat):
+        self._w('local')
+        for i, binding in enumerate(stat.targets):
+            if i:
+                self._w(',')
+                self._space()
+            self._w(self._name(binding))
+        if stat.values:
+            self._assign_values(stat.values)
+
+    def _assign(self, stat):
+        self._expr_list(stat.targets)
+        self._assign_values(stat.values)
+
+    def _assign_values(self, values):
+        self._space()
+        self._w('=')
+        self._space()
+        self._expr_list(values)
+
+    def _call_stat(self, stat):
+        self._expr(stat.call)
+
+    def _do(self, stat):
+        self._w('do')
+        self._body(stat.body)
+        self._w('end')
+
+    def _while(self, stat):
+        self._w('while')
+        self._expr(stat.cond)
+        self._w('do')
+        self._body(stat.body)
+        self._w('end')
+
+    def _repeat(self, stat):
+        self._w('repeat')
+        self._body(stat.body)
+        self._w('until')
+        self._expr(stat.cond)
+
+    def _if(self, stat):
+        for i, (test, body) in enumerate(zip(stat.tests, stat.bodies)):
+            self._w('if' if i == 0 else 'elseif')
+            self._expr(test)
+            self._w('then')
+            self._body(body)
+        if stat.orelse is not None:
+            self._w('else')
+            self._body(stat.orelse)
+        self._w('end')
+
+    def _numeric_for(self, stat):
+        self._w('for')
+        self._w(self._name(stat.var))
+        self._assign_values([stat.start, stat.stop] + ([stat.step] if stat.step else []))
+        self._w('do')
+        self._body(stat.body)
+        self._w('end')
+
+    def _generic_for(self, stat):
+        self._w('for')
+        for i, binding in enumerate(stat.targets):
+            if i:
+                self._w(',')
+                self._space()
+            self._w(self._name(binding))
+        self._w('in')
+        self._expr_list(stat.exprs)
+        self._w('do')
+        self._body(stat.body)
+        self._w('end')
+
+    def _function_stat(self, stat):
+        self._w('function')
+        self._expr(stat.target)
+        if stat.method is not None:
+            self._w(':')
+            self._w(stat.method)
+        self._function_tail(stat.func, skip_self=stat.method is not None)
+
+    def _local_function(self, stat):
+        self._w('local')
+        self._w('function')
+        self._w(self._name(stat.target))
+        self._function_tail(stat.func)
+
+    def _return(self, stat):
+        self._w('return')
+        if stat.values:
+            self._expr_list(stat.values)
+
+    def _break(self, stat):
+        self._w('break')
+
+    _stat_handlers = {
+        Local: _local,
+        Assign: _assign,
+        CallStat: _call_stat,
+        Do: _do,
+        While: _while,
+        Repeat: _repeat,
+        If: _if,
+        NumericFor: _numeric_for,
+        GenericFor: _generic_for,
+        FunctionStat: _function_stat,
+        LocalFunction: _local_function,
+        Return: _return,
+        Break: _break,
+    }
+
+    # -- expressions -----------------------------------------------------
+
+    def _expr_list(self, exprs):
+        for i, expr in enumerate(exprs):
+            if i:
+                self._w(',')
+                self._space()
+            self._expr(expr)
+
+    def _expr(self, expr):
+        self._expr_handlers[type(expr)](self, expr)
+
+    def _constant(self, expr):
+        self._w(expr.value)
+
+    def _number(self, expr):
+        replacement = self.number_hook(expr.raw) if self.number_hook else None
+        self._w(replacement if replacement is not None else expr.raw)
+
+    def _string(self, expr):
+        replacement = self.string_hook(expr.raw) if self.string_hook else None
+        self._w(replacement if replacement is not None else expr.raw)
+
+    def _name_expr(self, expr):
+        if expr.binding is not None:
+            self._w(self._name(expr.binding))
+        else:
+            self._w(self.globals.get(expr.name, expr.name))
+
+    def _field(self, expr):
+        self._expr(expr.obj)
+        self._w('.')
+        self._w(expr.name)
+
+    def _index(self, expr):
+        self._expr(expr.obj)
+        self._w('[')
+        self._expr(expr.key)
+        self._w(']')
+
+    def _call(self, expr):
+        self._expr(expr.func)
+        self._args(expr.args)
+
+    def _method_call(self, expr):
+        self._expr(expr.obj)
+        self._w(':')
+        self._w(expr.method)
+        self._args(expr.args)
+
+    def _args(self, args):
+        if len(args) == 1:
+            arg = args[0]
+            # Keep the f"str" / f{...} short forms when the literal is untouched
+            if isinstance(arg, Table):
+                self._expr(arg)
+                return
+            if isinstance(arg, String):
+                replacement = self.string_hook(arg.raw) if self.string_hook else None
+                if replacement is None:
+                    self._w(arg.raw)
+                else:
+                    self._w('(')
+                    self._w(replacement)
+                    self._w(')')
+                return
+        self._w('(')
+        self._expr_list(args)
+        self._w(')')
+
+    def _function(self, expr):
+        self._w('function')
+        self._function_tail(expr)
+
+    def _function_tail(self, func, skip_self=False):
+        self._w('(')
+        params = func.params[1:] if skip_self else func.params
+        for i, binding in enumerate(params):
+            if i:
+                self._w(',')
+                self._space()
+            self._w(self._name(binding))
+        if func.is_vararg:
+            if params:
+                self._w(',')
+                self._space()
+            self._w('...')
+        self._w(')')
+        self._body(func.body)
+        self._w('end')
+
+    def _binop(self, expr):
+        # Walk operator chains iteratively so long concatenations do not recurse
+        pending = []
+        node = expr
+        while isinstance(node, BinOp) and node.op not in RIGHT_ASSOCIATIVE:
+            pending.append(node)
+            node = node.left
+        self._right_chain(node)
+        for parent in reversed(pending):
+            self._operator(parent.op)
+            self._right_chain(parent.right)
+
+    def _right_chain(self, node):
+        while isinstance(node, BinOp) and node.op in RIGHT_ASSOCIATIVE:
+            self._expr(node.left)
+            self._operator(node.op)
+            node = node.right
+        self._expr(node)
+
+    def _operator(self, op):
+        self._space()
+        self._w(op)
+        self._space()
+
+    def _unop(self, expr):
+        self._w(expr.op)
+        self._expr(expr.operand)
+
+    def _paren(self, expr):
+        self._w('(')
+        self._expr(expr.expr)
+        self._w(')')
+
+    def _table(self, expr):
+        self._w('{')
+        for i, field in enumerate(expr.fields):
+            if i:
+                self._w(',')
+                self._space()
+            if field.key is None:
+                pass
+            elif isinstance(field.key, str):
+                self._w(field.key)
+                self._assign_eq()
+            else:
+                self._w('[')
+                self._expr(field.key)
+                self._w(']')
+                self._assign_eq()
+            self._expr(field.value)
+        self._w('}')
+
+    def _assign_eq(self):
+        self._space()
+        self._w('=')
+        self._space()
+
+    _expr_handlers = {
+        Constant: _constant,
+        Number: _number,
+        String: _string,
+        Name: _name_expr,
+        Field: _field,
+        Index: _index,
+        Call: _call,
+        MethodCall: _method_call,
+        Function: _function,
+        BinOp: _binop,
+        UnOp: _unop,
+        Paren: _paren,
+        Table: _table,
+    }
@@ -0,0 +1,276 @@
+import re
+from itertools import islice
+from collections import namedtuple
+
+from budget import checkpoint
+
+# Token kinds
+NAME = 'name'
+KEYWORD = 'keyword'
+NUMBER = 'number'
+STRING = 'string'
+COMMENT = 'comment'
+OP = 'op'
+WHITESPACE = 'whitespace'
+# Pre-rendered code spliced in by an obfuscation pass
+RAW = 'raw'
+
+LUA_KEYWORDS = frozenset({
+    'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for',
+    'function', 'if', 'in', 'local', 'nil', 'not', 'or', 'repeat',
+    'return', 'then', 'true', 'until', 'while'
+})
+
+# Tokens that never carry meaning for the parser
+TRIVIA = frozenset({WHITESPACE, COMMENT})
+
+# Multi-character operators, used to decide where a separator is required
+_MULTI_CHAR_OPS = frozenset({
+    '...', '..', '==', '~=', '<=', '>=', '<<', '>>', '//', '::'
+})
+
+Token = namedtuple('Token', ['kind', 'value', 'pos', 'line'])
+
+
+class LuaSyntaxError(Exception):
+    """Raised when Lua source cannot be tokenized or parsed"""
+
+    def __init__(self, message, pos=None, line=None):
+        super().__init__(message)
+        self.message = message
+        self.pos = pos
+        self.line = line
+
+    def __str__(self):
+        if self.line is not None:
+            return f"{self.message} at line {self.line}"
+        return self.message
+
+
+_TOKEN_RE = re.compile(r'''
+    (?P<whitespace>[ \t\r\n\f\v]+)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<number>
+        0[xX](?:[0-9a-fA-F]+(?:\.[0-9a-fA-F]*)?|\.[0-9a-fA-F]+)(?:[pP][+-]?[0-9]+)?
+      | (?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?
+    )
+  | (?P<comment>--)
+  | (?P<longstring>\[=*\[)
+  | (?P<quote>["'])
+  | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|<<|>>|//|::|[-+*/%^\#&~|<>=(){}\[\];:,.])
+''', re.VERBOSE)
+
+_LONG_BRACKET_RE = re.compile(r'\[=*\[')
+
+# Unrolled loops so that unterminated strings fail fast without backtracking
+_QUOTED_RE = {
+    '"': re.compile(r'"[^"\\\n]*(?:\\(?:\r\n|\n\r|[\s\S])[^"\\\n]*)*"'),
+    "'": re.compile(r"'[^'\\\n]*(?:\\(?:\r\n|\n\r|[\s\S])[^'\\\n]*)*'"),
+}
+
+_NUMBER_TAIL_RE = re.compile(r'[A-Za-z0-9_.]')
+
+# One escape of a quoted string; decimal escapes are up to three digits
+_ESCAPE_RE = re.compile(r'\\(?:([0-9]{1,3})|[\s\S])')
+
+_SIMPLE_ESCAPES = {
+    'a': 7, 'b': 8, 'f': 12, 'n': 10, 'r': 13, 't': 9, 'v': 11,
+    '\\': 92, '"': 34, "'": 39,
+}
+
+
+def tokenize(code):
+    """
+    Split Lua source into a list of tokens
+    Whitespace and comments are kept so that emit(tokenize(code)) == code
+    """
+    # Lexed in slices, so that a request budget is checked along the way
+    tokens = []
+    stream = iter_tokens(code)
+    while True:
+        checkpoint()
+        size = len(tokens)
+        tokens.extend(islice(stream, 16384))
+        if len(tokens) - size < 16384:
+            return tokens
+
+
+def iter_tokens(code, pos=0, endpos=None, line=1):
+    """
+    Yield the tokens of Lua source one at a time, as tokenize() lists them
+    With `pos` and `endpos`, only the tokens starting in code[pos:endpos]
+    are yielded; `pos` must be a token boundary on line `line`
+    """
+    match = _TOKEN_RE.match
+    length = len(code)
+    if endpos is None:
+        endpos = length
+
+    while pos < endpos:
+        m = match(code, pos)
+        if m is None:
+            raise LuaSyntaxError(f"Unexpected symbol '{code[pos]}'", pos, line)
+
+        kind = m.lastgroup
+        end = m.end()
+
+        if kind == 'name':
+            value = m.group()
+            yield Token(KEYWORD if value in LUA_KEYWORDS else NAME, value, pos, line)
+
+        elif kind == 'op':
+            yield Token(OP, m.group(), pos, line)
+
+        elif kind == 'whitespace':
+            value = m.group()
+            yield Token(WHITESPACE, value, pos, line)
+            line += value.count('\n')
+
+        elif kind == 'number':
+            if end < length and _NUMBER_TAIL_RE.match(code, end):
+                raise LuaSyntaxError(f"Malformed number near '{code[pos:end + 1]}'", pos, line)
+            yield Token(NUMBER, m.group(), pos, line)
+
+        elif kind == 'quote':
+            sm = _QUOTED_RE[m.group()].match(code, pos)
+            if sm is None:
+                raise LuaSyntaxError("Unterminated string literal", pos, line)
+            end = sm.end()
+            value = sm.group()
+            if '\\' in value:
+                _check_escapes(value, pos, line)
+            yield Token(STRING, value, pos, line)
+            line += value.count('\n')
+
+        elif kind == 'longstring':
+            end = _find_long_bracket_end(code, pos, m.group(), line, 'string')
+            value = code[pos:end]
+            yield Token(STRING, value, pos, line)
+            line += value.count('\n')
+
+        else:
+            # Comment: long form --[==[ ... ]==] or up to the end of the line
+            bm = _LONG_BRACKET_RE.match(code, end)
+            if bm:
+                end = _find_long_bracket_end(code, end, bm.group(), line, 'comment')
+            else:
+                end = code.find('\n', end)
+                if end < 0:
+                    end = length
+            value = code[pos:end]
+            yield Token(COMMENT, value, pos, line)
+            line += value.count('\n')
+
+        pos = end
+
+
+def _check_escapes(value, pos, line):
+    """Reject the escapes of a quoted string that Lua 5.1 does not accept"""
+    for m in _ESCAPE_RE.finditer(value):
+        if m.group(1) is not None and int(m.group(1)) > 255:
+            raise LuaSyntaxError(f"Escape sequence too large near '{m.group()}'",
+                                 pos + m.start(), line + value.count('\n', 0, m.start()))
+
+
+def _find_long_bracket_end(code, start, opener, line, what):
+    """Return the offset just past the bracket that closes `opener`"""
+    closer = ']' + '=' * (len(opener) - 2) + ']'
+    end = code.find(closer, start + len(opener))
+    if end < 0:
+        raise LuaSyntaxError(f"Unterminated long {what}", start, line)
+    return end + len(closer)
+
+
+def emit(tokens):
+    """Join tokens back into source text"""
+    return ''.join([token.value for token in tokens])
+
+
+def significant(tokens):
+    """Return only the tokens that matter to the grammar"""
+    return [token for token in tokens if token.kind not in TRIVIA]
+
+
+def needs_separator(left, right):
+    """
+    Check whether two adjacent token texts would lex differently if
+    written without whitespace between them
+    """
+    if not left or not right:
+        return False
+    a = left[-1]
+    b = right[0]
+    if (a.isalnum() or a == '_') and (b.isalnum() or b == '_'):
+        return True
+    if b == '.' and (a == '.' or _is_numeral(left)):
+        return True
+    if a == '.' and b.isdigit():
+        return True
+    if a == '-' and b == '-':
+        return True
+    if a == '[' and (b == '[' or b == '='):
+        return True
+    return (a + b) in _MULTI_CHAR_OPS
+
+
+def _is_numeral(text):
+    first = text[0]
+    return first.isdigit() or (first == '.' and len(text) > 1 and text[1].isdigit())
+
+
+def decode_string(raw):
+    """
+    Decode the source text of a Lua string literal into bytes, as Lua 5.1
+    reads it; the escapes must have passed the lexer
+    """
+    if raw[0] == '[':
+        level = raw.index('[', 1) + 1
+        body = raw[level:-level]
+        if body.startswith('\r\n'):
+            body = body[2:]
+        elif body.startswith('\n') or body.startswith('\r'):
+            body = body[1:]
+        return body.encode('utf-8')
+
+    body = raw[1:-1]
+    if '\\' not in body:
+        return body.encode('utf-8')
+
+    out = bytearray()
+    i = 0
+    length = len(body)
+    while i < length:
+        char = body[i]
+        if char != '\\':
+            j = body.find('\\', i)
+            if j < 0:
+                j = length
+            out += body[i:j].encode('utf-8')
+            i = j
+            continue
+
+        i += 1
+        esc = body[i]
+        if esc in _SIMPLE_ESCAPES:
+            out.append(_SIMPLE_ESCAPES[esc])
+            i += 1
+        elif esc == '\r' or esc == '\n':
+            out.append(10)
+            i += 1
+            if i < length and body[i] in '\r\n' and body[i] != esc:
+                i += 1
+        elif '0' <= esc <= '9':
+            j = i
+            while j < length and j < i + 3 and '0' <= body[j] <= '9':
+                j += 1
+            out.append(int(body[i:j]))
+            i = j
+        else:
+            # Lua 5.1 keeps the character of any other escape: \x41 is 'x41'
+            # there, and \z and \u{...} are not escapes either
+            out += esc.encode('utf-8')
+            i += 1
+
+    return bytes(out)
+
+
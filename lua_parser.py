@@ -1,9 +1,13 @@
-import re
 import logging
+from lua_lexer import tokenize, significant, LuaSyntaxError, NAME, KEYWORD, OP
+from budget import BudgetExceeded
+from lua_ast import LuaAstParser, ParsedSource
+
+logger = logging.getLogger(__name__)
 
 class LuaParser:
     """
-    Basic Lua syntax validator and parser
+    Lua syntax validator and parser
     """
     
     def __init__(self):
@@ -22,230 +26,162 @@ class LuaParser:
         Basic Lua syntax validation
         Returns (is_valid, error_message)
         """
+        parsed, error_msg = self.parse_source(code)
+        return parsed is not None, error_msg
+    
+    def parse_source(self, code):
+        """
+        Validate Lua code and keep the result for the obfuscator
+        Returns (ParsedSource, None) or (None, error_message)
+        """
         try:
-            # Check for basic syntax issues
-            
-            # 1. Check balanced parentheses, brackets, and braces
-            balance_result = self._check_balanced_delimiters(code)
-            if not balance_result[0]:
-                return False, balance_result[1]
-            
-            # 2. Check balanced block statements
-            block_result = self._check_balanced_blocks(code)
-            if not block_result[0]:
-                return False, block_result[1]
+            # Tokenizing catches unterminated strings/comments and stray characters
+            try:
+                all_tokens = tokenize(code)
+            except LuaSyntaxError as e:
+                return None, str(e)
+            tokens = significant(all_tokens)
             
-            # 3. Check for invalid characters/patterns
-            invalid_result = self._check_invalid_patterns(code)
-            if not invalid_result[0]:
-                return False, invalid_result[1]
+            try:
+                chunk = self.check_tokens(tokens)
+            except LuaSyntaxError as e:
+                return None, str(e)
             
-            # 4. Check string literals
-            string_result = self._check_string_literals(code)
-            if not string_result[0]:
-                return False, string_result[1]
-            
-            return True, None
+            return ParsedSource(code, all_tokens, chunk), None
             
+        except BudgetExceeded:
+            raise
         except Exception as e:
-            logging.error(f"Syntax validation error: {str(e)}")
-            return False, f"Validation error: {str(e)}"
+            logger.exception('Syntax validation error: %s', e)
+            return None, f"Validation error: {str(e)}"
     
-    def _check_balanced_delimiters(self, code):
+    def check_tokens(self, tokens):
+        """
+        Run every check over the significant tokens of a script and parse them
+        Returns the Chunk; raises LuaSyntaxError, with the position of the
+        offending token, for the first problem found
+        """
+        # 1. Check balanced parentheses, brackets, and braces
+        self._check_balanced_delimiters(tokens)
+        
+        # 2. Check balanced block statements
+        self._check_balanced_blocks(tokens)
+        
+        # 3. Check for invalid characters/patterns
+        self._check_invalid_patterns(tokens)
+        
+        # 4. Parse the full grammar
+        return LuaAstParser(tokens).parse()
+    
+    def _check_balanced_delimiters(self, tokens):
         """Check if parentheses, brackets, and braces are balanced"""
         stack = []
         pairs = {'(': ')', '[': ']', '{': '}'}
+        closers = {')', ']', '}'}
         
-        in_string = False
-        string_char = None
-        escaped = False
-        
-        for i, char in enumerate(code):
-            if escaped:
-                escaped = False
+        for token in tokens:
+            if token.kind != OP:
                 continue
+            char = token.value
+            if char in pairs:
+                stack.append(token)
+            elif char in closers:
+                if not stack:
+                    raise LuaSyntaxError(f"Unmatched closing delimiter '{char}'", token.pos, token.line)
                 
-            if char == '\\':
-                escaped = True
-                continue
-            
-            if not in_string:
-                if char in ['"', "'"]:
-                    in_string = True
-                    string_char = char
-                elif char in pairs:
-                    stack.append((char, i))
-                elif char in pairs.values():
-                    if not stack:
-                        return False, f"Unmatched closing delimiter '{char}' at position {i}"
-                    
-                    opener, pos = stack.pop()
-                    if pairs[opener] != char:
-                        return False, f"Mismatched delimiter: expected '{pairs[opener]}' but found '{char}' at position {i}"
-            else:
-                if char == string_char:
-                    in_string = False
-                    string_char = None
+                opener = stack.pop()
+                if pairs[opener.value] != char:
+                    raise LuaSyntaxError(f"Mismatched delimiter: expected '{pairs[opener.value]}' but found '{char}'",
+                                         token.pos, token.line)
         
         if stack:
-            opener, pos = stack[-1]
-            return False, f"Unmatched opening delimiter '{opener}' at position {pos}"
-        
-        if in_string:
-            return False, "Unterminated string literal"
-        
-        return True, None
+            opener = stack[-1]
+            raise LuaSyntaxError(f"Unmatched opening delimiter '{opener.value}'", opener.pos, opener.line)
     
-    def _check_balanced_blocks(self, code):
+    def _check_balanced_blocks(self, tokens):
         """Check if Lua block statements are properly balanced"""
-        # Remove strings and comments first to avoid false matches
-        cleaned_code = self._remove_strings_and_comments(code)
-        
-        # Find all keywords
-        tokens = re.findall(r'\b\w+\b', cleaned_code)
-        
         stack = []
+        # 'for' and 'while' headers own the 'do' that follows them
+        pending_do = 0
         
-        for i, token in enumerate(tokens):
-            if token in self.block_starters:
-                if token == 'repeat':
-                    stack.append(('repeat', 'until'))
-                else:
-                    stack.append((token, 'end'))
-            elif token in self.block_enders:
+        for token in tokens:
+            if token.kind != KEYWORD:
+                continue
+            keyword = token.value
+            
+            if keyword in ('for', 'while'):
+                stack.append((token, 'end'))
+                pending_do += 1
+            elif keyword == 'do' and pending_do:
+                pending_do -= 1
+            elif keyword == 'repeat':
+                stack.append((token, 'until'))
+            elif keyword in self.block_starters:
+                stack.append((token, 'end'))
+            elif keyword in self.block_enders:
                 if not stack:
-                    return False, f"Unexpected '{token}' without matching block starter"
+                    raise LuaSyntaxError(f"Unexpected '{keyword}' without matching block starter",
+                                         token.pos, token.line)
                 
                 starter, expected_ender = stack.pop()
-                if token != expected_ender:
-                    return False, f"Block mismatch: '{starter}' should end with '{expected_ender}', not '{token}'"
+                if keyword != expected_ender:
+                    raise LuaSyntaxError(f"Block mismatch: '{starter.value}' should end with '{expected_ender}', "
+                                         f"not '{keyword}'", token.pos, token.line)
         
         if stack:
             starter, expected_ender = stack[-1]
-            return False, f"Unmatched block starter '{starter}' - missing '{expected_ender}'"
-        
-        return True, None
+            # Reported without a line, as before; the position is the starter's
+            raise LuaSyntaxError(f"Unmatched block starter '{starter.value}' - missing '{expected_ender}'",
+                                 starter.pos)
     
-    def _check_invalid_patterns(self, code):
+    def _check_invalid_patterns(self, tokens):
         """Check for obviously invalid patterns"""
+        invalid_pairs = {
+            ('==', '='): 'Invalid operator (use == for equality)',
+            ('+', '+'): 'Invalid operator (use var = var + 1 in Lua)',
+        }
         
-        # Check for invalid identifier patterns
-        invalid_identifiers = re.findall(r'\b\d+[a-zA-Z_]\w*', code)
-        if invalid_identifiers:
-            return False, f"Invalid identifier starting with digit: {invalid_identifiers[0]}"
-        
-        # Check for invalid operators or syntax
-        invalid_patterns = [
-            (r'===+', 'Invalid operator (use == for equality)'),
-            (r'!==*', 'Invalid operator (use ~= for inequality in Lua)'),
-            (r'\+\+', 'Invalid operator (use var = var + 1 in Lua)'),
-            (r'--(?!\[)', 'Invalid operator on new line (use var = var - 1 in Lua)'),
-        ]
-        
-        for pattern, message in invalid_patterns:
-            if re.search(pattern, code):
-                return False, message
-        
-        return True, None
-    
-    def _check_string_literals(self, code):
-        """Check if string literals are properly formed"""
-        # Check for unescaped quotes in strings
-        single_quote_strings = re.findall(r"'([^'\\]|\\.)*'?", code)
-        double_quote_strings = re.findall(r'"([^"\\]|\\.)*"?', code)
-        
-        # This is a basic check - a more thorough implementation would parse character by character
-        if code.count('"') % 2 != 0:
-            unmatched_double = True
-            # More sophisticated check needed here
-        
-        if code.count("'") % 2 != 0:
-            unmatched_single = True
-            # More sophisticated check needed here
-        
-        return True, None
-    
-    def _remove_strings_and_comments(self, code):
-        """Remove strings and comments from code for parsing"""
-        result = []
-        in_string = False
-        string_char = None
-        escaped = False
-        i = 0
-        
-        while i < len(code):
-            char = code[i]
-            
-            if escaped:
-                escaped = False
-                if in_string:
-                    result.append(' ')
-                else:
-                    result.append(char)
-                i += 1
-                continue
-            
-            if char == '\\':
-                escaped = True
-                result.append(' ' if in_string else char)
-                i += 1
-                continue
-            
-            if not in_string:
-                if char in ['"', "'"]:
-                    in_string = True
-                    string_char = char
-                    result.append(' ')
-                elif char == '-' and i + 1 < len(code) and code[i + 1] == '-':
-                    # Comment starts - skip to end of line
-                    while i < len(code) and code[i] != '\n':
-                        i += 1
-                    if i < len(code):
-                        result.append('\n')
-                    continue
-                else:
-                    result.append(char)
-            else:
-                if char == string_char:
-                    in_string = False
-                    string_char = None
-                result.append(' ' if in_string else ' ')
-            
-            i += 1
-        
-        return ''.join(result)
+        prev = None
+        for token in tokens:
+            if prev is not None and prev.kind == OP and token.kind == OP:
+                # Only flag operators written back to back, e.g. '===' or '++'
+                if prev.pos + len(prev.value) == token.pos:
+                    message = invalid_pairs.get((prev.value, token.value))
+                    if message:
+                        raise LuaSyntaxError(message, token.pos, token.line)
+            prev = token
     
     def extract_functions(self, code):
         """Extract function definitions from Lua code"""
         functions = []
-        
-        # Pattern to match function definitions
-        func_pattern = r'\bfunction\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
-        
-        for match in re.finditer(func_pattern, code):
-            func_name = match.group(1)
-            start_pos = match.start()
-            functions.append({
-                'name': func_name,
-                'start_position': start_pos
-            })
+        tokens = significant(tokenize(code))
+        
+        # Match 'function name (' outside of strings and comments
+        for i in range(len(tokens) - 2):
+            token = tokens[i]
+            if token.kind == KEYWORD and token.value == 'function' \
+                    and tokens[i + 1].kind == NAME \
+                    and tokens[i + 2].kind == OP and tokens[i + 2].value == '(':
+                functions.append({
+                    'name': tokens[i + 1].value,
+                    'start_position': token.pos
+                })
         
         return functions
     
     def extract_variables(self, code):
         """Extract variable declarations from Lua code"""
         variables = []
-        
-        # Pattern to match local variable declarations
-        local_pattern = r'\blocal\s+([a-zA-Z_][a-zA-Z0-9_]*)'
-        
-        for match in re.finditer(local_pattern, code):
-            var_name = match.group(1)
-            start_pos = match.start()
-            variables.append({
-                'name': var_name,
-                'start_position': start_pos,
-                'type': 'local'
-            })
+        tokens = significant(tokenize(code))
+        
+        # Match 'local name' declarations
+        for i in range(len(tokens) - 1):
+            token = tokens[i]
+            if token.kind == KEYWORD and token.value == 'local' and tokens[i + 1].kind == NAME:
+                variables.append({
+                    'name': tokens[i + 1].value,
+                    'start_position': token.pos,
+                    'type': 'local'
+                })
         
         return variables
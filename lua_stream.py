@@ -0,0 +1,470 @@
+"""
+Single-pass scope resolution for inputs too large to hold as an AST
+"""
+from array import array
+from collections import deque
+
+from lua_lexer import NAME, KEYWORD, NUMBER, STRING, OP, TRIVIA, LuaSyntaxError
+from budget import checkpoint
+
+_BLOCK_END = frozenset({'end', 'else', 'elseif', 'until'})
+_BINARY_OPS = frozenset({
+    '+', '-', '*', '/', '%', '^', '..',
+    '==', '~=', '<', '<=', '>', '>=',
+})
+_UNARY_OPS = frozenset({'-', '#'})
+
+
+class ScopeResolver:
+    """
+    Resolve local variables in one forward pass over a token stream
+
+    Walks the same grammar as LuaAstParser but builds no tree and keeps no
+    token list, so memory grows with the number of locals and references
+    rather than with the whole input. Results are keyed by the ordinal of
+    each significant (non-trivia) token, for a second pass over a fresh
+    token stream to apply:
+
+    - ref_ordinals/ref_ids: every token naming a renamable local, with
+      the binding it refers to (declarations included)
+    - statement_ends: ordinal of the last token of each top-level
+      statement that may be followed by another
+    - call_sites: (first ordinal, end ordinal, path) of calls to a watched
+      global or to a field of one, e.g. print(...) or string.format(...)
+    - assigned: watched paths the code assigns or defines
+
+    Per binding, names/counts/firsts/lasts hold the original name, the
+    number of tokens naming it and the source offsets of the first and
+    last one. Bindings are numbered in declaration order.
+    """
+
+    def __init__(self, tokens, watch=frozenset()):
+        self._tokens = (token for token in tokens if token.kind not in TRIVIA)
+        self._buffer = deque()
+        self._last = None
+        self.index = 0
+        self.watch = watch
+        self.scopes = []
+        # Whether '...' may be used here; the main chunk is a vararg function
+        self.vararg = True
+
+        self.names = []
+        self.counts = array('l')
+        self.firsts = array('q')
+        self.lasts = array('q')
+        self.ref_ordinals = array('q')
+        self.ref_ids = array('l')
+        self.statement_ends = array('q')
+        self.call_sites = []
+        self.assigned = set()
+        self.globals = set()
+        self.local_names = set()
+
+    def run(self):
+        """Resolve the whole stream; raises LuaSyntaxError on malformed input"""
+        self.scopes.append({})
+        try:
+            self._block()
+        except RecursionError:
+            raise LuaSyntaxError("Code is nested too deeply to parse", None, self._line())
+        if self._peek() is not None:
+            self._error("'<eof>' expected")
+        self.scopes.pop()
+        return self
+
+    # -- token helpers ----------------------------------------------------
+
+    def _peek(self, offset=0):
+        buffer = self._buffer
+        while len(buffer) <= offset:
+            token = next(self._tokens, None)
+            if token is None:
+                return None
+            buffer.append(token)
+        return buffer[offset]
+
+    def _next(self):
+        if self._peek() is None:
+            self._error("unexpected end of input")
+        self.index += 1
+        self._last = self._buffer.popleft()
+        return self._last
+
+    def _check(self, value):
+        token = self._peek()
+        return token is not None and token.value == value and token.kind in (OP, KEYWORD)
+
+    def _accept(self, value):
+        if self._check(value):
+            self._next()
+            return True
+        return False
+
+    def _expect(self, value):
+        if not self._check(value):
+            self._error(f"'{value}' expected")
+        return self._next()
+
+    def _expect_name(self):
+        token = self._peek()
+        if token is None or token.kind != NAME:
+            self._error("<name> expected")
+        return self._next()
+
+    def _line(self):
+        token = self._peek()
+        if token is None:
+            return self._last.line if self._last is not None else 1
+        return token.line
+
+    def _error(self, message):
+        token = self._peek()
+        if token is None:
+            raise LuaSyntaxError(f"{message} near <eof>", None, self._line())
+        raise LuaSyntaxError(f"{message} near '{token.value}'", token.pos, token.line)
+
+    # -- bindings ---------------------------------------------------------
+
+    def _new_binding(self):
+        """Consume a declared name; it becomes visible once passed to _bind"""
+        token = self._expect_name()
+        binding = len(self.names)
+        self.names.append(token.value)
+        self.counts.append(1)
+        self.firsts.append(token.pos)
+        self.lasts.append(token.pos)
+        self.ref_ordinals.append(self.index - 1)
+        self.ref_ids.append(binding)
+        self.local_names.add(token.value)
+        return binding
+
+    def _bind(self, binding):
+        self.scopes[-1][self.names[binding]] = binding
+
+    def _reference(self, token):
+        """Record a name read or written; returns True for globals"""
+        name = token.value
+        for scope in reversed(self.scopes):
+            binding = scope.get(name)
+            if binding is not None:
+                if binding >= 0:
+                    self.counts[binding] += 1
+                    self.lasts[binding] = token.pos
+                    self.ref_ordinals.append(self.index - 1)
+                    self.ref_ids.append(binding)
+                return False
+        self.globals.add(name)
+        return True
+
+    def _scoped_block(self):
+        self.scopes.append({})
+        self._block()
+        self.scopes.pop()
+
+    # -- blocks and statements -------------------------------------------
+
+    def _block(self):
+        while True:
+            token = self._peek()
+            if token is None or (token.kind == KEYWORD and token.value in _BLOCK_END):
+                return
+            if token.kind == KEYWORD and token.value == 'return':
+                self._next()
+                token = self._peek()
+                if not (token is None or (token.kind == KEYWORD and token.value in _BLOCK_END)
+                        or self._check(';')):
+                    self._expr_list()
+                self._accept(';')
+                return
+            if token.kind == KEYWORD and token.value == 'break':
+                # Like 'return', 'break' must be the last statement of its block
+                self._next()
+                self._accept(';')
+                return
+            checkpoint()
+            self._statement()
+            if len(self.scopes) == 1:
+                self.statement_ends.append(self.index - 1)
+            # As in Lua 5.1, one ';' may follow a statement, but is not one itself
+            self._accept(';')
+
+    def _statement(self):
+        token = self._peek()
+        if token.kind == KEYWORD:
+            handler = self._statement_handlers.get(token.value)
+            if handler is not None:
+                handler(self)
+                return
+        self._expression_statement()
+
+    def _if(self):
+        self._next()
+        self._expr()
+        self._expect('then')
+        self._scoped_block()
+        while self._accept('elseif'):
+            self._expr()
+            self._expect('then')
+            self._scoped_block()
+        if self._accept('else'):
+            self._scoped_block()
+        self._expect('end')
+
+    def _while(self):
+        self._next()
+        self._expr()
+        self._expect('do')
+        self._scoped_block()
+        self._expect('end')
+
+    def _do(self):
+        self._next()
+        self._scoped_block()
+        self._expect('end')
+
+    def _for(self):
+        self._next()
+        bindings = [self._new_binding()]
+        if self._accept('='):
+            self._expr()
+            self._expect(',')
+            self._expr()
+            if self._accept(','):
+                self._expr()
+        else:
+            while self._accept(','):
+                bindings.append(self._new_binding())
+            self._expect('in')
+            self._expr_list()
+        self._expect('do')
+        self.scopes.append({})
+        for binding in bindings:
+            self._bind(binding)
+        self._block()
+        self.scopes.pop()
+        self._expect('end')
+
+    def _repeat(self):
+        self._next()
+        # The condition can see the body's locals
+        self.scopes.append({})
+        self._block()
+        self._expect('until')
+        self._expr()
+        self.scopes.pop()
+
+    def _function_statement(self):
+        self._next()
+        token = self._expect_name()
+        path = token.value if self._reference(token) and token.value in self.watch else None
+        method = False
+        while self._check('.') or self._check(':'):
+            method = self._next().value == ':'
+            field = self._expect_name().value
+            if path is not None and '.' not in path:
+                self.assigned.add(f'{path}.{field}')
+            path = None
+            if method:
+                break
+        if path is not None:
+            self.assigned.add(path)
+        self._function_body(method)
+
+    def _local(self):
+        self._next()
+        if self._accept('function'):
+            # Declared before the body so the function can recurse
+            binding = self._new_binding()
+            self._bind(binding)
+            self._function_body(False)
+            return
+
+        bindings = []
+        while True:
+            bindings.append(self._new_binding())
+            if not self._accept(','):
+                break
+        if self._accept('='):
+            self._expr_list()
+        # Values are evaluated before the new locals come into scope
+        for binding in bindings:
+            self._bind(binding)
+
+    _statement_handlers = {
+        'if': _if,
+        'while': _while,
+        'do': _do,
+        'for': _for,
+        'repeat': _repeat,
+        'function': _function_statement,
+        'local': _local,
+    }
+
+    def _function_body(self, is_method):
+        self.scopes.append({})
+        if is_method:
+            # 'self' is bound implicitly and keeps its name
+            self.scopes[-1]['self'] = -1
+        self._expect('(')
+        is_vararg = False
+        if not self._check(')'):
+            while True:
+                if self._accept('...'):
+                    is_vararg = True
+                    break
+                self._bind(self._new_binding())
+                if not self._accept(','):
+                    break
+        self._expect(')')
+        outer, self.vararg = self.vararg, is_vararg
+        self._block()
+        self.vararg = outer
+        self._expect('end')
+        self.scopes.pop()
+
+    def _expression_statement(self):
+        path, is_call = self._suffixed_expr()
+        if self._check('=') or self._check(','):
+            if path is not None:
+                self.assigned.add(path)
+            while self._accept(','):
+                path, _ = self._suffixed_expr()
+                if path is not None:
+                    self.assigned.add(path)
+            self._expect('=')
+            self._expr_list()
+        elif not is_call:
+            self._error("syntax error")
+
+    # -- expressions ------------------------------------------------------
+
+    def _expr_list(self):
+        self._expr()
+        while self._accept(','):
+            self._expr()
+
+    def _is_unary(self, token):
+        if token is None:
+            return False
+        if token.kind == KEYWORD:
+            return token.value == 'not'
+        return token.kind == OP and token.value in _UNARY_OPS
+
+    def _is_binary(self, token):
+        if token is None:
+            return False
+        if token.kind == KEYWORD:
+            return token.value in ('and', 'or')
+        return token.kind == OP and token.value in _BINARY_OPS
+
+    def _expr(self):
+        while self._is_unary(self._peek()):
+            self._next()
+        self._simple_expr()
+        while self._is_binary(self._peek()):
+            self._next()
+            while self._is_unary(self._peek()):
+                self._next()
+            self._simple_expr()
+
+    def _simple_expr(self):
+        token = self._peek()
+        if token is None:
+            self._error("unexpected symbol")
+        if token.kind == OP and token.value == '...' and not self.vararg:
+            self._error("cannot use '...' outside a vararg function")
+        if token.kind in (NUMBER, STRING) or (token.kind == KEYWORD and token.value in ('nil', 'true', 'false')) \
+                or (token.kind == OP and token.value == '...'):
+            self._next()
+        elif token.kind == OP and token.value == '{':
+            self._table()
+        elif token.kind == KEYWORD and token.value == 'function':
+            self._next()
+            self._function_body(False)
+        else:
+            self._suffixed_expr()
+
+    def _primary_expr(self):
+        """Returns the name when it is a watched global, else None"""
+        token = self._peek()
+        if token is not None and token.kind == NAME:
+            self._next()
+            if self._reference(token) and token.value in self.watch:
+                return token.value
+            return None
+        if self._accept('('):
+            self._expr()
+            self._expect(')')
+            return None
+        self._error("unexpected symbol")
+
+    def _suffixed_expr(self):
+        """
+        Returns (path, is_call): path is the watched global or global field
+        the whole expression names, if any
+        """
+        start = self.index
+        path = self._primary_expr()
+        is_call = False
+        while True:
+            token = self._peek()
+            if token is None:
+                return path, is_call
+            if token.kind == OP and token.value == '.':
+                self._next()
+                field = self._expect_name().value
+                path = f'{path}.{field}' if path is not None and '.' not in path else None
+                is_call = False
+            elif token.kind == OP and token.value == '[':
+                self._next()
+                self._expr()
+                self._expect(']')
+                path = None
+                is_call = False
+            elif token.kind == OP and token.value == ':':
+                self._next()
+                self._expect_name()
+                self._call_args()
+                path = None
+                is_call = True
+            elif token.kind == STRING or (token.kind == OP and token.value in ('(', '{')):
+                if path is not None:
+                    self.call_sites.append((start, self.index, path))
+                self._call_args()
+                path = None
+                is_call = True
+            else:
+                return path, is_call
+
+    def _call_args(self):
+        token = self._peek()
+        if token is not None and token.kind == STRING:
+            self._next()
+        elif self._check('{'):
+            self._table()
+        else:
+            self._expect('(')
+            if not self._check(')'):
+                self._expr_list()
+            self._expect(')')
+
+    def _table(self):
+        self._expect('{')
+        while not self._check('}'):
+            if self._accept('['):
+                self._expr()
+                self._expect(']')
+                self._expect('=')
+                self._expr()
+            else:
+                token = self._peek()
+                follower = self._peek(1)
+                if token is not None and token.kind == NAME and follower is not None \
+                        and follower.kind == OP and follower.value == '=':
+                    # Field name, not a variable
+                    self._next()
+                    self._next()
+                self._expr()
+            if not (self._accept(',') or self._accept(';')):
+                break
+        self._expect('}')
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase, deferred
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class CachedResult(db.Model):
+    """Obfuscation output shared between worker processes"""
+    __tablename__ = 'cached_results'
+
+    key = db.Column(db.String(64), primary_key=True)
+    result = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class ObfuscationJob(db.Model):
+    """Queued obfuscation request processed by the background job workers"""
+    __tablename__ = 'obfuscation_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), default='queued', nullable=False, index=True)
+    level = db.Column(db.String(16), nullable=False)
+    options = db.Column(db.Text)
+    seed = db.Column(db.Text)
+    # Sources and results can be megabytes; load them only when needed
+    code = deferred(db.Column(db.Text, nullable=False))
+    result = deferred(db.Column(db.Text))
+    original_size = db.Column(db.Integer, nullable=False)
+    obfuscated_size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    current_pass = db.Column(db.String(32))
+    passes_done = db.Column(db.Integer, default=0, nullable=False)
+    passes_total = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    worker = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
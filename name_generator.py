@@ -0,0 +1,65 @@
+import math
+import random
+import string
+
+FIRST_CHARS = string.ascii_letters + '_'
+REST_CHARS = string.ascii_letters + string.digits + '_'
+
+
+class NameGenerator:
+    """
+    Deterministic, collision-free identifier generator
+
+    Names are produced by walking the space of all `length`-character Lua
+    identifiers with an affine permutation (index * step + offset) mod size.
+    Every index maps to a distinct name, so no lookup against previously
+    issued names is needed and each call is O(1). The step and offset are
+    drawn from `seed`, so the same seed always yields the same sequence.
+    With `grow`, the generator moves on to length + 1 once every name of the
+    current length is issued, so names come out shortest first.
+    """
+
+    def __init__(self, length=8, seed=None, reserved=(), grow=False):
+        self.reserved = reserved
+        self.grow = grow
+        self._rng = random.Random(seed)
+        self._start(length)
+
+    def _start(self, length):
+        self.length = length
+        self.size = len(FIRST_CHARS) * len(REST_CHARS) ** (length - 1)
+        self.index = 0
+        self.offset = self._rng.randrange(self.size)
+        step = self._rng.randrange(self.size // 3, self.size)
+        while math.gcd(step, self.size) != 1:
+            step += 1
+        self.step = step
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.next_name()
+
+    def next_name(self):
+        """Return the next unused identifier"""
+        while True:
+            if self.index >= self.size:
+                if self.grow:
+                    self._start(self.length + 1)
+                    continue
+                raise RuntimeError(f"Exhausted all {self.length}-character identifiers")
+            name = self._encode((self.index * self.step + self.offset) % self.size)
+            self.index += 1
+            if name not in self.reserved:
+                return name
+
+    def _encode(self, value):
+        chars = []
+        rest = len(REST_CHARS)
+        for _ in range(self.length - 1):
+            value, digit = divmod(value, rest)
+            chars.append(REST_CHARS[digit])
+        chars.append(FIRST_CHARS[value])
+        chars.reverse()
+        return ''.join(chars)
@@ -1,16 +1,52 @@
 import re
+import time
+import shutil
+import tempfile
 import random
+from bisect import bisect_left
+from contextlib import nullcontext
 import string
 import base64
 import logging
+from lua_lexer import (
+    tokenize, iter_tokens, emit, significant, needs_separator, decode_string, Token,
+    NAME, KEYWORD, NUMBER, STRING, COMMENT, OP, WHITESPACE, RAW, TRIVIA, LuaSyntaxError
+)
+from lua_ast import (
+    parse_chunk, LuaAstParser, LuaCodeGenerator, ParsedSource,
+    Local, LocalFunction, FunctionStat, Return, Name, Table, Function
+)
+from lua_stream import ScopeResolver
+from pipeline import PASSES, Pipeline
+from name_generator import NameGenerator
+from string_pool import StringPool
+from budget import checkpoint
+
+logger = logging.getLogger(__name__)
+
+def make_rng(seed=None):
+    """
+    Return a private random generator for one obfuscation call
+    Accepts an existing random.Random, a seed, or None for a fresh random seed
+    """
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
 
 class LuaObfuscator:
     """
     Lua Code Obfuscator v2.0
     Advanced obfuscation toolkit with multiple protection layers
+
+    An instance holds no mutable state: every call draws its randomness from
+    its own generator (built from the `seed` or `rng` argument), so a single
+    instance can be shared by a thread pool and the same seed always
+    reproduces the same output.
     """
     
-    VERSION = "2.0.0"
+    VERSION = "3.0.0"
+    LEVELS = ('basic', 'medium', 'advanced', 'extreme')
     
     def __init__(self):
         self.lua_keywords = {
@@ -26,265 +62,502 @@ class LuaObfuscator:
             'math', 'string', 'table', 'io', 'os', 'debug', 'coroutine'
         }
     
-    def generate_random_name(self, length=8):
+    def generate_random_name(self, length=8, rng=None):
         """Generate a random variable name"""
-        first_char = random.choice(string.ascii_letters + '_')
-        rest_chars = ''.join(random.choices(
-            string.ascii_letters + string.digits + '_', 
-            k=length-1
-        ))
-        return first_char + rest_chars
+        rng = make_rng(rng)
+        while True:
+            first_char = rng.choice(string.ascii_letters + '_')
+            rest_chars = ''.join(rng.choices(
+                string.ascii_letters + string.digits + '_', 
+                k=length-1
+            ))
+            # Short names can spell keywords such as 'do' or 'if'
+            if first_char + rest_chars not in self.lua_keywords:
+                return first_char + rest_chars
     
     def extract_variables(self, code):
         """Extract user-defined variables from Lua code"""
+        tokens = tokenize(code)
+        try:
+            chunk = parse_chunk(tokens)
+        except LuaSyntaxError:
+            return self._collect_variables(significant(tokens))
+        return {binding.name for binding in chunk.bindings if binding.renamable}
+    
+    def _collect_variables(self, tokens):
+        """Guess declared and assigned names when the source cannot be parsed"""
         variables = set()
         
-        # Find local variable declarations
-        local_pattern = r'\blocal\s+([a-zA-Z_][a-zA-Z0-9_]*)'
-        for match in re.finditer(local_pattern, code):
-            var_name = match.group(1)
-            if var_name not in self.lua_keywords and var_name not in self.lua_builtins:
-                variables.add(var_name)
-        
-        # Find function declarations
-        func_pattern = r'\bfunction\s+([a-zA-Z_][a-zA-Z0-9_]*)'
-        for match in re.finditer(func_pattern, code):
-            func_name = match.group(1)
-            if func_name not in self.lua_keywords and func_name not in self.lua_builtins:
-                variables.add(func_name)
-        
-        # Find assignment patterns (simple heuristic)
-        assign_pattern = r'\b([a-zA-Z_][a-zA-Z0-9_]*)\s*='
-        for match in re.finditer(assign_pattern, code):
-            var_name = match.group(1)
-            if var_name not in self.lua_keywords and var_name not in self.lua_builtins:
-                variables.add(var_name)
+        for i, token in enumerate(tokens):
+            # 'self' is bound implicitly by method definitions
+            if token.kind != NAME or token.value in self.lua_builtins or token.value == 'self':
+                continue
+            
+            prev = tokens[i - 1] if i > 0 else None
+            # Field names such as obj.field or obj:method are not variables
+            if prev is not None and prev.kind == OP and prev.value in ('.', ':'):
+                continue
+            
+            # Local declarations and function declarations
+            if prev is not None and prev.kind == KEYWORD and prev.value in ('local', 'function'):
+                variables.add(token.value)
+                continue
+            
+            # Assignment patterns (simple heuristic)
+            if i + 1 < len(tokens) and tokens[i + 1].kind == OP and tokens[i + 1].value == '=':
+                variables.add(token.value)
         
         return variables
     
-    def rename_variables(self, code):
+    def rename_variables(self, code, rng=None):
         """Rename user-defined variables to random names"""
-        variables = self.extract_variables(code)
+        tokens = tokenize(code)
+        return emit(self._rename_tokens(tokens, names=self._name_generator(tokens, rng=rng)))
+    
+    def _name_generator(self, tokens, chunk=None, rng=None, short=False, reserved=()):
+        """
+        Create the generator for every identifier introduced into one chunk
+        With `short`, names are issued shortest first (1 character, then 2, ...);
+        `reserved` adds names to avoid, such as the new names of globals
+        """
+        if chunk is not None:
+            # New names must not shadow globals used anywhere in the chunk
+            reserved = chunk.globals | self.lua_keywords | {'self'} | set(reserved)
+        else:
+            reserved = {token.value for token in tokens if token.kind == NAME} | self.lua_keywords | set(reserved)
+        seed = make_rng(rng).getrandbits(64)
+        if short:
+            return NameGenerator(length=1, seed=seed, reserved=reserved, grow=True)
+        return NameGenerator(seed=seed, reserved=reserved)
+    
+    def _rename_map(self, chunk, names=None):
+        """Assign a fresh name to every renamable local binding"""
+        if names is None:
+            names = self._name_generator(None, chunk)
+        bindings = [binding for binding in chunk.bindings if binding.renamable]
+        if names.grow:
+            rename_map = self._shortest_names(
+                [(binding, len(binding.positions), min(binding.positions), max(binding.positions))
+                 for binding in bindings],
+                names,
+            )
+        else:
+            rename_map = {binding: names.next_name() for binding in bindings}
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            # Building the mapping is the costly part on large files, so skip it outright
+            logger.debug('Renamed variables: %s', {b.name: n for b, n in rename_map.items()})
+        return rename_map
+    
+    def _shortest_names(self, spans, names):
+        """
+        Give the shortest names to the most referenced bindings, reusing a
+        name for bindings whose spans (declaration to last reference) do not
+        overlap. Scoping is lexical, so such bindings can never see each other.
+        `spans` holds (binding, reference count, start offset, end offset).
+        """
+        issued = []
+        taken = {}
         rename_map = {}
+        for binding, _, start, end in sorted(spans, key=lambda span: span[1], reverse=True):
+            checkpoint()
+            index = 0
+            while True:
+                if index == len(issued):
+                    issued.append(names.next_name())
+                starts, ends = taken.setdefault(issued[index], ([], []))
+                i = bisect_left(starts, start)
+                if not (i and ends[i - 1] >= start) and not (i < len(starts) and starts[i] <= end):
+                    starts.insert(i, start)
+                    ends.insert(i, end)
+                    rename_map[binding] = issued[index]
+                    break
+                index += 1
+        return rename_map
+    
+    def _rename_tokens(self, tokens, chunk=None, names=None, rename_map=None, global_names=None):
+        """
+        Rename local variables in a token stream, keeping its layout
+        Globals in `global_names` (name -> new name) are renamed as well,
+        which needs the parsed chunk to tell them from fields and keys
+        """
+        if chunk is None:
+            try:
+                chunk = parse_chunk(tokens)
+            except LuaSyntaxError as e:
+                logger.debug('Falling back to heuristic renaming: %s', e)
+                return self._rename_heuristic(tokens, names)
         
-        for var in variables:
-            new_name = self.generate_random_name()
-            # Ensure no collision with existing names
-            while new_name in rename_map.values() or new_name in self.lua_keywords:
-                new_name = self.generate_random_name()
-            rename_map[var] = new_name
+        if rename_map is None:
+            rename_map = self._rename_map(chunk, names)
+        new_names = {}
+        for binding, new_name in rename_map.items():
+            for pos in binding.positions:
+                new_names[pos] = new_name
+        if global_names:
+            renamed = frozenset(chunk.global_refs)
+            for token in tokens:
+                if token.kind == NAME and token.pos in renamed and token.value in global_names:
+                    new_names[token.pos] = global_names[token.value]
         
-        # Apply renaming
-        result = code
-        for old_name, new_name in rename_map.items():
-            # Use word boundaries to avoid partial replacements
-            pattern = r'\b' + re.escape(old_name) + r'\b'
-            result = re.sub(pattern, new_name, result)
+        # Apply renaming in a single pass over the identifiers
+        return [
+            token._replace(value=new_names[token.pos])
+            if token.kind == NAME and token.pos in new_names else token
+            for token in tokens
+        ]
+    
+    def _rename_heuristic(self, tokens, names=None):
+        """Rename every occurrence of guessed variable names"""
+        variables = self._collect_variables(significant(tokens))
+        if names is None:
+            names = self._name_generator(tokens)
+        rename_map = {var: names.next_name() for var in variables}
         
-        logging.debug(f"Renamed variables: {rename_map}")
-        return result
+        return [
+            token._replace(value=rename_map[token.value])
+            if token.kind == NAME and token.value in rename_map else token
+            for token in tokens
+        ]
     
-    def encode_strings(self, code):
+    def encode_strings(self, code, pooled=False, rng=None):
         """Encode string literals using base64"""
-        def encode_string_match(match):
-            quote = match.group(1)
-            content = match.group(2)
-            
-            # Encode the content (without quotes) to base64
-            encoded = base64.b64encode(content.encode('utf-8')).decode('ascii')
-            
-            # Return a Lua expression that decodes the string
-            return f'(function() local b64="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"; local function decode(data) local result = ""; local pad = string.len(data) % 4; if pad > 0 then data = data .. string.rep("=", 4 - pad) end; for i = 1, string.len(data), 4 do local a, b, c, d = string.byte(data, i, i + 3); a = string.find(b64, string.char(a)) - 1; b = string.find(b64, string.char(b)) - 1; c = string.find(b64, string.char(c)) - 1; d = string.find(b64, string.char(d)) - 1; result = result .. string.char(bit.bor(bit.lshift(a, 2), bit.rshift(b, 4))); if c ~= 64 then result = result .. string.char(bit.bor(bit.lshift(bit.band(b, 15), 4), bit.rshift(c, 2))) end; if d ~= 64 then result = result .. string.char(bit.bor(bit.lshift(bit.band(c, 3), 6), d)) end end; return result end; return decode("{encoded}") end)()'
+        tokens = tokenize(code)
+        if not pooled:
+            return emit(self._encode_string_tokens(tokens))
         
-        # Match both single and double quoted strings
-        string_pattern = r'(["\'])([^"\']*?)\1'
-        result = re.sub(string_pattern, encode_string_match, code)
+        pool = StringPool.from_names(self._name_generator(tokens, rng=rng))
+        body = emit(self._encode_string_tokens(tokens, pool))
+        return pool.prelude() + body
+    
+    def _string_expression(self, raw):
+        """Return a Lua expression that rebuilds a string literal at runtime"""
+        # Encode the decoded content to base64
+        encoded = base64.b64encode(decode_string(raw)).decode('ascii')
         
-        return result
+        return f'(function() local b64="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="; local function decode(data) local result = ""; local pad = string.len(data) % 4; if pad > 0 then data = data .. string.rep("=", 4 - pad) end; for i = 1, string.len(data), 4 do local a, b, c, d = string.byte(data, i, i + 3); a = string.find(b64, string.char(a)) - 1; b = string.find(b64, string.char(b)) - 1; c = string.find(b64, string.char(c)) - 1; d = string.find(b64, string.char(d)) - 1; result = result .. string.char(bit.bor(bit.lshift(a, 2), bit.rshift(b, 4))); if c ~= 64 then result = result .. string.char(bit.bor(bit.lshift(bit.band(b, 15), 4), bit.rshift(c, 2))) end; if d ~= 64 then result = result .. string.char(bit.bor(bit.lshift(bit.band(c, 3), 6), d)) end end; return result end; return decode("{encoded}") end)()'
+    
+    def _encode_string_tokens(self, tokens, pool=None):
+        """Replace string literal tokens with base64 decoder expressions (a generator)"""
+        encode = pool.reference if pool is not None else self._string_expression
+        prev = None
+        last = None  # the token just before, trivia included
+        
+        for token in tokens:
+            if token.kind == STRING:
+                expr = encode(token.value)
+                # A string passed as a call argument (f"x") needs explicit parentheses
+                if self._is_call_prefix(prev):
+                    expr = f'({expr})'
+                # A pooled accessor is a name: return"x" must not become returnP(1)
+                elif last is not None and needs_separator(last.value, expr):
+                    expr = f' {expr}'
+                token = token._replace(kind=RAW, value=expr)
+            
+            if token.kind not in TRIVIA:
+                prev = token
+            last = token
+            yield token
+    
+    def _is_call_prefix(self, token):
+        """Check whether a token can end an expression that is being called"""
+        if token is None:
+            return False
+        if token.kind in (NAME, STRING, RAW):
+            return True
+        return token.kind == OP and token.value in (')', ']', '}')
     
     def remove_comments(self, code):
         """Remove all comments from Lua code"""
-        # Remove single-line comments (but preserve strings)
-        lines = code.split('\n')
-        result_lines = []
+        return emit(self._strip_comments(tokenize(code)))
+    
+    def _strip_comments(self, tokens):
+        """Drop comment tokens and the trailing whitespace before them (a generator)"""
+        held = None  # whitespace that a following comment may make redundant
+        prev = None
+        dropped = False
         
-        for line in lines:
-            # Simple approach: find -- that's not inside a string
-            in_string = False
-            quote_char = None
-            comment_pos = -1
-            
-            for i, char in enumerate(line):
-                if not in_string and char in ['"', "'"]:
-                    in_string = True
-                    quote_char = char
-                elif in_string and char == quote_char:
-                    in_string = False
-                    quote_char = None
-                elif not in_string and char == '-' and i + 1 < len(line) and line[i + 1] == '-':
-                    comment_pos = i
-                    break
+        for token in tokens:
+            if token.kind == COMMENT:
+                # Trim whitespace that only separated code from the comment
+                if held is not None and '\n' in held.value:
+                    yield held
+                    prev = held
+                held = None
+                dropped = True
+                continue
             
-            if comment_pos >= 0:
-                line = line[:comment_pos].rstrip()
+            if held is not None:
+                yield held
+                prev = held
+                held = None
+            if token.kind == WHITESPACE:
+                held = token
+                dropped = False
+                continue
             
-            result_lines.append(line)
-        
-        # Remove multi-line comments --[[ ]]
-        result = '\n'.join(result_lines)
-        multiline_comment_pattern = r'--\[\[.*?\]\]'
-        result = re.sub(multiline_comment_pattern, '', result, flags=re.DOTALL)
+            if dropped and prev is not None and prev.kind != WHITESPACE:
+                # Keep tokens that the comment separated from merging
+                if needs_separator(prev.value, token.value):
+                    yield Token(WHITESPACE, ' ', token.pos, token.line)
+            dropped = False
+            yield token
+            prev = token
         
-        return result
+        if held is not None:
+            yield held
     
-    def minify_code(self, code):
-        """Remove unnecessary whitespace"""
-        # Remove leading/trailing whitespace from lines
-        lines = [line.strip() for line in code.split('\n')]
-        
-        # Remove empty lines
-        lines = [line for line in lines if line]
+    def minify_code(self, code, short_names=False, rng=None):
+        """
+        Remove unnecessary whitespace
+        With `short_names`, locals are also renamed, the most referenced
+        ones getting the shortest names
+        """
+        tokens = tokenize(code)
+        if short_names:
+            try:
+                chunk = parse_chunk(tokens)
+            except LuaSyntaxError as e:
+                logger.debug('Keeping names, code does not parse: %s', e)
+            else:
+                names = self._name_generator(tokens, chunk, rng, short=True)
+                tokens = self._rename_tokens(tokens, chunk, names)
+        return emit(self._minify_tokens(tokens))
+    
+    def _minify_tokens(self, tokens):
+        """Drop whitespace and comments, keeping only required separators (a generator)"""
+        prev = None
         
-        # Join with minimal spacing
-        result = ' '.join(lines)
+        for token in tokens:
+            if token.kind in TRIVIA:
+                continue
+            if prev is not None and needs_separator(prev.value, token.value):
+                yield Token(WHITESPACE, ' ', token.pos, token.line)
+            yield token
+            prev = token
+    
+    # Openers of the dummy conditional blocks added by control flow obfuscation
+    DUMMY_CONDITIONS = ('if true then', 'if 1 == 1 then', 'if math.random() or true then')
+    
+    def obfuscate_control_flow(self, code, rng=None):
+        """Add dummy control flow statements to confuse analysis"""
+        rng = make_rng(rng)
         
-        # Clean up extra spaces around operators and keywords
-        result = re.sub(r'\s+', ' ', result)
-        result = re.sub(r'\s*([=+\-*/(){}[\],;])\s*', r'\1', result)
+        try:
+            tokens = significant(tokenize(code))
+            parser = LuaAstParser(tokens)
+            parser.parse()
+        except LuaSyntaxError:
+            # Leave code the passes before us could not keep parseable as it is
+            return code
         
-        return result
+        # Dummy blocks go after top-level statements, never inside an
+        # expression, a table or a long string, and never after 'return'
+        result = []
+        offset = 0
+        for stat, index in parser.statement_ends:
+            if isinstance(stat, Return) or rng.random() >= 0.1:  # 10% chance
+                continue
+            if index < len(tokens) and tokens[index].value == ';':
+                index += 1
+            last = tokens[index - 1]
+            pos = last.pos + len(last.value)
+            dummy = rng.choice(self.DUMMY_CONDITIONS)
+            result.append(code[offset:pos])
+            result.append(f' {dummy} local _ = {rng.randint(1, 100)} end ')
+            offset = pos
+        result.append(code[offset:])
+        return ''.join(result)
     
-    def obfuscate_control_flow(self, code):
-        """Add dummy control flow statements to confuse analysis"""
-        # Add some dummy conditional blocks
-        dummy_conditions = [
-            'if true then',
-            'if 1 == 1 then', 
-            'if math.random() or true then'
-        ]
+    def obfuscate_with_metatables(self, code, rng=None):
+        """
+        Add a metatable layer: a lazily resolved global environment plus
+        proxies around values that are not used on hot paths
+
+        Runtime overhead target: globals cost one _G lookup on first use and
+        a plain table read afterwards, so global-heavy loops stay within 5%
+        of the original and setup is constant time (benchmarks/bench_env.py)
+        """
+        rng = make_rng(rng)
+        metatable_setup, meta_var, proxy_var, env_var, tag_var = self._metatable_prelude(rng)
         
-        lines = code.split('\n')
-        result_lines = []
+        try:
+            tokens = significant(tokenize(code))
+            parser = LuaAstParser(tokens)
+            parser.parse()
+        except LuaSyntaxError:
+            # Leave code the passes before us could not keep parseable as it is
+            return metatable_setup + '\n' + code
+        usage = self._name_usage(tokens)
         
-        for i, line in enumerate(lines):
-            result_lines.append(line)
-            
-            # Randomly insert dummy conditions
-            if random.random() < 0.1 and line.strip():  # 10% chance
-                dummy = random.choice(dummy_conditions)
-                result_lines.append(f'  {dummy}')
-                # Add some dummy operations
-                result_lines.append(f'    local _ = {random.randint(1, 100)}')
-                result_lines.append('  end')
+        # Insert proxies and dummy operations after top-level statements
+        insertions = []
+        for stat, index in parser.statement_ends:
+            if isinstance(stat, Return):
+                continue
+            statements = []
+            name = self._proxy_candidate(stat, tokens, usage)
+            if name is not None and (not isinstance(stat, Local) or rng.random() < 0.3):
+                statements.append(f"{name} = {proxy_var}({name})")
+            if rng.random() < 0.05:
+                # Allocation-free, so they cost nothing measurable even at top level
+                statements.append(rng.choice([
+                    f"getmetatable({env_var})",
+                    f"rawget({meta_var}, \"__index\")",
+                    f"rawequal({env_var}, {tag_var})",
+                ]))
+            if statements:
+                if index < len(tokens) and tokens[index].value == ';':
+                    index += 1
+                last = tokens[index - 1]
+                insertions.append((last.pos + len(last.value), statements))
         
-        return '\n'.join(result_lines)
+        result = [metatable_setup, '\n']
+        offset = 0
+        for pos, statements in insertions:
+            result.append(code[offset:pos])
+            # Terminated, so a following '(' cannot continue the call
+            result.append(''.join(f' {statement};' for statement in statements))
+            offset = pos
+        result.append(code[offset:])
+        return ''.join(result)
     
-    def obfuscate_with_metatables(self, code):
-        """Add metatable obfuscation to make code behavior unpredictable"""
-        
+    def _metatable_prelude(self, rng):
+        """Return (setup code, meta, proxy, env, tag variable names) of the metatable layer"""
         # Generate random metatable names
-        meta_var = self.generate_random_name(6)
-        proxy_var = self.generate_random_name(6)
-        env_var = self.generate_random_name(6)
+        meta_var = self.generate_random_name(6, rng=rng)
+        proxy_var = self.generate_random_name(6, rng=rng)
+        env_var = self.generate_random_name(6, rng=rng)
+        globals_var = self.generate_random_name(6, rng=rng)
+        tag_var = self.generate_random_name(6, rng=rng)
         
         # Create metatable setup prefix
         metatable_setup = f"""
 -- Metatable obfuscation layer
+-- Overhead target: <5% on global-heavy loops, constant-time setup.
+-- Globals are resolved from _G on first read and cached in the environment.
+local {globals_var} = _G
 local {meta_var} = {{}}
 {meta_var}.__index = function(t, k)
-    if type(k) == "string" and string.len(k) > 0 then
-        return rawget(t, k) or rawget(_G, k)
-    end
-    return nil
-end
-{meta_var}.__newindex = function(t, k, v)
-    if type(k) == "string" then
+    local v = {globals_var}[k]
+    if v ~= nil then
         rawset(t, k, v)
     end
+    return v
 end
-{meta_var}.__call = function(t, ...)
-    local args = {{...}}
-    if #args > 0 and type(args[1]) == "function" then
-        return args[1](select(2, ...))
-    end
-    return t
-end
-{meta_var}.__tostring = function(t)
-    return tostring(rawget(t, "_value") or t)
-end
-
--- Create proxy environment
 local {env_var} = setmetatable({{}}, {meta_var})
-for k, v in pairs(_G) do
-    {env_var}[k] = v
-end
+local {tag_var} = {{}}
 
--- Proxy table wrapper
+-- Proxies are only applied to values never used inside loops or functions
 local function {proxy_var}(obj)
-    if type(obj) == "table" then
-        return setmetatable(obj, {meta_var})
-    elseif type(obj) == "function" then
-        local wrapper = setmetatable({{_value = obj}}, {meta_var})
-        wrapper.__call = function(self, ...)
-            return self._value(...)
+    local kind = type(obj)
+    if kind == "function" then
+        return function(...)
+            return obj(...)
         end
-        return wrapper
-    else
-        return setmetatable({{_value = obj}}, {meta_var})
+    elseif kind == "table" and getmetatable(obj) == nil then
+        return setmetatable(obj, {tag_var})
     end
+    return obj
 end
 
 -- Install environment
 setfenv(1, {env_var})
 """
-        
-        # Add metatable wrapping for function calls and variable assignments
-        lines = code.split('\n')
-        result_lines = [metatable_setup]
-        
-        for line in lines:
-            original_line = line
-            
-            # Wrap function declarations with metatable
-            if re.search(r'\bfunction\s+([a-zA-Z_][a-zA-Z0-9_]*)', line):
-                # Keep original function definition
-                result_lines.append(original_line)
-                # Add metatable wrapper
-                func_match = re.search(r'\bfunction\s+([a-zA-Z_][a-zA-Z0-9_]*)', line)
-                if func_match:
-                    func_name = func_match.group(1)
-                    if func_name not in self.lua_keywords and func_name not in self.lua_builtins:
-                        result_lines.append(f"{func_name} = {proxy_var}({func_name})")
-                continue
-            
-            # Wrap local variable assignments with random chance
-            if re.search(r'\blocal\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*=', line) and random.random() < 0.3:
-                var_match = re.search(r'\blocal\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*(.+)', line)
-                if var_match:
-                    var_name = var_match.group(1)
-                    var_value = var_match.group(2)
-                    if var_name not in self.lua_keywords and var_name not in self.lua_builtins:
-                        result_lines.append(f"local {var_name} = {proxy_var}({var_value})")
+        return metatable_setup, meta_var, proxy_var, env_var, tag_var
+    
+    def _name_usage(self, tokens):
+        """
+        Classify name tokens by position: 'hot' inside a loop or function
+        body, 'declared' by a function statement and 'called' when directly
+        followed by call arguments
+        """
+        hot = set()
+        declarations = set()
+        calls = set()
+        stack = []
+        depth = 0
+        pending_do = 0
+        previous = None
+        for token in tokens:
+            if token.kind == KEYWORD:
+                value = token.value
+                if value in ('while', 'for'):
+                    stack.append(True)
+                    pending_do += 1
+                elif value == 'do':
+                    if pending_do:
+                        pending_do -= 1
+                        previous = token
                         continue
-            
-            # Add dummy metatable operations randomly
-            if random.random() < 0.05 and line.strip():
-                dummy_ops = [
-                    f"local _ = {proxy_var}({{}})",
-                    f"local _ = setmetatable({{}}, {meta_var})",
-                    f"getmetatable({{}})"
-                ]
-                result_lines.append(random.choice(dummy_ops))
-            
-            result_lines.append(original_line)
-        
-        return '\n'.join(result_lines)
+                    stack.append(False)
+                elif value in ('repeat', 'function'):
+                    stack.append(True)
+                elif value == 'if':
+                    stack.append(False)
+                elif value in ('end', 'until') and stack:
+                    stack.pop()
+                depth = stack.count(True)
+            elif token.kind == NAME:
+                if previous is not None and previous.kind == KEYWORD and previous.value == 'function':
+                    declarations.add(token.pos)
+                elif depth:
+                    hot.add(token.pos)
+            elif previous is not None and previous.kind == NAME \
+                    and (token.kind == STRING or token.value in ('(', '{')):
+                calls.add(previous.pos)
+            previous = token
+        return {'hot': hot, 'declared': declarations, 'called': calls}
+    
+    def _proxy_candidate(self, stat, tokens, usage):
+        """
+        Name declared by a top-level statement that can be proxied cheaply,
+        or None. Functions qualify when they are only called directly, and
+        never from a loop or another function.
+        """
+        if isinstance(stat, LocalFunction):
+            binding = stat.target
+        elif isinstance(stat, FunctionStat) and stat.method is None and isinstance(stat.target, Name):
+            binding = stat.target.binding
+            if binding is None:
+                # Global function: every use in this chunk must be cold
+                name = stat.target.name
+                references = [token.pos for i, token in enumerate(tokens)
+                              if token.kind == NAME and token.value == name
+                              and not (i and tokens[i - 1].value in ('.', ':'))
+                              and token.pos not in usage['declared']]
+                if name in self.lua_builtins or not self._cold_calls(references, usage):
+                    return None
+                return name
+        elif isinstance(stat, Local) and len(stat.targets) == 1 \
+                and len(stat.values) == 1 and isinstance(stat.values[0], (Table, Function)):
+            binding = stat.targets[0]
+            if isinstance(stat.values[0], Table):
+                # Tables only gain an empty metatable, which field access never consults
+                return binding.name
+        else:
+            return None
+        references = [pos for pos in binding.positions if pos not in usage['declared']]
+        if not self._cold_calls(references[1:] if isinstance(stat, Local) else references, usage):
+            return None
+        return binding.name
     
-    def obfuscate_function_calls(self, code):
-        """Obfuscate function calls using indirect invocation"""
+    def _cold_calls(self, references, usage):
+        return all(pos in usage['called'] and pos not in usage['hot'] for pos in references)
+    
+    def obfuscate_function_calls(self, code, rng=None, dispatch=True):
+        """
+        Obfuscate function calls using indirect invocation
+        With `dispatch`, calls go through a dispatch table built once at load
+        time and allocate nothing; otherwise through the `invoke` helper,
+        which packs and unpacks the arguments of every call
+        """
+        rng = make_rng(rng)
+        if dispatch:
+            return self._dispatch_function_calls(code, rng)
         
         # Generate random function invoker
-        invoker_var = self.generate_random_name(8)
+        invoker_var = self.generate_random_name(8, rng=rng)
         
         # Create function call indirection setup
         indirection_setup = f"""
@@ -312,10 +585,11 @@ end
         result_lines = [indirection_setup]
         
         for line in lines:
+            checkpoint()
             original_line = line
             
             # Obfuscate common function calls with random chance
-            if random.random() < 0.2:  # 20% chance
+            if rng.random() < 0.2:  # 20% chance
                 # Replace print calls
                 if 'print(' in line:
                     line = re.sub(r'\bprint\(', f'{invoker_var}.invoke("print", ', line)
@@ -332,141 +606,480 @@ end
         
         return '\n'.join(result_lines)
     
-    def add_fake_functions(self, code):
-        """Add fake/dummy functions to confuse reverse engineering"""
+    # Library tables whose functions may be called through the dispatch table
+    DISPATCH_LIBRARIES = ('string', 'table', 'math')
+    
+    def _dispatch_function_calls(self, code, rng):
+        """
+        Route calls to print and library functions through a dispatch table
+        
+        Each call site becomes `D[k](...)`: one table read, with the arguments
+        passed straight through. Functions are looked up once when the chunk
+        loads, so names the script assigns or shadows are left alone.
+        """
+        tokens = tokenize(code)
+        sig = significant(tokens)
+        try:
+            chunk = parse_chunk(sig)
+        except LuaSyntaxError:
+            return code
+        local_positions = {pos for binding in chunk.bindings for pos in binding.positions}
+        
+        def is_global(i):
+            token = sig[i]
+            if token.kind != NAME or token.pos in local_positions:
+                return False
+            return not (i and sig[i - 1].kind == OP and sig[i - 1].value in ('.', ':'))
+        
+        def is_call(i):
+            return i < len(sig) and (sig[i].kind == STRING or sig[i].value in ('(', '{'))
+        
+        # (first token index, past-the-end index, function path) of each call site
+        sites = []
+        assigned = set()
+        for i, token in enumerate(sig):
+            if token.value not in ('print',) + self.DISPATCH_LIBRARIES or not is_global(i):
+                continue
+            path = token.value
+            end = i + 1
+            if path != 'print' and end + 1 < len(sig) and sig[end].value == '.' and sig[end + 1].kind == NAME:
+                path = f'{path}.{sig[end + 1].value}'
+                end += 2
+            defined = i and sig[i - 1].kind == KEYWORD and sig[i - 1].value == 'function'
+            if defined or (end < len(sig) and sig[end].value in ('=', ',')):
+                # Assigned or redefined somewhere, so the load-time value could go stale
+                assigned.add(path)
+            elif '.' in path or path == 'print':
+                if is_call(end):
+                    sites.append((i, end, path))
+        
+        sites = [site for site in sites if site[2] not in assigned and site[2].split('.')[0] not in assigned]
+        if not sites:
+            return code
+        
+        slots = self._dispatch_slots({path for _, _, path in sites}, rng)
+        # Reserve every name in the chunk: the table is declared above all of its scopes
+        table_var = self._name_generator(sig, rng=rng).next_name()
+        
+        replaced = {}
+        for start, end, path in sites:
+            replaced[id(sig[start])] = f'{table_var}[{slots[path]}]'
+            for token in sig[start + 1:end]:
+                replaced[id(token)] = ''
         
+        result = []
+        skipping = False
+        for token in tokens:
+            value = replaced.get(id(token))
+            if value is not None:
+                skipping = value == ''
+                if not skipping:
+                    result.append(token._replace(kind=RAW, value=value))
+                continue
+            if skipping and token.kind in TRIVIA:
+                # Whitespace or comments inside a dotted name that was replaced
+                continue
+            skipping = False
+            result.append(token)
+        
+        return self._dispatch_setup(table_var, slots) + emit(result)
+    
+    def _dispatch_slots(self, paths, rng):
+        """Assign dispatch table slots to function paths in a shuffled order"""
+        paths = sorted(paths)
+        rng.shuffle(paths)
+        return {path: index + 1 for index, path in enumerate(paths)}
+    
+    def _dispatch_setup(self, table_var, slots):
+        """Return the declaration of the dispatch table"""
+        return f"""
+-- Function call obfuscation layer
+local {table_var} = {{{', '.join(sorted(slots, key=slots.get))}}}
+
+"""
+    
+    def add_fake_functions(self, code, rng=None):
+        """Add fake/dummy functions to confuse reverse engineering"""
+        return self._fake_functions(make_rng(rng)) + code
+    
+    def _fake_functions(self, rng):
+        """Return the fake functions placed before the real code"""
         fake_functions = []
-        for i in range(random.randint(3, 7)):
-            func_name = self.generate_random_name(8)
-            params = [self.generate_random_name(3) for _ in range(random.randint(1, 3))]
+        for i in range(rng.randint(3, 7)):
+            func_name = self.generate_random_name(8, rng=rng)
+            params = [self.generate_random_name(3, rng=rng) for _ in range(rng.randint(1, 3))]
             
             fake_body = []
-            for j in range(random.randint(2, 5)):
+            for j in range(rng.randint(2, 5)):
                 operations = [
-                    f"local {self.generate_random_name(4)} = {random.randint(1, 1000)}",
-                    f"if {random.choice(['true', 'false', '1 == 1', 'nil == nil'])} then end",
-                    f"for {self.generate_random_name(2)} = 1, {random.randint(1, 10)} do end",
-                    f"local {self.generate_random_name(4)} = math.random()",
+                    f"local {self.generate_random_name(4, rng=rng)} = {rng.randint(1, 1000)}",
+                    f"if {rng.choice(['true', 'false', '1 == 1', 'nil == nil'])} then end",
+                    f"for {self.generate_random_name(2, rng=rng)} = 1, {rng.randint(1, 10)} do end",
+                    f"local {self.generate_random_name(4, rng=rng)} = math.random()",
                 ]
-                fake_body.append(f"    {random.choice(operations)}")
+                fake_body.append(f"    {rng.choice(operations)}")
             
             fake_func = f"""
 local function {func_name}({', '.join(params)})
 {chr(10).join(fake_body)}
-    return {random.choice(params + ['nil', 'true', 'false'])}
+    return {rng.choice(params + ['nil', 'true', 'false'])}
 end
 """
             fake_functions.append(fake_func)
         
-        # Insert fake functions at the beginning
-        fake_code = '\n'.join(fake_functions) + '\n-- Real code starts here\n' + code
-        return fake_code
+        return '\n'.join(fake_functions) + '\n-- Real code starts here\n'
     
-    def obfuscate_numbers(self, code):
+    def obfuscate_numbers(self, code, rng=None):
         """Obfuscate numeric literals using mathematical expressions"""
-        
-        def replace_number(match):
-            num = int(match.group(0))
-            if num == 0:
-                return random.choice(['(1-1)', '(0*5)', '(2-2)'])
-            elif num == 1:
-                return random.choice(['(2-1)', '(3-2)', '(5-4)'])
-            elif num > 1 and num < 100:
-                # Create mathematical expression
-                base = random.randint(1, 10)
-                if num > base:
-                    return f'({base}+{num-base})'
-                elif num < base:
-                    return f'({base}-{base-num})'
-                else:
-                    return f'({base}*1)'
-            return str(num)
-        
-        # Replace standalone numbers (not in strings or comments)
-        result = re.sub(r'\b\d+\b', replace_number, code)
-        return result
+        return emit(self._obfuscate_number_tokens(tokenize(code), make_rng(rng)))
     
-    def extreme_obfuscation(self, code, options=None):
-        """Apply extreme obfuscation techniques for maximum protection"""
-        if options is None:
-            options = {
-                'rename_variables': True,
-                'remove_comments': True,
-                'encode_strings': True,
-                'minify': True,
-                'obfuscate_control_flow': True,
-                'obfuscate_metatables': True,
-                'obfuscate_function_calls': True,
-                'add_fake_functions': True,
-                'obfuscate_numbers': True
-            }
-        
-        result = self.advanced_obfuscation(code, options)
-        
-        if options.get('add_fake_functions', True):
-            result = self.add_fake_functions(result)
-            
-        if options.get('obfuscate_function_calls', True):
-            result = self.obfuscate_function_calls(result)
+    def _number_expression(self, raw, rng):
+        """Return an arithmetic expression equal to an integer literal, or None"""
+        if not raw.isdigit():
+            return None
+        num = int(raw)
+        if num == 0:
+            return rng.choice(['(1-1)', '(0*5)', '(2-2)'])
+        elif num == 1:
+            return rng.choice(['(2-1)', '(3-2)', '(5-4)'])
+        elif num > 1 and num < 100:
+            # Create mathematical expression
+            base = rng.randint(1, 10)
+            if num > base:
+                return f'({base}+{num-base})'
+            elif num < base:
+                return f'({base}-{base-num})'
+            else:
+                return f'({base}*1)'
+        return None
+    
+    def _obfuscate_number_tokens(self, tokens, rng):
+        """Replace integer literal tokens with equivalent expressions (a generator)"""
+        for token in tokens:
+            if token.kind == NUMBER:
+                expr = self._number_expression(token.value, rng)
+                if expr is not None:
+                    token = token._replace(kind=RAW, value=expr)
+            yield token
+    
+    def _source_passes(self, code, options, rng, strings=False, numbers=False, minify=False, timings=None):
+        """
+        Apply the source-level rewrites (comments, renaming, strings, numbers,
+        minification) after lexing and parsing the input once
+        `code` may be a ParsedSource from validation, which is used as is
+        """
+        # Phases are reported as 'source.<phase>'; when the AST is available
+        # renaming, literals and minification are one fused 'generate' walk
+        measure = (lambda phase: timings.measure(f'source.{phase}')) if timings is not None \
+            else (lambda phase: nullcontext())
+        
+        if isinstance(code, ParsedSource):
+            tokens, chunk = code.tokens, code.chunk
+        else:
+            with measure('tokenize'):
+                tokens = tokenize(code)
             
-        if options.get('obfuscate_numbers', True):
-            result = self.obfuscate_numbers(result)
+            chunk = None
+            with measure('parse'):
+                try:
+                    chunk = parse_chunk(tokens)
+                except LuaSyntaxError as e:
+                    logger.debug('AST unavailable, using token passes: %s', e)
         
-        return result
+        names = self._name_generator(tokens, chunk, rng, short=options.get('short_names', False),
+                                     reserved=options.get('global_names', {}).values())
+        pool = None
+        if strings and options.get('string_pool', True):
+            pool = StringPool.from_names(names)
+        
+        body = self._rewrite_source(tokens, chunk, options, rng, names, None, pool,
+                                    strings, numbers, minify, measure)
+        if pool is not None:
+            return pool.prelude() + body
+        return body
     
-    def basic_obfuscation(self, code, options=None):
-        """Apply basic obfuscation techniques"""
-        if options is None:
-            options = {'rename_variables': True, 'remove_comments': True}
+    def _rewrite_source(self, tokens, chunk, options, rng, names, rename_map, pool,
+                        strings, numbers, minify, measure):
+        """
+        Rewrite one lexed (and, if `chunk` is not None, parsed) source and
+        return the text; shared by _source_passes and incremental mode
+        A `rename_map` of binding -> name is used as is instead of drawing
+        names from `names`; options['global_names'] maps globals shared with
+        other files of a project to their new names
+        """
+        rename = options.get('rename_variables', True)
+        global_names = options.get('global_names') if rename else None
+        string_hook = pool.reference if pool is not None else self._string_expression
         
-        result = code
+        if chunk is not None and minify:
+            # One tree walk renames, rewrites literals and prints compact code
+            with measure('generate'):
+                if rename and rename_map is None:
+                    rename_map = self._rename_map(chunk, names)
+                generator = LuaCodeGenerator(
+                    compact=True,
+                    names=rename_map if rename else None,
+                    globals=global_names,
+                    number_hook=(lambda raw: self._number_expression(raw, rng)) if numbers else None,
+                    string_hook=string_hook if strings else None,
+                )
+                return generator.generate(chunk)
         
         if options.get('remove_comments', True):
-            result = self.remove_comments(result)
+            with measure('remove_comments'):
+                tokens = list(self._strip_comments(tokens))
+        
+        if rename:
+            with measure('rename_variables'):
+                tokens = self._rename_tokens(tokens, chunk, names, rename_map, global_names)
+            
+        if strings:
+            with measure('encode_strings'):
+                tokens = list(self._encode_string_tokens(tokens, pool))
         
-        if options.get('rename_variables', True):
-            result = self.rename_variables(result)
+        if numbers:
+            with measure('obfuscate_numbers'):
+                tokens = list(self._obfuscate_number_tokens(tokens, rng))
         
-        return result
+        if minify:
+            with measure('minify'):
+                tokens = list(self._minify_tokens(tokens))
+        
+        with measure('emit'):
+            return emit(tokens)
     
-    def medium_obfuscation(self, code, options=None):
+    def obfuscate(self, code, level='basic', options=None, seed=None, progress=None, timings=None):
+        """
+        Apply the obfuscation level named by `level` to source text or to a
+        ParsedSource returned by LuaParser.parse_source()
+        `progress`, if given, is called as progress(pass_name, index, total)
+        before each pass runs; `timings`, if given, is a metrics.PassTimings
+        that receives the time and sizes of every pass
+        """
+        if level not in self.LEVELS:
+            raise ValueError(f"Unknown obfuscation level: {level}")
+        return getattr(self, f'{level}_obfuscation')(code, options, seed, progress, timings)
+    
+    def run_pipeline(self, code, pipeline, options=None, seed=None, progress=None, timings=None):
+        """
+        Run the stages of a pipeline.Pipeline over source text or a ParsedSource
+        The pipeline decides which passes run; `options` only carries their
+        settings (string_pool, short_names, call_dispatch)
+        """
+        options = options or {}
+        rng = make_rng(seed)
+        
+        steps = []
+        for (stage, names), cost in zip(pipeline.stages, pipeline.stage_costs):
+            if stage == 'source':
+                # One lex, parse and walk for all of the stage's token passes
+                stage_options = {
+                    **options,
+                    'remove_comments': 'remove_comments' in names,
+                    'rename_variables': 'rename_variables' in names,
+                }
+                steps.append((stage, cost, lambda code, names=names, stage_options=stage_options: self._source_passes(
+                    code, stage_options, rng,
+                    strings='encode_strings' in names,
+                    numbers='obfuscate_numbers' in names,
+                    minify='minify' in names,
+                    timings=timings,
+                )))
+            else:
+                run = PASSES[names[0]].run
+                steps.append((stage, cost, lambda code, run=run: run(self, code, rng, options)))
+        
+        if isinstance(code, ParsedSource) and (not steps or steps[0][0] != 'source'):
+            code = code.code
+        return self._run_steps(code, steps, progress, timings)
+    
+    def extreme_obfuscation(self, code, options=None, seed=None, progress=None, timings=None):
+        """Apply extreme obfuscation techniques for maximum protection"""
+        return self.run_pipeline(code, Pipeline.for_level('extreme', options), options, seed, progress, timings)
+    
+    def basic_obfuscation(self, code, options=None, seed=None, progress=None, timings=None):
+        """Apply basic obfuscation techniques"""
+        return self.run_pipeline(code, Pipeline.for_level('basic', options), options, seed, progress, timings)
+    
+    def medium_obfuscation(self, code, options=None, seed=None, progress=None, timings=None):
         """Apply medium obfuscation techniques"""
-        if options is None:
-            options = {
-                'rename_variables': True,
-                'remove_comments': True,
-                'encode_strings': True,
-                'minify': True
-            }
+        return self.run_pipeline(code, Pipeline.for_level('medium', options), options, seed, progress, timings)
+    
+    def advanced_obfuscation(self, code, options=None, seed=None, progress=None, timings=None):
+        """Apply advanced obfuscation techniques"""
+        return self.run_pipeline(code, Pipeline.for_level('advanced', options), options, seed, progress, timings)
+    
+    def _run_steps(self, code, steps, progress=None, timings=None):
+        """
+        Run (name, cost, function) steps in order, reporting each to
+        `progress` and `timings`; each step charges its input size times
+        its cost to the request budget before it runs
+        """
+        result = code
+        for index, (name, cost, step) in enumerate(steps):
+            checkpoint(len(result) * cost, name)
+            if progress is not None:
+                progress(name, index, len(steps))
+            start = time.perf_counter()
+            output = step(result)
+            if timings is not None:
+                timings.record(name, time.perf_counter() - start, len(result), len(output))
+            result = output
+        return result
+    
+    def obfuscate_large(self, code, out, level='basic', options=None, seed=None, timings=None):
+        """
+        Apply an obfuscation level to a large input, writing the result to
+        the text file `out`; returns the number of characters written
         
-        result = self.basic_obfuscation(code, options)
+        Memory stays a small multiple of the input: a ScopeResolver pass
+        records renames and insertion points in compact arrays, then one
+        chain of token generators rewrites a fresh token stream straight
+        into `out`. The input is validated by the resolver (LuaSyntaxError)
+        and options follow obfuscate(), except that the metatable layer
+        adds no proxies and calls are only ever routed through a dispatch
+        table, never through the line-based invoke wrapper.
+        """
+        if level not in self.LEVELS:
+            raise ValueError(f"Unknown obfuscation level: {level}")
+        options = options or {}
+        rng = make_rng(seed)
         
-        if options.get('encode_strings', True):
-            result = self.encode_strings(result)
+        pipeline = Pipeline.for_level(level, options)
+        # One pass does the work of all stages, so it is charged all at once
+        checkpoint(pipeline.cost(len(code)), 'large')
+        passes = set(pipeline.passes)
+        strings = 'encode_strings' in passes
+        numbers = 'obfuscate_numbers' in passes
+        minify = 'minify' in passes
+        control_flow = 'obfuscate_control_flow' in passes
+        metatables = 'obfuscate_metatables' in passes
+        fake_functions = 'add_fake_functions' in passes
+        dispatch = 'obfuscate_function_calls' in passes and options.get('call_dispatch', True)
         
-        if options.get('minify', True):
-            result = self.minify_code(result)
+        start = time.perf_counter()
+        watch = frozenset(('print',) + self.DISPATCH_LIBRARIES) if dispatch else frozenset()
+        resolver = ScopeResolver(iter_tokens(code), watch).run()
+        if timings is not None:
+            timings.record('resolve', time.perf_counter() - start)
         
-        return result
+        start = time.perf_counter()
+        # The resolver knows the chunk's globals, which is all names need to avoid
+        names = self._name_generator(None, resolver, rng, short=options.get('short_names', False))
+        pool = None
+        if strings and options.get('string_pool', True):
+            pool = StringPool.from_names(names)
+        
+        sites = [site for site in resolver.call_sites
+                 if (site[2] == 'print' or '.' in site[2])
+                 and site[2] not in resolver.assigned and site[2].split('.')[0] not in resolver.assigned]
+        slots = self._dispatch_slots({path for _, _, path in sites}, rng) if sites else {}
+        table_var = names.next_name() if sites else None
+        
+        new_names = None
+        if 'rename_variables' in passes:
+            if names.grow:
+                spans = [(binding, resolver.counts[binding], resolver.firsts[binding], resolver.lasts[binding])
+                         for binding in range(len(resolver.names))]
+                rename_map = self._shortest_names(spans, names)
+                new_names = [rename_map[binding] for binding in range(len(resolver.names))]
+            else:
+                new_names = [names.next_name() for _ in resolver.names]
+        
+        # Everything above the body is known before it is written
+        written = 0
+        for part in (
+            self._dispatch_setup(table_var, slots) if sites else '',
+            self._fake_functions(rng) if fake_functions else '',
+            self._metatable_prelude(rng)[0] + '\n' if metatables else '',
+        ):
+            out.write(part)
+            written += len(part)
+        
+        tokens = iter_tokens(code)
+        if 'remove_comments' in passes:
+            tokens = self._strip_comments(tokens)
+        tokens = self._resolved_tokens(tokens, resolver, new_names, sites, slots, table_var,
+                                       rng if control_flow else None)
+        if strings:
+            tokens = self._encode_string_tokens(tokens, pool)
+        if numbers:
+            tokens = self._obfuscate_number_tokens(tokens, rng)
+        if minify:
+            tokens = self._minify_tokens(tokens)
+        
+        if pool is None:
+            written += self._write_tokens(tokens, out)
+        else:
+            # The pool's prelude is complete only once the body is written
+            with tempfile.TemporaryFile('w+', encoding='utf-8') as body:
+                size = self._write_tokens(tokens, body)
+                prelude = pool.prelude()
+                out.write(prelude)
+                body.seek(0)
+                shutil.copyfileobj(body, out)
+                written += len(prelude) + size
+        
+        if timings is not None:
+            timings.record('generate', time.perf_counter() - start, len(code), written)
+        return written
     
-    def advanced_obfuscation(self, code, options=None):
-        """Apply advanced obfuscation techniques"""
-        if options is None:
-            options = {
-                'rename_variables': True,
-                'remove_comments': True,
-                'encode_strings': True,
-                'minify': True,
-                'obfuscate_control_flow': True,
-                'obfuscate_metatables': True
-            }
-        
-        result = self.medium_obfuscation(code, options)
-        
-        if options.get('obfuscate_control_flow', True):
-            result = self.obfuscate_control_flow(result)
-            
-        if options.get('obfuscate_metatables', True):
-            result = self.obfuscate_with_metatables(result)
+    def _resolved_tokens(self, tokens, resolver, new_names, sites, slots, table_var, rng=None):
+        """
+        Apply a ScopeResolver's results to a fresh token stream (a generator):
+        rename locals, route call sites through the dispatch table and, with
+        `rng`, add dummy blocks after top-level statements
+        """
+        refs = zip(resolver.ref_ordinals, resolver.ref_ids) if new_names is not None else iter(())
+        ref = next(refs, None)
+        calls = iter(sites)
+        call = next(calls, None)
+        ends = iter(resolver.statement_ends if rng is not None else ())
+        end = next(ends, None)
         
-        return result
+        ordinal = -1
+        skip_until = -1
+        for token in tokens:
+            if token.kind in TRIVIA:
+                if ordinal < skip_until:
+                    # Whitespace or comments inside a dotted name that was replaced
+                    continue
+                yield token
+                continue
+            
+            ordinal += 1
+            if ordinal < skip_until:
+                continue
+            if ref is not None and ref[0] == ordinal:
+                token = token._replace(value=new_names[ref[1]])
+                ref = next(refs, None)
+            if call is not None and call[0] == ordinal:
+                token = token._replace(kind=RAW, value=f'{table_var}[{slots[call[2]]}]')
+                skip_until = call[1]
+                call = next(calls, None)
+            yield token
+            
+            if end is not None and end == ordinal:
+                end = next(ends, None)
+                if rng.random() < 0.1:  # 10% chance
+                    dummy = f'{rng.choice(self.DUMMY_CONDITIONS)} local _ = {rng.randint(1, 100)} end'
+                    yield Token(WHITESPACE, ' ', token.pos, token.line)
+                    yield Token(RAW, dummy, token.pos, token.line)
+                    yield Token(WHITESPACE, ' ', token.pos, token.line)
+    
+    def _write_tokens(self, tokens, out, size=1 << 16):
+        """Write token values to `out` in batches; returns the number of characters"""
+        written = 0
+        batch = []
+        length = 0
+        for token in tokens:
+            batch.append(token.value)
+            length += len(token.value)
+            if length >= size:
+                checkpoint()
+                out.write(''.join(batch))
+                written += length
+                batch = []
+                length = 0
+        out.write(''.join(batch))
+        return written + length
@@ -0,0 +1,148 @@
+"""
+Registry of obfuscation passes and pipelines built from them
+
+Every pass states what it consumes and produces: 'tokens' for the
+source-level rewrites that work on the token stream and syntax tree, 'text'
+for the layers that rewrite or wrap the code as a whole. Adjacent token
+passes are fused into one 'source' stage, which lexes and parses once and
+applies them all in a single walk. Text passes run as stages of their own.
+
+Costs are relative CPU time per input byte, with a source stage as 1.0, and
+feed the up-front estimate and the work budget of a request (see budget.py).
+"""
+TOKENS = 'tokens'
+TEXT = 'text'
+
+# A fused source stage costs about the same whichever token passes it applies
+SOURCE_COST = 1.0
+
+
+class PipelineError(ValueError):
+    """Raised for a pipeline that names unknown or repeated passes"""
+
+
+class Pass:
+    """
+    One registered pass
+    Token passes are applied by the fused source stage, in increasing
+    `order`, and have no `run` or `cost`; passes of equal order rewrite
+    disjoint tokens and commute. Text passes have run(obfuscator, code, rng,
+    options) -> code, a `stage` name used for progress and timings and a
+    `cost` per input byte
+    """
+
+    def __init__(self, name, description, consumes, produces, order=None, stage=None, run=None, cost=None):
+        self.name = name
+        self.description = description
+        self.consumes = consumes
+        self.produces = produces
+        self.order = order
+        self.stage = stage
+        self.run = run
+        self.cost = cost
+
+    @property
+    def fusable(self):
+        return self.consumes == TOKENS and self.produces == TOKENS
+
+    def describe(self):
+        info = {'description': self.description, 'consumes': self.consumes, 'produces': self.produces}
+        if self.cost is not None:
+            info['cost'] = self.cost
+        return info
+
+
+PASSES = {}
+
+
+def register_pass(name, description, consumes=TEXT, produces=TEXT, order=None, stage=None, run=None, cost=None):
+    """Add a pass to the registry"""
+    PASSES[name] = Pass(name, description, consumes, produces, order, stage, run, cost)
+    return PASSES[name]
+
+
+register_pass('remove_comments', 'Remove all comments', TOKENS, TOKENS, order=0)
+register_pass('rename_variables', 'Rename local variables to random names', TOKENS, TOKENS, order=1)
+register_pass('encode_strings', 'Encode string literals', TOKENS, TOKENS, order=2)
+register_pass('obfuscate_numbers', 'Replace numbers with mathematical expressions', TOKENS, TOKENS, order=2)
+register_pass('minify', 'Remove unnecessary whitespace', TOKENS, TOKENS, order=3)
+register_pass(
+    'obfuscate_control_flow', 'Add dummy control flow statements', stage='control_flow', cost=0.7,
+    run=lambda obfuscator, code, rng, options: obfuscator.obfuscate_control_flow(code, rng),
+)
+register_pass(
+    'obfuscate_metatables', 'Resolve globals through a metatable environment and proxy values',
+    stage='metatables', cost=1.0,
+    run=lambda obfuscator, code, rng, options: obfuscator.obfuscate_with_metatables(code, rng),
+)
+register_pass(
+    'add_fake_functions', 'Insert fake/dummy functions', stage='fake_functions', cost=0.0,
+    run=lambda obfuscator, code, rng, options: obfuscator.add_fake_functions(code, rng),
+)
+register_pass(
+    'obfuscate_function_calls', 'Route calls through a dispatch table', stage='function_calls', cost=1.5,
+    run=lambda obfuscator, code, rng, options: obfuscator.obfuscate_function_calls(
+        code, rng, dispatch=options.get('call_dispatch', True)),
+)
+
+# The passes of each level, in order; options switch individual passes off
+LEVEL_PASSES = {
+    'basic': ('remove_comments', 'rename_variables'),
+    'medium': ('remove_comments', 'rename_variables', 'encode_strings', 'minify'),
+    'advanced': (
+        'remove_comments', 'rename_variables', 'encode_strings', 'minify',
+        'obfuscate_control_flow', 'obfuscate_metatables',
+    ),
+    'extreme': (
+        'remove_comments', 'rename_variables', 'encode_strings', 'obfuscate_numbers', 'minify',
+        'obfuscate_control_flow', 'obfuscate_metatables', 'add_fake_functions', 'obfuscate_function_calls',
+    ),
+}
+
+
+class Pipeline:
+    """
+    An ordered list of pass names, planned into stages
+    `stages` is a list of (stage name, [pass names]): consecutive token
+    passes listed in an order the source stage can apply them in share one
+    'source' stage
+    """
+
+    def __init__(self, passes):
+        passes = list(passes)
+        unknown = [name for name in passes if name not in PASSES]
+        if unknown:
+            raise PipelineError(f"Unknown passes: {', '.join(map(str, unknown))} "
+                                f"(available: {', '.join(PASSES)})")
+        if len(set(passes)) != len(passes):
+            raise PipelineError('Each pass may appear only once')
+        self.passes = tuple(passes)
+        self.stages = self._plan()
+        self.stage_costs = [SOURCE_COST if stage == 'source' else PASSES[names[0]].cost
+                            for stage, names in self.stages]
+
+    @classmethod
+    def for_level(cls, level, options=None):
+        """The pipeline of an obfuscation level, minus the passes `options` disable"""
+        options = options or {}
+        return cls(name for name in LEVEL_PASSES[level] if options.get(name, True))
+
+    def _plan(self):
+        stages = []
+        for name in self.passes:
+            spec = PASSES[name]
+            if not spec.fusable:
+                stages.append((spec.stage, [name]))
+            elif stages and stages[-1][0] == 'source' and PASSES[stages[-1][1][-1]].order <= spec.order:
+                stages[-1][1].append(name)
+            else:
+                # A token pass listed out of order has to see the previous stage's output
+                stages.append(('source', [name]))
+        return stages
+
+    def cost(self, size):
+        """Estimated cost of running the pipeline over `size` bytes of input"""
+        return size * sum(self.stage_costs)
+
+    def describe(self):
+        return [{'stage': stage, 'passes': names} for stage, names in self.stages]
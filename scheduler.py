@@ -0,0 +1,145 @@
+"""
+Priority lanes and fair queuing for the obfuscation work of one server process
+
+Obfuscation is CPU-bound, and all request threads of a worker process share
+one interpreter lock, so a burst of bulk requests slows down every request
+in the process. The Scheduler admits at most `slots` computations at once;
+the rest wait in a lane. The 'interactive' lane (the web UI) may use every
+slot, while 'bulk' may not use the last `reserved` ones, so an interactive
+request never queues behind bulk work. Within a lane, waiting requests are
+served round-robin by client, so one client's burst cannot starve the
+others.
+
+Queues are bounded per lane, and each client gets a bounded share of its
+lane. Requests beyond that are refused at once with Overloaded and a retry
+delay. Bulk clients then back off rather than tie up request threads that
+the interactive lane needs.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+
+class Overloaded(Exception):
+    """Raised when a lane's queue is full or a request waited too long; carries the retry delay"""
+
+    def __init__(self, message, lane, depth, retry_after):
+        super().__init__(message)
+        self.lane = lane
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class Scheduler:
+    """
+    Slots for computations, handed out by lane priority and per-client round-robin
+    `max_queue` maps each lane to the number of requests that may wait in
+    it; `client_queue` is how many of those may come from one client
+    """
+
+    def __init__(self, slots=2, reserved=1, max_queue=None, client_queue=2, max_wait=30.0):
+        self.slots = slots
+        self.reserved = min(reserved, slots - 1)
+        self.max_queue = {INTERACTIVE: 16, BULK: 4, **(max_queue or {})}
+        self.client_queue = client_queue
+        self.max_wait = max_wait
+        self.running = {lane: 0 for lane in LANES}
+        # Per lane, client -> waiters; the first client is served next
+        self._queues = {lane: OrderedDict() for lane in LANES}
+        self._lock = threading.Lock()
+        # Moving average of how long a slot is held, for retry estimates
+        self._service = 0.0
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+    def depth(self, lane):
+        """Number of requests waiting in a lane"""
+        return sum(len(waiters) for waiters in self._queues[lane].values())
+
+    def _can_run(self, lane):
+        busy = sum(self.running.values())
+        return busy < (self.slots if lane == INTERACTIVE else self.slots - self.reserved)
+
+    def _retry_after(self, depth):
+        # Whole seconds until the requests ahead should be done, at least 1
+        return max(1, math.ceil((depth + 1) * self._service / (self.slots - self.reserved)))
+
+    def _dispatch(self):
+        # Called with the lock held, whenever a slot may have come free
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self._can_run(lane):
+                client, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                # The client moves to the back of the rotation
+                if waiters:
+                    queue.move_to_end(client)
+                else:
+                    del queue[client]
+                waiter.granted = True
+                self.running[lane] += 1
+                self.stats['admitted'] += 1
+                waiter.event.set()
+
+    @contextmanager
+    def slot(self, lane, client):
+        """
+        Hold one computation slot for the duration of the block
+        Yields the seconds spent waiting for it; raises Overloaded when the
+        lane or the client's share of it is full, or after `max_wait`
+        """
+        waiter = None
+        with self._lock:
+            if not self._queues[lane] and self._can_run(lane):
+                self.running[lane] += 1
+                self.stats['admitted'] += 1
+            else:
+                depth = self.depth(lane)
+                if depth >= self.max_queue[lane]:
+                    self.stats['rejected'] += 1
+                    raise Overloaded(f'The {lane} queue is full ({depth} waiting)',
+                                     lane, depth, self._retry_after(depth))
+                waiters = self._queues[lane].setdefault(client, deque())
+                if len(waiters) >= self.client_queue:
+                    self.stats['rejected'] += 1
+                    raise Overloaded(f'Too many requests from this client waiting in the {lane} queue',
+                                     lane, depth, self._retry_after(depth))
+                waiter = _Waiter()
+                waiters.append(waiter)
+                self.stats['queued'] += 1
+
+        started = time.monotonic()
+        if waiter is not None and not waiter.event.wait(self.max_wait):
+            with self._lock:
+                if not waiter.granted:
+                    waiters = self._queues[lane][client]
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._queues[lane][client]
+                    self.stats['timed_out'] += 1
+                    depth = self.depth(lane)
+                    raise Overloaded(f'Waited {self.max_wait:g}s in the {lane} queue without a free slot',
+                                     lane, depth, self._retry_after(depth))
+
+        granted = time.monotonic()
+        try:
+            yield granted - started
+        finally:
+            with self._lock:
+                self.running[lane] -= 1
+                held = time.monotonic() - granted
+                self._service = held if not self._service else 0.8 * self._service + 0.2 * held
+                self._dispatch()
@@ -37,6 +37,10 @@ class LuaObfuscatorApp {
         
         // Alert container
         this.alertContainer = document.getElementById('alertContainer');
+
+        // As-you-type validation: the server session and the text it holds
+        this.liveDiagnostics = document.getElementById('liveDiagnostics');
+        this.live = { session: null, version: null, text: null, timer: null, busy: false, pending: false };
     }
 
     attachEventListeners() {
@@ -52,7 +56,10 @@ class LuaObfuscatorApp {
         this.copyBtn.addEventListener('click', () => this.copyResult());
 
         // Text area changes
-        this.luaCodeTextarea.addEventListener('input', () => this.updateStats());
+        this.luaCodeTextarea.addEventListener('input', () => {
+            this.updateStats();
+            this.scheduleLiveValidation();
+        });
         this.obfuscatedCodeTextarea.addEventListener('input', () => this.updateStats());
 
         // Level change updates options
@@ -198,7 +205,8 @@ class LuaObfuscatorApp {
             const response = await fetch('/api/obfuscate', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'X-Priority': 'interactive'
                 },
                 body: JSON.stringify({
                     code: code,
@@ -242,7 +250,8 @@ class LuaObfuscatorApp {
             const response = await fetch('/api/validate', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'X-Priority': 'interactive'
                 },
                 body: JSON.stringify({
                     code: code
@@ -267,12 +276,136 @@ class LuaObfuscatorApp {
         }
     }
 
+    scheduleLiveValidation() {
+        // Wait for a pause in typing
+        clearTimeout(this.live.timer);
+        this.live.timer = setTimeout(() => this.liveValidate(), 300);
+    }
+
+    async liveValidate() {
+        if (this.live.busy) {
+            this.live.pending = true;
+            return;
+        }
+        const text = this.luaCodeTextarea.value;
+        if (text === this.live.text) {
+            return;
+        }
+        if (!text.trim()) {
+            this.live.text = null;
+            this.showDiagnostics(null);
+            return;
+        }
+
+        this.live.busy = true;
+        try {
+            let data = await this.sendLiveValidation(text, false);
+            if (data === null) {
+                // The server lost our session or version: send the whole text
+                data = await this.sendLiveValidation(text, true);
+            }
+            if (data && data.success) {
+                this.live.session = data.session;
+                this.live.version = data.version;
+                this.live.text = text;
+                this.showDiagnostics(data);
+            }
+        } catch (error) {
+            // As-you-type checks fail quietly; the Validate button reports errors
+        } finally {
+            this.live.busy = false;
+            if (this.live.pending) {
+                this.live.pending = false;
+                this.liveValidate();
+            }
+        }
+    }
+
+    async sendLiveValidation(text, full) {
+        let body;
+        // The server counts characters, JavaScript counts UTF-16 units; they
+        // differ only around surrogate pairs, for which the whole text is sent
+        if (full || this.live.text === null || /[\uD800-\uDFFF]/.test(text + this.live.text)) {
+            body = { code: text };
+            if (this.live.session) {
+                body.session = this.live.session;
+            }
+        } else {
+            body = {
+                session: this.live.session,
+                version: this.live.version,
+                edits: [this.diffText(this.live.text, text)]
+            };
+        }
+
+        const response = await fetch('/api/validate/live', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Priority': 'interactive'
+            },
+            body: JSON.stringify(body)
+        });
+        if (response.status === 409) {
+            return null;
+        }
+        return response.json();
+    }
+
+    diffText(before, after) {
+        // One edit covering everything between the common prefix and suffix
+        let start = 0;
+        const limit = Math.min(before.length, after.length);
+        while (start < limit && before[start] === after[start]) {
+            start++;
+        }
+        let suffix = 0;
+        while (suffix < limit - start && before[before.length - 1 - suffix] === after[after.length - 1 - suffix]) {
+            suffix++;
+        }
+        return {
+            start: start,
+            end: before.length - suffix,
+            text: after.slice(start, after.length - suffix)
+        };
+    }
+
+    showDiagnostics(data) {
+        this.liveDiagnostics.innerHTML = '';
+        if (!data) {
+            return;
+        }
+        if (data.valid) {
+            const ok = document.createElement('span');
+            ok.className = 'text-success';
+            ok.textContent = '✓ No syntax errors';
+            this.liveDiagnostics.appendChild(ok);
+            return;
+        }
+        // Built as text nodes, since messages quote the user's code
+        const shown = data.diagnostics.slice(0, 5);
+        for (const diagnostic of shown) {
+            const line = document.createElement('div');
+            line.className = 'text-danger';
+            line.textContent = `Line ${diagnostic.line}, column ${diagnostic.column}: ${diagnostic.message}`;
+            this.liveDiagnostics.appendChild(line);
+        }
+        if (data.diagnostics.length > shown.length) {
+            const more = document.createElement('div');
+            more.className = 'text-danger';
+            more.textContent = `... and ${data.diagnostics.length - shown.length} more`;
+            this.liveDiagnostics.appendChild(more);
+        }
+    }
+
     clearAll() {
         this.luaCodeTextarea.value = '';
         this.obfuscatedCodeTextarea.value = '';
         this.copyBtn.disabled = true;
         this.updateStats();
         this.clearAlerts();
+        this.live.text = null;
+        this.showDiagnostics(null);
     }
 
     clearAlerts() {
@@ -0,0 +1,89 @@
+import os
+import json
+import mmap
+import tempfile
+
+STREAM_CHUNK_SIZE = 64 * 1024
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def ndjson_lines(records):
+    """Serialize each record as one line of newline-delimited JSON"""
+    for record in records:
+        yield json.dumps(record, separators=(',', ':')) + '\n'
+
+
+def split_output(text, size=STREAM_CHUNK_SIZE):
+    """
+    Yield `text` in pieces of about `size` characters
+    Pieces end on a line break when one is close, so each streamed chunk
+    holds whole lines of the obfuscated output
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            newline = text.rfind('\n', start + size // 2, end)
+            if newline != -1:
+                end = newline + 1
+        yield text[start:end]
+        start = end
+
+
+def wants_stream(request, data):
+    """True when the client asked for an NDJSON response"""
+    if isinstance(data, dict) and data.get('stream'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+class UploadTooLarge(ValueError):
+    """Raised when a request body is larger than the accepted limit"""
+
+
+def spool_upload(stream, max_bytes, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Copy a request body into an anonymous temporary file, rewound
+    Raises UploadTooLarge as soon as more than `max_bytes` arrive
+    """
+    spool = tempfile.TemporaryFile()
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise UploadTooLarge(f'Upload is larger than {max_bytes} bytes')
+        spool.write(chunk)
+    spool.flush()
+    spool.seek(0)
+    return spool
+
+
+def read_mapped(file):
+    """
+    Decode a spooled upload as UTF-8 through mmap
+    The text is decoded straight from the mapping, so the raw bytes are
+    never held in memory alongside it; raises UnicodeDecodeError for an
+    upload that is not UTF-8
+    """
+    if os.fstat(file.fileno()).st_size == 0:
+        return ''
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return str(mapped, 'utf-8')
+
+
+def iter_file(file, size=STREAM_CHUNK_SIZE):
+    """Yield the contents of an open file from the start, closing it when done"""
+    try:
+        file.seek(0)
+        while True:
+            piece = file.read(size)
+            if not piece:
+                break
+            yield piece
+    finally:
+        file.close()
@@ -0,0 +1,72 @@
+import base64
+
+from lua_lexer import decode_string
+
+BASE64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+class StringPool:
+    """
+    Constant pool for encoded string literals
+
+    Every distinct literal is stored once, base64 encoded, in a table emitted
+    by prelude(). Literals in the code become calls to a single accessor that
+    decodes an entry on first use and memoizes the result, so hot loops pay
+    for one table lookup instead of a full decode.
+    """
+
+    # Locals of the prelude's do block, which would shadow an accessor of the same name
+    PRELUDE_NAMES = frozenset({'P', 'C', 'R', 'B', 'k', 'char', 'byte', 'floor', 'concat'})
+
+    def __init__(self, accessor):
+        self.accessor = accessor
+        self.entries = []
+        self._index = {}
+
+    @classmethod
+    def from_names(cls, names):
+        """Create a pool whose accessor is the next suitable name from a NameGenerator"""
+        accessor = names.next_name()
+        while accessor in cls.PRELUDE_NAMES:
+            accessor = names.next_name()
+        return cls(accessor)
+
+    def reference(self, raw):
+        """Return the accessor call that yields the literal `raw`"""
+        data = decode_string(raw)
+        index = self._index.get(data)
+        if index is None:
+            # Padding is implied by the entry length, so it is not stored
+            self.entries.append(base64.b64encode(data).decode('ascii').rstrip('='))
+            index = len(self.entries)
+            self._index[data] = index
+        return f'{self.accessor}({index})'
+
+    def prelude(self):
+        """Return the Lua code that defines the pool and its decoder"""
+        if not self.entries:
+            return ''
+        pool = ','.join(f'"{entry}"' for entry in self.entries)
+        # Decodes 4 characters into 3 bytes with arithmetic only (no 'bit'
+        # library) and joins the pieces with table.concat
+        return (
+            f'local {self.accessor} do '
+            f'local P,C,R={{{pool}}},{{}},{{}} '
+            f'local B="{BASE64_ALPHABET}" '
+            f'for k=1,64 do R[B:byte(k)]=k-1 end '
+            f'local char,byte,floor,concat=string.char,string.byte,math.floor,table.concat '
+            f'{self.accessor}=function(i) '
+            f'local s=C[i] if s then return s end '
+            f'local d,o,n=P[i],{{}},0 '
+            f'for j=1,#d,4 do '
+            f'local a,b,c,e=byte(d,j,j+3) '
+            f'local v=R[a]*262144+R[b]*4096+(c and R[c]*64 or 0)+(e and R[e] or 0) '
+            f'n=n+1 '
+            f'if e then o[n]=char(floor(v/65536),floor(v/256)%256,v%256) '
+            f'elseif c then o[n]=char(floor(v/65536),floor(v/256)%256) '
+            f'else o[n]=char(floor(v/65536)) end '
+            f'end '
+            f's=concat(o) C[i]=s return s '
+            f'end '
+            f'end\n'
+        )
@@ -0,0 +1,301 @@
+"""
+Project-wide symbol index for obfuscating the files of a project consistently
+
+Renaming is per file: locals get fresh names in every file, and globals are
+left alone because another file may use them. The index records, for every
+file of a project, the globals it defines and reads, the module table it
+returns, the modules it requires and its locals. From that it derives one
+shared map for the globals that are defined and read within the project,
+which each file is then obfuscated against independently (and in parallel),
+so a global renamed in the file that defines it is renamed the same way in
+every file that uses it.
+
+The index is saved as JSON and updated incrementally: only files whose
+content hash changed are scanned again, and a global keeps its new name for
+as long as it stays in the map.
+
+Files share globals through _G, so the index does not work with the
+metatable layer of advanced and extreme: it runs each file in an
+environment of its own (setfenv), where the globals a file defines are not
+seen by the others. Project mode is refused unless obfuscate_metatables is
+switched off.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+
+from lua_lexer import tokenize, LuaSyntaxError, LUA_KEYWORDS
+from lua_ast import (
+    parse_chunk, Node, Name, Field, Index, String, Table, Call, Assign, Local, FunctionStat, Return,
+)
+from name_generator import NameGenerator
+from obfuscator import make_rng
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Globals of the Lua 5.1-5.4 and LuaJIT standard libraries, never renamed
+STANDARD_GLOBALS = frozenset({
+    '_G', '_VERSION', '_ENV', 'arg', 'assert', 'bit', 'bit32', 'collectgarbage', 'coroutine',
+    'debug', 'dofile', 'error', 'gcinfo', 'getfenv', 'getmetatable', 'io', 'ipairs', 'jit',
+    'load', 'loadfile', 'loadstring', 'math', 'module', 'newproxy', 'next', 'os', 'package',
+    'pairs', 'pcall', 'print', 'rawequal', 'rawget', 'rawlen', 'rawset', 'require', 'select',
+    'setfenv', 'setmetatable', 'string', 'table', 'tonumber', 'tostring', 'type', 'unpack',
+    'utf8', 'xpcall',
+})
+
+# Globals through which code can reach other globals by a computed name
+DYNAMIC_GLOBALS = frozenset({'getfenv', 'setfenv', 'load', 'loadstring', 'loadfile', 'dofile', '_ENV'})
+
+PROJECT_METATABLES_ERROR = ('Project mode cannot be combined with obfuscate_metatables, which keeps '
+                            'the globals of each file to itself; set it to false')
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z')
+
+
+def _digest(code):
+    return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+def _string_value(raw):
+    """The contents of a string literal without escapes, or None"""
+    if raw[0] in '"\'':
+        return raw[1:-1] if '\\' not in raw else None
+    level = raw.index('[', 1) + 1
+    return raw[level:-level]
+
+
+def _walk(body):
+    stack = list(body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, Node):
+            yield node
+            stack.extend(getattr(node, field, None) for field in node._fields)
+
+
+def module_name(path):
+    """The name `require` finds a project file by: 'net/http.lua' -> 'net.http'"""
+    name = path[:-len('.lua')] if path.lower().endswith('.lua') else path
+    if name.endswith('/init'):
+        name = name[:-len('/init')]
+    return name.replace('/', '.')
+
+
+def _module_table(body):
+    """The name and fields of the table a module file returns, or None"""
+    if not body or not isinstance(body[-1], Return) or len(body[-1].values) != 1:
+        return None
+    value = body[-1].values[0]
+    if isinstance(value, Table):
+        keys = [field.key for field in value.fields]
+        return {'table': None, 'fields': sorted({key for key in keys if isinstance(key, str)})}
+    if not isinstance(value, Name):
+        return None
+
+    def is_table(expr):
+        return isinstance(expr, Name) and expr.name == value.name and expr.binding is value.binding
+
+    fields = set()
+    for node in _walk(body):
+        if isinstance(node, FunctionStat) and isinstance(node.target, Field) and is_table(node.target.obj):
+            fields.add(node.target.name)
+        elif isinstance(node, FunctionStat) and node.method is not None and is_table(node.target):
+            fields.add(node.method)
+        elif isinstance(node, Assign):
+            fields.update(target.name for target in node.targets
+                          if isinstance(target, Field) and is_table(target.obj))
+        elif isinstance(node, Local):
+            for target, init in zip(node.targets, node.values):
+                if target is value.binding and isinstance(init, Table):
+                    fields.update(field.key for field in init.fields if isinstance(field.key, str))
+    return {'table': value.name, 'fields': sorted(fields)}
+
+
+def scan_source(code):
+    """
+    Return the index entry of one Lua source
+    A top-level function, so that a process pool can run it
+    """
+    try:
+        chunk = parse_chunk(tokenize(code))
+    except LuaSyntaxError as e:
+        return {'error': str(e)}
+
+    references = {}
+    definitions = {}
+    strings = set()
+    requires = set()
+    qualified = 0  # uses of _G as _G.name or _G['name']
+    for node in _walk(chunk.body):
+        if isinstance(node, Name) and node.binding is None:
+            references[node.name] = references.get(node.name, 0) + 1
+        elif isinstance(node, (Assign, FunctionStat)):
+            targets = node.targets if isinstance(node, Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, Name) and target.binding is None:
+                    definitions[target.name] = definitions.get(target.name, 0) + 1
+        elif isinstance(node, String):
+            value = _string_value(node.raw)
+            if value is not None and _IDENTIFIER.match(value):
+                strings.add(value)
+        elif isinstance(node, (Field, Index)) and isinstance(node.obj, Name) \
+                and node.obj.name == '_G' and node.obj.binding is None:
+            if isinstance(node, Field):
+                strings.add(node.name)
+                qualified += 1
+            elif isinstance(node.key, String):
+                qualified += 1
+        elif isinstance(node, Call) and isinstance(node.func, Name) and node.func.name == 'require' \
+                and node.func.binding is None and len(node.args) == 1 and isinstance(node.args[0], String):
+            value = _string_value(node.args[0].raw)
+            if value is not None:
+                requires.add(value)
+
+    # Reads are the references that are not the definitions themselves; any
+    # other use of _G, such as _G[key] or pairs(_G), can reach every global
+    reads = {name for name, count in references.items() if count > definitions.get(name, 0)}
+    dynamic = references.get('_G', 0) > qualified or bool(references.keys() & DYNAMIC_GLOBALS)
+    return {
+        'defines': sorted(definitions),
+        'reads': sorted(reads),
+        'strings': sorted(strings),
+        'dynamic': dynamic,
+        'module': _module_table(chunk.body),
+        'requires': sorted(requires),
+        'locals': len(chunk.bindings),
+        'local_names': sorted({binding.name for binding in chunk.bindings}),
+    }
+
+
+class SymbolIndex:
+    """
+    The symbols of every file of a project and the global names they share
+    `files` maps a path to its scan_source() entry plus the content 'hash';
+    `names` maps each global ever renamed to its new name and only grows, so
+    a global keeps its name across updates. `keep` lists globals that code
+    outside the project uses (host callbacks, public APIs) and must not be
+    renamed.
+    """
+
+    def __init__(self, path=None, seed=None, keep=()):
+        self.path = path
+        self.seed = seed
+        self.keep = frozenset(keep)
+        self.files = {}
+        self.names = {}
+
+    @classmethod
+    def load(cls, path, seed=None, keep=()):
+        """Read an index saved by save(), or start an empty one"""
+        index = cls(path, seed, keep)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION:
+            return index
+        index.files = data.get('files', {})
+        # Names drawn for another seed would not match what that seed yields
+        if data.get('seed') == seed:
+            index.names = data.get('names', {})
+        return index
+
+    def save(self, path=None):
+        path = path or self.path
+        # Write then rename, so an interrupted run never leaves half an index
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'seed': self.seed, 'names': self.names, 'files': self.files},
+                      f, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+
+    def update(self, sources, processor=None):
+        """
+        Bring the index in line with `sources` ({path: code} of the whole
+        project) and return the paths that were scanned; unchanged files are
+        skipped, and a batch.BatchProcessor, if given, scans in parallel
+        """
+        hashes = {path: _digest(code) for path, code in sources.items()}
+        for path in self.files.keys() - hashes.keys():
+            del self.files[path]
+        changed = sorted(path for path, digest in hashes.items()
+                         if self.files.get(path, {}).get('hash') != digest)
+        codes = [sources[path] for path in changed]
+        entries = processor.map(scan_source, codes) if processor is not None else map(scan_source, codes)
+        for path, entry in zip(changed, entries):
+            entry['hash'] = hashes[path]
+            self.files[path] = entry
+        logger.debug('Symbol index: %s files, %s scanned', len(self.files), len(changed))
+        return changed
+
+    def blockers(self):
+        """Files that prevent renaming globals, with the reason"""
+        blocked = {}
+        for path, entry in sorted(self.files.items()):
+            if 'error' in entry:
+                blocked[path] = f"does not parse: {entry['error']}"
+            elif entry['dynamic']:
+                blocked[path] = 'accesses globals by computed name (_G[...], getfenv, load, ...)'
+        return blocked
+
+    def global_names(self):
+        """
+        The shared map of global name -> new name for the whole project
+        A global is renamed when a project file defines it and a project
+        file reads it, it is not a standard library name, not in `keep`, and
+        never appears as an identifier-like string or as a _G field. Any
+        file that parses badly or reaches globals dynamically turns global
+        renaming off for the project, since its references cannot be traced
+        """
+        if self.blockers():
+            return {}
+        defined, read, quoted, taken = set(), set(), set(), set()
+        for entry in self.files.values():
+            defined.update(entry['defines'])
+            read.update(entry['reads'])
+            quoted.update(entry['strings'])
+            taken.update(entry['defines'], entry['reads'], entry['local_names'])
+        renamed = sorted((defined & read) - STANDARD_GLOBALS - quoted - self.keep)
+
+        # New names avoid every identifier of the project and the names already issued
+        taken |= STANDARD_GLOBALS | LUA_KEYWORDS | {'self', 'goto'}
+        generator = NameGenerator(seed=make_rng(f'{self.seed}:globals').getrandbits(64),
+                                  reserved=taken | set(self.names.values()))
+        names = {}
+        for name in renamed:
+            if name not in self.names or self.names[name] in taken:
+                self.names[name] = generator.next_name()
+            names[name] = self.names[name]
+        return names
+
+    def file_names(self, path, names):
+        """The part of the shared map `names` that one file refers to"""
+        entry = self.files[path]
+        if 'error' in entry:
+            return {}
+        return {name: names[name] for name in entry['defines'] + entry['reads'] if name in names}
+
+    def describe(self, names=None):
+        """A JSON-ready summary: renamed globals, blockers and module dependencies"""
+        modules = {module_name(path): path for path in self.files}
+        files = {}
+        for path, entry in sorted(self.files.items()):
+            if 'error' in entry:
+                continue
+            files[path] = {
+                'module': entry['module'],
+                'requires': [modules.get(name, name) for name in entry['requires']],
+                'locals': entry['locals'],
+            }
+        return {
+            'files': files,
+            'renamed_globals': len(names if names is not None else self.global_names()),
+            'blocked': self.blockers(),
+        }
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its configuration at import time
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db'))
+
+
+@pytest.fixture
+def client():
+    """A test client of the app, with an empty in-process result cache"""
+    import app
+    from cache import LRUCache
+    app.result_cache.memory = LRUCache(app.result_cache.memory.max_bytes)
+    return app.app.test_client()
@@ -0,0 +1,190 @@
+import pytest
+
+
+@pytest.mark.parametrize('options', [[1], 'fast', 5])
+def test_obfuscate_rejects_non_object_options(client, options):
+    response = client.post('/api/obfuscate', json={'code': 'print(1)', 'options': options})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Options must be an object', 'success': False}
+
+
+def test_jobs_reject_non_object_options(client):
+    response = client.post('/api/jobs', json={'code': 'print(1)', 'options': [1]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Options must be an object'
+
+
+@pytest.mark.parametrize('global_names', [5, {'print': 'end', 'x': 'a b'}])
+def test_obfuscate_rejects_global_names(client, global_names):
+    response = client.post('/api/obfuscate', json={'code': 'print(1)', 'options': {'global_names': global_names}})
+    assert response.status_code == 400
+    assert 'global_names' in response.get_json()['error']
+
+
+def test_batch_rejects_global_names(client):
+    response = client.post('/api/obfuscate/batch', json={
+        'files': [{'name': 'a.lua', 'code': 'x = 1'}],
+        'options': {'global_names': {'x': 'y'}},
+    })
+    assert response.status_code == 400
+
+
+FILES = [
+    {'name': 'a.lua', 'code': 'function helper() return 1 end'},
+    {'name': 'b.lua', 'code': 'print(helper())'},
+]
+
+
+@pytest.mark.parametrize('level', ['advanced', 'extreme'])
+def test_batch_project_rejects_metatables(client, level):
+    response = client.post('/api/obfuscate/batch', json={'files': FILES, 'level': level, 'project': True})
+    assert response.status_code == 400
+    assert 'obfuscate_metatables' in response.get_json()['error']
+
+
+def test_batch_project_without_metatables(client):
+    response = client.post('/api/obfuscate/batch', json={
+        'files': FILES, 'level': 'advanced', 'project': True, 'seed': 1,
+        'options': {'obfuscate_metatables': False},
+    })
+    assert response.status_code == 200
+    assert response.get_json()['failed'] == 0
+
+
+def test_obfuscate_lua51_escapes(client):
+    response = client.post('/api/obfuscate', json={'code': 'print("\\xZZ")', 'level': 'medium'})
+    assert response.status_code == 200
+
+
+def test_obfuscate_rejects_large_escape(client):
+    response = client.post('/api/obfuscate', json={'code': 'print("\\300")', 'level': 'medium'})
+    assert response.status_code == 400
+    assert 'Escape sequence too large' in response.get_json()['error']
+
+
+CODE = 'local x = 1\n' * 200
+
+
+def test_upload_over_cost(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'MAX_REQUEST_COST', 100)
+    response = client.post('/api/obfuscate/upload?level=medium', data=CODE)
+    assert response.status_code == 413
+    error = response.get_json()['error']
+    assert '/api/jobs' in error and '/api/obfuscate/upload' not in error
+
+
+def test_batch_over_cost(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'MAX_REQUEST_COST', 100)
+    response = client.post('/api/obfuscate/batch', json={'files': [{'name': 'a.lua', 'code': CODE}]})
+    assert response.status_code == 413
+
+
+def test_upload_work_budget(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'REQUEST_WORK_BUDGET', 100)
+    response = client.post('/api/obfuscate/upload?level=medium', data=CODE)
+    assert response.status_code == 413
+    assert response.get_json()['error'].startswith('Request aborted')
+
+
+def test_batch_single_file_work_budget(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'REQUEST_WORK_BUDGET', 100)
+    response = client.post('/api/obfuscate/batch', json={'files': [{'name': 'a.lua', 'code': CODE}]})
+    assert response.status_code == 413
+    assert response.get_json()['error'].startswith('Request aborted')
+
+
+def test_pool_file_work_budget():
+    from batch import obfuscate_file
+    result = obfuscate_file(('a.lua', CODE, 'medium', {}, 1, True), limits=(None, 100))
+    assert not result['success']
+    assert result['error'].startswith('Request aborted')
+
+
+def test_batch_pool_work_budget(client, monkeypatch):
+    import app
+    from batch import BatchProcessor
+    monkeypatch.setattr(app, 'REQUEST_WORK_BUDGET', 100)
+    monkeypatch.setattr(app, 'batch_processor', BatchProcessor(2))
+    files = [{'name': f'{n}.lua', 'code': CODE} for n in range(2)]
+    try:
+        response = client.post('/api/obfuscate/batch', json={'files': files})
+    finally:
+        app.batch_processor.shutdown()
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert all(result['error'].startswith('Request aborted') for result in results.values())
+
+
+def test_upload_not_utf8(client):
+    response = client.post('/api/obfuscate/upload', data=b'print("caf\xe9")\n')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Upload is not valid UTF-8')
+
+
+def test_upload_and_batch_use_the_bulk_lane(client):
+    headers = {'X-Priority': 'interactive'}
+    response = client.post('/api/obfuscate/upload', data='print(1)', headers=headers)
+    assert response.headers['X-Queue-Lane'] == 'bulk'
+    response = client.post('/api/obfuscate/batch', json={'files': [{'name': 'a.lua', 'code': 'print(1)'}]},
+                           headers=headers)
+    assert response.headers['X-Queue-Lane'] == 'bulk'
+
+
+def test_batch_stream_releases_its_slot(client):
+    import app
+    files = [{'name': f'{n}.lua', 'code': f'print({n})'} for n in range(3)]
+    response = client.post('/api/obfuscate/batch', json={'files': files, 'format': 'ndjson'})
+    assert response.headers['X-Queue-Lane'] == 'bulk'
+    assert len(response.get_data(as_text=True).splitlines()) == 4
+    response.close()
+    assert app.scheduler.running['bulk'] == 0
+
+
+def test_full_bulk_lane(client, monkeypatch):
+    import app
+    from scheduler import Scheduler
+    scheduler = Scheduler(slots=2, reserved=1, max_queue={'bulk': 0})
+    # An interactive request holds the one slot bulk work may use
+    scheduler.running['interactive'] = 1
+    monkeypatch.setattr(app, 'scheduler', scheduler)
+    response = client.post('/api/obfuscate/upload', data='print(1)')
+    assert response.status_code == 503
+    response = client.post('/api/obfuscate/batch', json={'files': [{'name': 'a.lua', 'code': 'print(1)'}]})
+    assert response.status_code == 503
+
+
+def archive(members):
+    import io
+    import zipfile
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+LATIN1 = {'good.lua': b'print("ok")\n', 'latin1.lua': b'print("caf\xe9")\n'}
+
+
+def test_batch_archive_member_not_utf8(client):
+    response = client.post('/api/obfuscate/batch', data={'archive': (archive(LATIN1), 'src.zip')})
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['failed'] == 1 and payload['file_count'] == 2
+    assert payload['results']['good.lua']['success']
+    assert payload['results']['latin1.lua'] == {'success': False, 'error': payload['results']['latin1.lua']['error']}
+    assert payload['results']['latin1.lua']['error'].startswith('Not valid UTF-8')
+
+
+def test_batch_archive_member_not_utf8_streamed(client):
+    import json
+    response = client.post('/api/obfuscate/batch', data={
+        'archive': (archive({'latin1.lua': LATIN1['latin1.lua']}), 'src.zip'), 'format': 'ndjson'})
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records[0]['name'] == 'latin1.lua' and not records[0]['success']
+    assert records[-1]['failed'] == 1 and records[-1]['file_count'] == 1
@@ -0,0 +1,57 @@
+from cache import ObfuscationCache, make_cache_key
+
+CODE = 'local x = 1\nprint(x)\n'
+
+
+def test_cache_key_covers_every_input():
+    base = make_cache_key(CODE, 'medium', {'minify': False}, 1, '2.0')
+    assert make_cache_key(CODE, 'medium', {'minify': False}, 1, '2.0') == base
+    assert make_cache_key(CODE + ' ', 'medium', {'minify': False}, 1, '2.0') != base
+    assert make_cache_key(CODE, 'basic', {'minify': False}, 1, '2.0') != base
+    assert make_cache_key(CODE, 'medium', {'minify': True}, 1, '2.0') != base
+    assert make_cache_key(CODE, 'medium', {'minify': False}, 2, '2.0') != base
+    assert make_cache_key(CODE, 'medium', {'minify': False}, 1, '2.1') != base
+    assert make_cache_key(CODE, ['rename_variables'], {'minify': False}, 1, '2.0') != base
+
+
+def test_cache_key_ignores_option_order():
+    assert make_cache_key(CODE, 'basic', {'a': 1, 'b': 2}, None, '2.0') == \
+        make_cache_key(CODE, 'basic', {'b': 2, 'a': 1}, None, '2.0')
+
+
+def test_get_or_compute_stores_result():
+    cache = ObfuscationCache(max_bytes=1024)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 'result'
+
+    assert cache.get_or_compute('key', compute) == ('result', False)
+    assert cache.get_or_compute('key', compute) == ('result', True)
+    assert len(calls) == 1
+
+
+def test_skip_validation_results_are_not_cached(client):
+    invalid = {'code': 'local x = (1 + ', 'level': 'basic', 'seed': 1}
+    response = client.post('/api/obfuscate', json={**invalid, 'skip_validation': True})
+    assert response.status_code == 200
+    response = client.post('/api/obfuscate', json=invalid)
+    assert response.status_code == 400
+
+
+def test_skip_validation_batch_results_are_not_cached(client):
+    files = [{'name': 'bad.lua', 'code': 'local x = (1 + '}]
+    client.post('/api/obfuscate/batch', json={'files': files, 'seed': 1, 'skip_validation': True})
+    response = client.post('/api/obfuscate/batch', json={'files': files, 'seed': 1})
+    result = response.get_json()['results']['bad.lua']
+    assert not result['success']
+    assert not result.get('cached')
+
+
+def test_validated_results_are_cached(client):
+    request = {'code': CODE, 'level': 'basic', 'seed': 1}
+    first = client.post('/api/obfuscate', json=request).get_json()
+    second = client.post('/api/obfuscate', json=request).get_json()
+    assert not first['cached'] and second['cached']
+    assert first['obfuscated_code'] == second['obfuscated_code']
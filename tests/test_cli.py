@@ -0,0 +1,87 @@
+import pytest
+
+import cli
+
+
+def test_project_rejects_metatables(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path), str(tmp_path / 'out'), '--level', 'advanced', '--project'])
+    assert 'obfuscate_metatables' in capsys.readouterr().err
+
+
+def test_options_reject_global_names(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path), str(tmp_path / 'out'), '--options', '{"global_names": {"x": "y"}}'])
+    assert 'global_names' in capsys.readouterr().err
+
+
+def test_project_without_metatables(tmp_path):
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'a.lua').write_text('function helper() return 1 end\n')
+    (tmp_path / 'src' / 'b.lua').write_text('print(helper())\n')
+    assert cli.main([str(tmp_path / 'src'), str(tmp_path / 'out'), '--level', 'advanced', '--project',
+                     '--jobs', '1', '--seed', '1', '--options', '{"obfuscate_metatables": false}']) == 0
+
+
+def build(tmp_path, capsys, seed=1, level='basic'):
+    """Run the CLI over tmp_path/src; returns (failed, (files, unchanged, to obfuscate))"""
+    failed = cli.run(str(tmp_path / 'src'), str(tmp_path / 'out'), level, {}, seed, 1,
+                     str(tmp_path / 'out' / cli.MANIFEST_NAME))
+    summary = next(line for line in capsys.readouterr().out.splitlines() if 'to obfuscate' in line)
+    return failed, tuple(int(part.split()[0]) for part in summary.split(', '))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'src' / 'lib').mkdir(parents=True)
+    (tmp_path / 'out').mkdir()
+    (tmp_path / 'src' / 'main.lua').write_text('local x = 1\nprint(x)\n')
+    (tmp_path / 'src' / 'lib' / 'util.lua').write_text('local function f(a) return a end\nprint(f(2))\n')
+    return tmp_path
+
+
+def test_unchanged_files_are_skipped(tree, capsys):
+    assert build(tree, capsys) == (0, (2, 0, 2))
+    output = (tree / 'out' / 'main.lua').read_bytes()
+    assert build(tree, capsys) == (0, (2, 2, 0))
+    assert (tree / 'out' / 'main.lua').read_bytes() == output
+
+
+def test_edited_files_are_redone(tree, capsys):
+    build(tree, capsys)
+    (tree / 'src' / 'main.lua').write_text('local y = 2\nprint(y)\n')
+    assert build(tree, capsys) == (0, (2, 1, 1))
+    # An output changed by hand is redone as well
+    (tree / 'out' / 'lib' / 'util.lua').write_text('tampered')
+    assert build(tree, capsys) == (0, (2, 1, 1))
+
+
+def test_deleted_sources_remove_their_output(tree, capsys):
+    build(tree, capsys)
+    (tree / 'src' / 'lib' / 'util.lua').unlink()
+    assert build(tree, capsys) == (0, (1, 1, 0))
+    assert not (tree / 'out' / 'lib' / 'util.lua').exists()
+
+
+def test_changed_settings_redo_everything(tree, capsys, monkeypatch):
+    build(tree, capsys)
+    assert build(tree, capsys, seed=2) == (0, (2, 0, 2))
+    assert build(tree, capsys, seed=2, level='medium') == (0, (2, 0, 2))
+    monkeypatch.setattr(cli.LuaObfuscator, 'VERSION', 'next')
+    assert build(tree, capsys, seed=2, level='medium') == (0, (2, 0, 2))
+
+
+def test_source_that_is_not_utf8_fails(tree, capsys):
+    build(tree, capsys)
+    (tree / 'src' / 'main.lua').write_bytes(b'print("caf\xe9")\n')
+    failed = cli.run(str(tree / 'src'), str(tree / 'out'), 'basic', {}, 1, 1,
+                     str(tree / 'out' / cli.MANIFEST_NAME))
+    assert failed == 1
+    assert 'FAILED main.lua: not valid UTF-8' in capsys.readouterr().err
+    # Retried on the next run rather than recorded as current
+    assert build(tree, capsys) == (1, (2, 1, 0))
+
+    # Its output from before the failure goes once the source does
+    (tree / 'src' / 'main.lua').unlink()
+    assert build(tree, capsys) == (0, (1, 1, 0))
+    assert not (tree / 'out' / 'main.lua').exists()
@@ -0,0 +1,58 @@
+import pytest
+
+from lua_lexer import tokenize, decode_string, LuaSyntaxError, STRING
+
+
+def string_token(code):
+    return next(token for token in tokenize(code) if token.kind == STRING)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    (r'"\65\066\x43"', b'ABx43'),
+    (r'"\xZZ"', b'xZZ'),
+    (r'"a\z   b"', b'az   b'),
+    (r'"\u{41}"', b'u{41}'),
+    (r'"\q"', b'q'),
+    (r'"\2555"', b'\xff5'),
+    (r'"\0"', b'\x00'),
+    (r'"\\65"', b'\\65'),
+    (r"'\'\"\n\t'", b'\'"\n\t'),
+    ('"a\\\r\nb"', b'a\nb'),
+    ('[[\nlong\\x41]]', b'long\\x41'),
+])
+def test_decode_as_lua51(raw, expected):
+    assert decode_string(string_token(raw).value) == expected
+
+
+@pytest.mark.parametrize('code, pos', [
+    (r'x = "\300"', 4),
+    (r'x = "ok\256"', 4),
+    (r'x = "\999"', 4),
+])
+def test_escape_too_large(code, pos):
+    with pytest.raises(LuaSyntaxError, match='Escape sequence too large') as e:
+        tokenize(code)
+    assert e.value.pos == code.index('\\')
+
+
+def test_escape_error_line():
+    with pytest.raises(LuaSyntaxError) as e:
+        tokenize('x = "a\\\nb\\300"')
+    assert e.value.line == 2
+
+
+def test_escaped_backslash_before_digits():
+    assert decode_string(string_token(r'"\\300"').value) == b'\\300'
+
+
+def test_unterminated_string():
+    with pytest.raises(LuaSyntaxError, match='Unterminated string literal'):
+        tokenize('x = "abc\\"')
+
+
+@pytest.mark.parametrize('raw', [
+    r'"\65\066\x43"', r'"\xZZ"', r'"a\z   b"', r'"\u{41}"', r'"\q\255\0"', '"a\\\nb"',
+])
+def test_decode_matches_lua51(raw):
+    lua = pytest.importorskip('lupa.lua51').LuaRuntime(encoding=None)
+    assert decode_string(raw) == lua.execute(b'return ' + raw.encode())
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from benchmarks.corpus import load_samples
+from lua_parser import LuaParser
+from live_validation import LiveValidator, EditError, StaleSession
+
+parser = LuaParser()
+SAMPLES = load_samples()
+
+# Fragments that open and close blocks, strings and tables, or break the grammar
+PIECES = [
+    '(', ')', 'end', ' if ', 'then', '"', '[[', '--', '=', '++', '{', '}', 'function f()', 'local ',
+    'return 1 ', '\n', 'x', ';', ';;', '...', 'local function g() end\n', '"\\300"',
+]
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+def test_random_edits_match_full_validation(name):
+    rng = random.Random(name)
+    code = SAMPLES[name]
+    validator = LiveValidator(parser)
+    result = validator.open('editor', code)
+    text = code
+    for _ in range(150):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.randrange(4))
+        piece = rng.choice(PIECES)
+        result = validator.edit('editor', result['version'], [{'start': start, 'end': end, 'text': piece}])
+        text = text[:start] + piece + text[end:]
+
+        assert result['valid'] == parser.validate_syntax(text)[0]
+        assert result['valid'] == (not result['diagnostics'])
+        # Chunks reused across edits give what checking the text afresh gives
+        assert result['diagnostics'] == LiveValidator(parser).open('fresh', text)['diagnostics']
+        if rng.random() < 0.2:
+            text = code
+            result = validator.open('editor', text)
+
+
+def test_diagnostic_position():
+    result = LiveValidator(parser).open('editor', 'local x = 1\nlocal function f()\n  return ...\nend\n')
+    assert result['diagnostics'] == [{
+        'line': 3, 'column': 10, 'offset': 40,
+        'message': "cannot use '...' outside a vararg function near '...'",
+    }]
+
+
+def test_stale_version():
+    validator = LiveValidator(parser)
+    result = validator.open('editor', 'x = 1')
+    with pytest.raises(StaleSession):
+        validator.edit('editor', result['version'] + 1, [])
+    with pytest.raises(StaleSession):
+        validator.edit('other', 1, [])
+
+
+def test_malformed_edit_leaves_session_unchanged():
+    validator = LiveValidator(parser)
+    result = validator.open('editor', 'x = 1')
+    with pytest.raises(EditError):
+        validator.edit('editor', result['version'], [{'start': 0, 'end': 0, 'text': 'y'}, {'start': 9, 'end': 12}])
+    assert validator.edit('editor', result['version'], [])['valid']
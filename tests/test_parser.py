@@ -0,0 +1,101 @@
+"""The validator must accept and reject what Lua 5.1 does"""
+
+import pytest
+
+from lua_parser import LuaParser
+from lua_lexer import iter_tokens, LuaSyntaxError
+from lua_stream import ScopeResolver
+
+parser = LuaParser()
+
+VALID = [
+    'local x = 1; local y = 2;',
+    'f(); g();',
+    'return;',
+    'do local x = 1; end',
+    'local function f(...) return ... end',
+    'local t = {...}',
+    'print(select("#", ...))',
+    'local f = function(a, ...) local g = function(...) return ... end return g(...) end',
+    'for i = 1, 2 do print(i); end',
+    'local t = {1; 2, 3;}',
+    'x = 1 ;(print)(x)',
+    'repeat local x = 1; until x',
+    'if x then f(); elseif y then g(); else h(); end',
+    'while true do break end',
+    'for i = 1, 2 do if i then break; end end',
+    'goto = 1',
+    'x = -#t ^ 2 .. "a"',
+]
+
+INVALID = [
+    ';',
+    ';;',
+    'local x = 1;;',
+    '; local x = 1',
+    'do ; end',
+    'if x then ; end',
+    'function f() ; end',
+    'local function f() return ... end',
+    'local function f(a) return function(...) end, ... end',
+    'local f = function(...) return function() return ... end end',
+    'function t:m() print(...) end',
+    'return 1; 2',
+    'local x = "\\300"',
+    'goto done',
+    '::done::',
+    'for i = 1, 2 do goto continue ::continue:: end',
+    'x = 7 // 2',
+    'x = 1 & 2',
+    'x = 1 | 2',
+    'x = 1 ~ 2',
+    'x = ~1',
+    'x = 1 << 2',
+    'x = 1 >> 2',
+    'local x <const> = 1',
+    'local f <close> = nil',
+    'while true do break print(1) end',
+    'repeat break; local x = 1 until true',
+]
+
+
+def lua_accepts(code):
+    lua51 = pytest.importorskip('lupa.lua51')
+    runtime = lua51.LuaRuntime()
+    return runtime.eval(f'loadstring({runtime.eval("string.format")("%q", code)}) ~= nil')
+
+
+def resolver_accepts(code):
+    try:
+        ScopeResolver(iter_tokens(code)).run()
+    except LuaSyntaxError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('code', VALID)
+def test_accepts_valid(code):
+    assert parser.validate_syntax(code) == (True, None)
+    assert resolver_accepts(code)
+
+
+@pytest.mark.parametrize('code', INVALID)
+def test_rejects_invalid(code):
+    valid, error = parser.validate_syntax(code)
+    assert not valid and error
+    assert not resolver_accepts(code)
+
+
+@pytest.mark.parametrize('code', VALID + INVALID)
+def test_agrees_with_lua51(code):
+    assert parser.validate_syntax(code)[0] == lua_accepts(code)
+
+
+def test_vararg_error_message():
+    valid, error = parser.validate_syntax('local function f()\n  return ...\nend')
+    assert error == "cannot use '...' outside a vararg function near '...' at line 2"
+
+
+def test_empty_statement_error():
+    valid, error = parser.validate_syntax('x = 1\n;;')
+    assert not valid and "near ';'" in error and 'line 2' in error
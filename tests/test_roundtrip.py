@@ -0,0 +1,114 @@
+"""Obfuscated output must compile and behave like its input under Lua 5.1 (needs lupa)"""
+import pytest
+
+lua51 = pytest.importorskip('lupa.lua51')
+
+from obfuscator import LuaObfuscator
+from benchmarks.corpus import load_samples
+
+# LuaJIT's bit library, which the unpooled string decoder uses
+BIT = '''
+bit = {
+  bor = function(a, b) local r, m = 0, 1 while a > 0 or b > 0 do local x, y = a % 2, b % 2
+    if x + y > 0 then r = r + m end a = (a - x) / 2 b = (b - y) / 2 m = m * 2 end return r end,
+  band = function(a, b) local r, m = 0, 1 while a > 0 and b > 0 do local x, y = a % 2, b % 2
+    if x + y == 2 then r = r + m end a = (a - x) / 2 b = (b - y) / 2 m = m * 2 end return r end,
+  lshift = function(a, n) return a * 2 ^ n end,
+  rshift = function(a, n) return math.floor(a / 2 ^ n) end,
+}
+'''
+
+SAMPLES = load_samples()
+obfuscator = LuaObfuscator()
+
+
+def run(code):
+    """Run Lua 5.1 code and return what it printed"""
+    runtime = lua51.LuaRuntime()
+    printed = []
+    runtime.globals().print = lambda *args: printed.append(' '.join(str(arg) for arg in args))
+    runtime.execute(BIT)
+    runtime.execute(code)
+    return printed
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+@pytest.mark.parametrize('level', LuaObfuscator.LEVELS)
+@pytest.mark.parametrize('minify', [True, False])
+def test_samples_run_the_same(name, level, minify):
+    expected = run(SAMPLES[name])
+    for seed in range(10):
+        assert run(obfuscator.obfuscate(SAMPLES[name], level, {'minify': minify}, seed)) == expected
+
+
+STRINGS = 'local function f(z) if z == 0 then return"x" end return z>2 and"yes"or"no" end print(f(3), f(0), f(1))'
+
+
+@pytest.mark.parametrize('level', LuaObfuscator.LEVELS)
+@pytest.mark.parametrize('minify', [True, False])
+def test_pooled_strings_after_keywords(level, minify):
+    assert run(obfuscator.obfuscate(STRINGS, level, {'minify': minify}, 1)) == ['yes x no']
+
+
+@pytest.mark.parametrize('pooled', [True, False])
+def test_encode_strings_after_keywords(pooled):
+    assert run(obfuscator.encode_strings(STRINGS, pooled=pooled)) == ['yes x no']
+
+
+def test_incremental_strings_after_keywords():
+    from incremental import IncrementalObfuscator
+    from pipeline import Pipeline
+    options = {'minify': False}
+    code, _ = IncrementalObfuscator(obfuscator).obfuscate(
+        'session', STRINGS, Pipeline.for_level('medium', options), options, 1)
+    assert run(code) == ['yes x no']
+
+
+@pytest.mark.parametrize('level', LuaObfuscator.LEVELS)
+def test_large_path_strings_after_keywords(level):
+    import io
+    out = io.StringIO()
+    obfuscator.obfuscate_large(STRINGS, out, level, {'minify': False}, 1)
+    assert run(out.getvalue()) == ['yes x no']
+
+
+# Neither a table, a long string nor a returned function may be split by a dummy block
+CONTROL_FLOW = """
+local t = {
+  1,
+  2,
+}
+local s = [[
+a
+b]]
+local function make()
+  return function()
+    return #t
+  end
+end
+print(make()(), s)
+"""
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_control_flow_keeps_statements_whole(seed):
+    code = obfuscator.obfuscate_control_flow(CONTROL_FLOW * 5, seed)
+    assert run(code) == run(CONTROL_FLOW * 5)
+
+
+PARENS = 'local t = {}\nfunction t.f() print("hi") end\ndo (t.f)() end\n(t.f)()\nlocal s = "x"\n;(print)(s)'
+
+
+@pytest.mark.parametrize('level', LuaObfuscator.LEVELS)
+def test_statements_starting_with_a_paren(level):
+    assert run(obfuscator.obfuscate(PARENS, level, {}, 1)) == ['hi', 'hi', 'x']
+
+
+@pytest.mark.parametrize('name', sorted(SAMPLES))
+@pytest.mark.parametrize('level', LuaObfuscator.LEVELS)
+@pytest.mark.parametrize('minify', [True, False])
+def test_large_path_samples_run_the_same(name, level, minify):
+    import io
+    out = io.StringIO()
+    obfuscator.obfuscate_large(SAMPLES[name], out, level, {'minify': minify}, 3)
+    assert run(out.getvalue()) == run(SAMPLES[name])